@@ -1,6 +1,11 @@
 # Use a pipeline as a high-level helper
+import numpy as np
 import pandas as pd
 import uuid
+from collections import defaultdict
+
+# Points deducted from a column per log of each status
+STATUS_PENALTY = {"critical": 20, "warning": 10, "info": 0}
 
 class WeightedConfidenceCalculator:
     def __init__(self, user_id, df: pd.DataFrame, weights: dict, deducted_points: dict):
@@ -51,80 +56,101 @@ class WeightedConfidenceCalculator:
 
         # If it's just a normal column (like Region or Customer_ID), skip the check.
         if not is_primary_key:
-            self.report_log.append({
-                "id": str(uuid.uuid4()),
-                "column": column,
-                "type": "Skipped Uniquness check",
-                "message": f"[{column}] Skipped uniqueness check (Duplicates allowed).",
-                "status": "info"
-                })
+            self.report_log.append(self._skipped_uniqueness_log(column))
             return 
 
         # If it IS the Primary Key, duplicates are a disaster.
         if not self.df[column].is_unique:
             self.column_scores[column] = 0  # CRITICAL FAILURE
-            self.report_log.append({
-                "id": str(uuid.uuid4()),
-                "column": column,
-                "type": "Uniqueness Failure",
-                "message": f"[{column}] FATAL ERROR: Primary Key has duplicates.",
-                "status": "critical"
-                })
+            self.report_log.append(self._uniqueness_failure_log(column))
+
+    def check_all(self, primary_keys=(), stats=None):
+        """
+        Same result as check_uniqueness + check_nulls on every column, in one vectorized pass.
+
+        primary_keys: Columns that must be unique, e.g. those the MetadataScanner profile flags is_likely_id.
+                      Only these are scanned for duplicates.
+        stats: TableStats of the frame. Its null and unique counts are used instead of scanning the frame again.
+        """
+        columns = list(self.df.columns)
+        total = len(self.df)
+        if stats is not None and not set(columns).issubset(stats.null_counts.index):
+            stats = None
+
+        is_key = np.isin(columns, list(primary_keys))
+        has_duplicates = np.zeros(len(columns), dtype=bool)
+        if stats is not None:
+            null_counts = stats.null_counts[columns].to_numpy()
+            for i in np.flatnonzero(is_key):
+                has_duplicates[i] = not stats.is_unique(columns[i])
+        else:
+            null_counts = self.df.isna().sum().to_numpy()
+            for i in np.flatnonzero(is_key):
+                has_duplicates[i] = not self.df.iloc[:, i].is_unique
+
+        scores = np.array([self.column_scores[col] for col in columns], dtype=float)
+        if total:
+            scores = np.where(null_counts > 0, np.maximum(scores - null_counts / total * 100, 0), scores)
+        scores[has_duplicates] = 0  # CRITICAL FAILURE
+        self.column_scores.update(zip(columns, scores.tolist()))
+
+        self.null_score[0] += int((null_counts > 0).sum())
+        self.null_score[1] += len(columns)
+
+        for col, key, duplicated in zip(columns, is_key, has_duplicates):
+            if not key:
+                self.report_log.append(self._skipped_uniqueness_log(col))
+            elif duplicated:
+                self.report_log.append(self._uniqueness_failure_log(col))
+
+    @staticmethod
+    def _skipped_uniqueness_log(column):
+        return {
+            "id": str(uuid.uuid4()),
+            "column": column,
+            "type": "Skipped Uniquness check",
+            "message": f"[{column}] Skipped uniqueness check (Duplicates allowed).",
+            "status": "info"
+            }
+
+    @staticmethod
+    def _uniqueness_failure_log(column):
+        return {
+            "id": str(uuid.uuid4()),
+            "column": column,
+            "type": "Uniqueness Failure",
+            "message": f"[{column}] FATAL ERROR: Primary Key has duplicates.",
+            "status": "critical"
+            }
 
     def calculate_weighted_score(self):
         """
         Aggregates individual column scores into one final 'Business Trust Score'.
         Formula: Sum(Score * Weight) / Sum(Weights)
         """
-        total_weighted_score = 0
-        total_weight = 0
-        self.event_data["fields"] = []
-        
         for log in self.report_log:
-            if (log["status"] == "critical"):
-                self.deducted_points[log["column"]] += 20
-            elif log["status"] == "warning":
-                self.deducted_points[log["column"]] += 10
-            elif log["status"] == "info":
-                self.deducted_points[log["column"]] += 0
+            self.deducted_points[log["column"]] = self.deducted_points.get(log["column"], 0) + STATUS_PENALTY.get(log["status"], 0)
 
         print("TOTAL DEDUCTED", self.deducted_points)
 
-        print(f"{'Column':<15} | {'Raw Score':<10} | {'Weight':<8} | {'Contribution'}")
-        print("-" * 55)
-
-        formated_column_scores = []
-
-        for col, raw_score in self.column_scores.items():
-
-            print(f"COLUMN: {col}. Deducted score {self.deducted_points[col]}")
-
-            if (self.deducted_points[col] >= 100):
-                raw_score = 0
-            else:
-                raw_score = raw_score - self.deducted_points[col]
-            
-
-            # Get weight (default to 1.0 if not defined)
-            weight = self.weights.get(col, 1.0)
-            
-            # Math
-            weighted_val = raw_score * weight
-            total_weighted_score += weighted_val
-            total_weight += weight
-            
-            col_score = {"name": col, "score": round(float(raw_score), 2)}
+        columns = list(self.column_scores)
+        raw_scores = np.fromiter(self.column_scores.values(), dtype=float, count=len(columns))
+        deducted = np.array([self.deducted_points.get(col, 0) for col in columns], dtype=float)
+        weights = np.array([self.weights.get(col, 1.0) for col in columns], dtype=float) # Default weight is 1.0
 
-            formated_column_scores.append(col_score)
+        scores = np.where(deducted >= 100, 0.0, raw_scores - deducted)
+        weighted_vals = scores * weights
+        total_weight = weights.sum()
 
-            self.event_data["fields"].append(col_score)
-            
-            print(f"{col:<15} | {raw_score:<10.1f} | {weight:<8} | {weighted_val:.1f}")
+        formated_column_scores = [{"name": col, "score": round(score, 2)} for col, score in zip(columns, scores.tolist())]
+        self.event_data["fields"] = formated_column_scores
 
-        
-        final_score = total_weighted_score / total_weight
+        # One print for the whole table, wide tables would otherwise flood stdout line by line
+        rows = [f"{col:<15} | {score:<10.1f} | {weight:<8} | {val:.1f}" for col, score, weight, val in zip(columns, scores, weights, weighted_vals)]
+        print("\n".join([f"{'Column':<15} | {'Raw Score':<10} | {'Weight':<8} | {'Contribution'}", "-" * 55, *rows]))
 
-        final_score = round(float(final_score), 2)
+        # Avoid division by zero
+        final_score = round(float(weighted_vals.sum() / total_weight), 2) if total_weight else 0.0
 
         if final_score <= 40:
             self.event_data["text"] = "It seems you data doesn't meet the quality threshold, please check the results and refrain from using this on heavy data analysis."
@@ -134,11 +160,43 @@ class WeightedConfidenceCalculator:
             self.event_data["text"] = "Your dataset passes most quality checks and it optimal for data analysis."
 
 
-        # Avoid division by zero
-        if total_weight == 0:
-            self.event_data["score"] = 0,
-            return self.event_data
-                
         self.event_data["score"] = final_score
         return self.event_data, self.report_log, formated_column_scores, self.null_score, final_score, 
 
+
+
+def score_table(user_id, ontology, df, table_profile, total_logs, stats=None):
+    """
+    Runs the confidence checks of a cleaned table. total_logs is extended with the scoring logs.
+
+    Return: (report_data, metadata, total_logs)
+    """
+    weights = {}
+    deducted_points = defaultdict(int)
+
+    for log in total_logs:
+        deducted_points[log["column"]] += STATUS_PENALTY.get(log["status"], 0)
+    
+    for items in ontology["required_fields"]:
+        weights[items[0]] = items[1]
+
+    calculator = WeightedConfidenceCalculator(user_id, df, weights, deducted_points)
+
+    # Nulls and primary key uniqueness of every column in one pass, the keys come from the MetadataScanner profile
+    calculator.check_all(primary_keys=[col for col in df.columns if table_profile[col]["is_likely_id"]], stats=stats)
+
+    report_data, logs, formated_column_scores, null_score, final_score = calculator.calculate_weighted_score()
+    
+    metadata = {
+        "column_scores": formated_column_scores,
+        "null_score": null_score,
+        "report_score": final_score
+    }
+
+    total_logs.extend(logs)
+
+    for log in total_logs:
+        print("---------------------") 
+        print(log)
+
+    return report_data, metadata, total_logs
@@ -1,21 +1,45 @@
 import os
 import tempfile
+from contextlib import contextmanager, ExitStack
+from typing import Callable, Iterable, Optional
 import pandas as pd
 import pyarrow as pa
 import pyarrow.parquet as pq
 
 from sse_manager import event_manager
+from ExecutionEngine.HyperPool import HyperProcessPool
+from ExecutionEngine.HyperSchema import HyperSchemaPlanner, coerce_frame
+from ExecutionEngine.Incremental import DeltaPlanner, DeltaPlan, IncrementalState, encode_schema
 
 from tableauhyperapi import (
     HyperProcess, Connection, Telemetry, CreateMode, 
     TableDefinition, SqlType, TableName, escape_string_literal,
-    Nullability
+    Nullability, Endpoint
 )
 
 class HyperParquetIngestor:
-    def __init__(self, user_id, hyper_file_path: str):
+    def __init__(self, user_id, hyper_file_path: str, pool: Optional[HyperProcessPool] = None, endpoint: Optional[Endpoint] = None):
+        """
+        pool: Shared warm Hyper processes. Without one (or while it isn't started) a private HyperProcess is spawned per extract.
+        endpoint: A running Hyper process to use instead, e.g. one a parent process borrowed from its pool
+        """
         self.user_id = user_id
         self.hyper_path = hyper_file_path
+        self.pool = pool
+        self.endpoint = endpoint
+
+    @contextmanager
+    def _hyper_endpoint(self):
+        if self.endpoint is not None:
+            yield self.endpoint
+        elif self.pool is not None and self.pool.started:
+            print(f"2. Borrowing Hyper Process from pool...")
+            with self.pool.acquire() as endpoint:
+                yield endpoint
+        else:
+            print(f"2. Starting Hyper Process...")
+            with HyperProcess(telemetry=Telemetry.SEND_USAGE_DATA_TO_TABLEAU) as hyper:
+                yield hyper.endpoint
 
     def _map_pandas_to_hyper_type(self, dtype) -> SqlType:
         if pd.api.types.is_integer_dtype(dtype):
@@ -30,60 +54,432 @@ class HyperParquetIngestor:
         else:
             return SqlType.text()
 
-    def generate_file(self, df: pd.DataFrame, table_name: str = "Extract"):
+    def _map_arrow_to_hyper_type(self, arrow_type) -> SqlType:
+        if pa.types.is_dictionary(arrow_type):
+            return self._map_arrow_to_hyper_type(arrow_type.value_type)
+        if pa.types.is_int8(arrow_type) or pa.types.is_int16(arrow_type) or pa.types.is_uint8(arrow_type):
+            return SqlType.small_int()
+        elif pa.types.is_int32(arrow_type) or pa.types.is_uint16(arrow_type):
+            return SqlType.int()
+        elif pa.types.is_integer(arrow_type):
+            return SqlType.big_int()
+        elif pa.types.is_decimal(arrow_type):
+            return SqlType.numeric(arrow_type.precision, arrow_type.scale)
+        elif pa.types.is_floating(arrow_type):
+            return SqlType.double()
+        elif pa.types.is_boolean(arrow_type):
+            return SqlType.bool()
+        elif pa.types.is_timestamp(arrow_type):
+            return SqlType.timestamp_tz() if arrow_type.tz else SqlType.timestamp()
+        elif pa.types.is_date(arrow_type):
+            return SqlType.date()
+        else:
+            return SqlType.text()
+
+    def _table_definition(self, df: pd.DataFrame, table_name: str) -> TableDefinition:
+        # Define Schema
+        columns = []
+        for col_name, dtype in df.dtypes.items():
+
+            sql_type = self._map_pandas_to_hyper_type(dtype)
+            # Explicitly allowing NULLs is safer for Parquet ingestion
+            columns.append(TableDefinition.Column(str(col_name), sql_type, nullability=Nullability.NULLABLE))
+
+        return TableDefinition(TableName("Extract", table_name), columns)
+
+    def _arrow_table_definition(self, schema: pa.Schema, table_name: str) -> TableDefinition:
+        # Hyper's Arrow reader requires the column nullability to match the Arrow field
+        columns = [
+            TableDefinition.Column(field.name, self._map_arrow_to_hyper_type(field.type),
+                                   nullability=Nullability.NULLABLE if field.nullable else Nullability.NOT_NULLABLE)
+            for field in schema
+        ]
+        return TableDefinition(TableName("Extract", table_name), columns)
+
+    def open_stream(self, table_name: str = "Extract", schema=None, write_path: str = "arrow", batch_rows: int = 100_000,
+                    total_rows: Optional[int] = None, on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                    dictionary_columns: Optional[list] = None, replace_file: bool = True) -> "HyperStreamWriter":
+        """
+        Opens a streaming writer for a new .hyper file, see HyperStreamWriter.
+
+        schema: A DataFrame (only its dtypes are used) or pyarrow.Schema, e.g. from HyperSchemaPlanner.plan().
+                Defaults to the schema of the first chunk.
+        replace_file: False adds the table to the existing file instead (a table of the same name is replaced)
+        """
+        return HyperStreamWriter(self, table_name, schema=schema, write_path=write_path, batch_rows=batch_rows,
+                                 total_rows=total_rows, on_progress=on_progress, dictionary_columns=dictionary_columns,
+                                 replace_file=replace_file).open()
+
+    def write_stream(self, chunks: Iterable, table_name: str = "Extract", schema=None, write_path: str = "arrow", batch_rows: int = 100_000,
+                     total_rows: Optional[int] = None, on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                     dictionary_columns: Optional[list] = None) -> int:
+        """
+        Writes an iterator of DataFrames / Arrow record batches / Arrow tables to a new .hyper file
+        without holding more than one chunk in memory.
+
+        Return: Number of rows ingested
+        """
+        with self.open_stream(table_name, schema=schema, write_path=write_path, batch_rows=batch_rows, total_rows=total_rows,
+                              on_progress=on_progress, dictionary_columns=dictionary_columns) as writer:
+            for chunk in chunks:
+                writer.append(chunk)
+
+        return writer.rows_ingested
+
+    def generate_file(self, df: pd.DataFrame, table_name: str = "Extract", write_path: str = "parquet", batch_rows: int = 100_000,
+                      profile: Optional[dict] = None, schema: Optional[pa.Schema] = None, replace_file: bool = True) -> pa.Schema:
+        """
+        Writes the DataFrame to a new .hyper file.
+
+        write_path: "parquet" converts the frame to one temporary Parquet file and COPYs it.
+                    "arrow" streams it in Arrow record batches of `batch_rows` rows through a small
+                    Arrow IPC file, so peak memory and temporary disk stay bounded by one batch.
+        profile: MetadataScanner profile. When given, columns get precise types (DATE, NUMERIC(p,s), SMALLINT/INT,
+                 NOT NULL...) proven on the data, and low-cardinality text is dictionary-encoded in the Parquet stage.
+        schema: Arrow schema to write instead of planning one, e.g. the schema of the extract a delta is appended to.
+        replace_file: False adds the table to the existing .hyper file, see generate_tables()
+
+        Return: The Arrow schema the extract was written with
+        """
+        # This prevents the "Parquet Null Type" error on empty object columns
+        for col in df.columns:
+            if df[col].dtype == 'object' and df[col].empty:
+                df[col] = df[col].astype('string')
+
+        dictionary_columns = None
+        if schema is None and profile is not None:
+            planner = HyperSchemaPlanner(profile)
+            schema = planner.plan(df)
+            dictionary_columns = planner.dictionary_columns
+
+        with self.open_stream(table_name, schema=df if schema is None else schema, write_path=write_path, batch_rows=batch_rows,
+                              total_rows=len(df), dictionary_columns=dictionary_columns, replace_file=replace_file) as writer:
+            writer.append(df)
+
+        print(f"Done. File created: {self.hyper_path}")
+        return writer.schema
+
+    def generate_tables(self, tables: dict, write_path: str = "parquet", batch_rows: int = 100_000) -> dict:
+        """
+        Writes several DataFrames as tables of one new .hyper file, one after the other (a .hyper file
+        takes one writer at a time).
+
+        tables: {table_name: (df, profile or None)}
+        Return: {table_name: Arrow schema the table was written with}
+        """
+        schemas = {}
+        for index, (table_name, (df, profile)) in enumerate(tables.items()):
+            schemas[table_name] = self.generate_file(df, table_name, write_path=write_path, batch_rows=batch_rows,
+                                                     profile=profile, replace_file=index == 0)
+        return schemas
+
+    def generate_delta_file(self, df: pd.DataFrame, planner: "DeltaPlanner", state: "IncrementalState", table_name: str = "Extract",
+                            profile: Optional[dict] = None, **kwargs) -> "DeltaPlan":
+        """
+        Writes only the rows that are new since the last published run (see DeltaPlanner) to a new .hyper file.
+
+        A delta is written with the schema of the published extract, so it can be appended / upserted into it.
+        When the new rows no longer fit that schema (e.g. a value outgrew SMALLINT) the full data is written instead.
+        Call plan.commit() once the file is published.
+
+        Return: DeltaPlan, plan.mode tells the publisher how to apply the file ("none": no file was written)
+        """
+        plan = planner.plan(df, state)
+
+        if plan.mode in ("append", "upsert"):
+            try:
+                self.generate_file(plan.frame, table_name, schema=plan.schema, **kwargs)
+                return plan
+            except (ValueError, pa.ArrowInvalid) as e:
+                print(f"Delta does not fit the published schema ({e}), rebuilding the full extract...")
+                state.reset()
+                plan = planner.plan(df, state)
+
+        if plan.mode == "overwrite":
+            plan.pending["schema"] = encode_schema(self.generate_file(plan.frame, table_name, profile=profile, **kwargs))
+
+        return plan
+
+    def _copy_from(self, connection, table_def: TableDefinition, path: str, file_format: str) -> int:
+        copy_command = f"""
+        COPY {table_def.table_name} 
+        FROM {escape_string_literal(path)}
+        WITH (FORMAT {file_format})
+        """
+        
+        return connection.execute_command(copy_command)
+
+
+class HyperStreamWriter:
+    """
+    Builds a .hyper extract from chunks so the full dataset never has to be in memory.
+
+    Each appended chunk (DataFrame, Arrow RecordBatch or Table) is converted `batch_rows` rows at a time:
+        write_path="arrow":   every batch is COPYed into Hyper straight away through a re-used Arrow IPC
+                              stream file, memory and temporary disk stay bounded by one batch.
+        write_path="parquet": every batch becomes a row group of one temporary Parquet file which is
+                              COPYed on finalize(). Memory stays bounded, temporary disk grows with the data.
+
+    Usage:
+        with ingestor.open_stream("Extract", on_progress=print) as writer:
+            for chunk in pd.read_csv(path, chunksize=500_000):
+                writer.append(chunk)
+    """
+
+    def __init__(self, ingestor: HyperParquetIngestor, table_name: str, schema=None, write_path: str = "arrow", batch_rows: int = 100_000,
+                 total_rows: Optional[int] = None, on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                 dictionary_columns: Optional[list] = None, replace_file: bool = True):
+        """
+        schema: DataFrame or pyarrow.Schema. DataFrame chunks are converted into an Arrow schema with coerce_frame().
+        total_rows: Expected row count, only used for progress reporting
+        on_progress: Called with (rows_written, total_rows) after every appended chunk
+        dictionary_columns: Parquet path only, columns to dictionary-encode. Defaults to every column (pyarrow's default).
+        replace_file: False writes into the existing .hyper file, next to the tables already in it
+        """
+        if write_path not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown write path '{write_path}', expected 'parquet' or 'arrow'")
+        if batch_rows < 1:
+            raise ValueError("batch_rows must be at least 1")
+
+        self.ingestor = ingestor
+        self.table_name = table_name
+        self.write_path = write_path
+        self.batch_rows = batch_rows
+        self.total_rows = total_rows
+        self.on_progress = on_progress
+        self.dictionary_columns = dictionary_columns
+        self.replace_file = replace_file
+
+        self.rows_written = 0
+        self.rows_ingested = 0
+
+        self._schema = None
+        self._table_def = None
+        self._typed = False
+        self._declared = schema
+        self._connection = None
+        self._parquet_writer = None
+        self._stack = ExitStack()
+        self._temp_path = None
+        self._state = "new"
+
+    @property
+    def schema(self) -> Optional[pa.Schema]:
+        """
+        Arrow schema of the stream, None until it is declared or the first chunk arrives
+        """
+        return self._schema
 
+    def __enter__(self):
+        return self if self._state == "open" else self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finalize()
+        else:
+            self.abort()
+
+    def open(self) -> "HyperStreamWriter":
+        if self._state != "new":
+            raise RuntimeError(f"Stream writer is already {self._state}")
+
+        with tempfile.NamedTemporaryFile(suffix=f'.{self.write_path}', delete=False) as tmp_file:
+            self._temp_path = tmp_file.name
+        self._state = "open"
 
-        # Create a named temporary file that closes automatically but isn't deleted immediately
-        # We need it to persist so Hyper can read it, then we delete it manually.
-        with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as tmp_file:
-            temp_parquet_path = tmp_file.name
-            
         try:
-            print(f"1. Converting to Parquet (Arrow Engine)...")
+            if self.write_path == "arrow":
+                # COPY runs per batch, so the Hyper process is held for the whole stream
+                self._connect()
+            if self._declared is not None:
+                self._set_schema(self._declared)
+        except Exception:
+            self.abort()
+            raise
 
-            # This prevents the "Parquet Null Type" error on empty object columns
-            for col in df.columns:
-                if df[col].dtype == 'object' and df[col].empty:
-                    df[col] = df[col].astype('string')
+        return self
 
-            table = pa.Table.from_pandas(df)
-            pq.write_table(table, temp_parquet_path)
+    def append(self, chunk) -> int:
+        """
+        Writes one chunk.
 
-            print(f"2. Starting Hyper Process...")
-            with HyperProcess(telemetry=Telemetry.SEND_USAGE_DATA_TO_TABLEAU) as hyper:
-                with Connection(endpoint=hyper.endpoint,
-                                database=self.hyper_path,
-                                create_mode=CreateMode.CREATE_AND_REPLACE) as connection:
-
-                    # Define Schema
-                    columns = []
-                    for col_name, dtype in df.dtypes.items():
-  
-                        sql_type = self._map_pandas_to_hyper_type(dtype)
-                        # Explicitly allowing NULLs is safer for Parquet ingestion
-                        columns.append(TableDefinition.Column(str(col_name), sql_type, nullability=Nullability.NULLABLE))
-                    
-                    connection.catalog.create_schema_if_not_exists("Extract")
-                    table_def = TableDefinition(TableName("Extract", table_name), columns)
-                    connection.catalog.create_table(table_def)
-
-                    print(f"3. Executing COPY FROM Parquet...")
-                    copy_command = f"""
-                    COPY {table_def.table_name} 
-                    FROM {escape_string_literal(temp_parquet_path)}
-                    WITH (FORMAT PARQUET)
-                    """
-                    
-                    count = connection.execute_command(copy_command)
-                    print(f"   Success! Ingested {count} rows.")
+        Return: Total rows written so far
+        """
+        if self._state != "open":
+            raise RuntimeError(f"Cannot append to a {self._state} stream writer")
+
+        if self._schema is None:
+            self._set_schema(chunk)
+
+        for batch in self._batches(chunk):
+            if self.write_path == "arrow":
+                self.rows_ingested += self._copy_batch(batch)
+            else:
+                self._write_row_group(batch)
+            self.rows_written += batch.num_rows
+            del batch
+
+        total = f"/{self.total_rows}" if self.total_rows else ""
+        print(f"   Streamed {self.rows_written}{total} rows into {self.table_name}...")
+        if self.on_progress is not None:
+            self.on_progress(self.rows_written, self.total_rows)
+
+        return self.rows_written
+
+    def finalize(self) -> int:
+        """
+        Completes the extract and releases the Hyper process.
+
+        Return: Number of rows ingested
+        """
+        if self._state != "open":
+            raise RuntimeError(f"Cannot finalize a {self._state} stream writer")
+
+        try:
+            if self._schema is None:
+                raise ValueError("Cannot create an extract without a schema: no schema given and no chunks appended")
+
+            if self.write_path == "parquet":
+                self._parquet_writer.close()
+                self._parquet_writer = None
+                self._connect()
+                self._create_table()
+
+                print(f"3. Executing COPY FROM Parquet...")
+                self.rows_ingested = self.ingestor._copy_from(self._connection, self._table_def, self._temp_path, "PARQUET") if self.rows_written else 0
+
+            print(f"   Success! Ingested {self.rows_ingested} rows.")
+        except Exception:
+            self.abort()
+            raise
+
+        self._close()
+        self._state = "finalized"
+        return self.rows_ingested
+
+    def abort(self):
+        """
+        Releases the Hyper process and temporary file without completing the extract.
+        """
+        if self._state in ("finalized", "aborted"):
+            return
+
+        if self._parquet_writer is not None:
+            try:
+                self._parquet_writer.close()
+            except Exception:
+                pass
+            self._parquet_writer = None
 
+        self._close()
+        self._state = "aborted"
+
+    def _close(self):
+        try:
+            self._stack.close()
         finally:
-            # This block always runs, even if the code above crashes
-            if os.path.exists(temp_parquet_path):
-                os.remove(temp_parquet_path)
+            self._connection = None
+            # This block always runs, even if the Hyper connection failed to close
+            if self._temp_path and os.path.exists(self._temp_path):
+                os.remove(self._temp_path)
                 print("   Temporary artifacts cleaned up.")
 
-        print(f"Done. File created: {self.hyper_path}")
+    def _connect(self):
+        endpoint = self._stack.enter_context(self.ingestor._hyper_endpoint())
+        self._connection = self._stack.enter_context(
+            Connection(endpoint=endpoint, database=self.ingestor.hyper_path,
+                       create_mode=CreateMode.CREATE_AND_REPLACE if self.replace_file else CreateMode.CREATE_IF_NOT_EXISTS)
+        )
+        self._connection.catalog.create_schema_if_not_exists("Extract")
+
+    def _create_table(self):
+        if not self.replace_file and self._connection.catalog.has_table(self._table_def.table_name):
+            self._connection.execute_command(f"DROP TABLE {self._table_def.table_name}")
+        self._connection.catalog.create_table(self._table_def)
+
+    def _set_schema(self, source):
+        if isinstance(source, pd.DataFrame):
+            self._schema = hyper_arrow_schema(pa.Schema.from_pandas(source, preserve_index=False).remove_metadata())
+            self._table_def = self.ingestor._table_definition(source, self.table_name)
+        else:
+            arrow_schema = source if isinstance(source, pa.Schema) else source.schema
+            self._typed = isinstance(source, pa.Schema)
+            self._schema = hyper_arrow_schema(arrow_schema.remove_metadata())
+            self._table_def = self.ingestor._arrow_table_definition(self._schema, self.table_name)
+
+        if self.write_path == "arrow":
+            self._create_table()
+        else:
+            print(f"1. Converting to Parquet (Arrow Engine)...")
+            use_dictionary = True if self.dictionary_columns is None else self.dictionary_columns
+            self._parquet_writer = pq.ParquetWriter(self._temp_path, self._schema, use_dictionary=use_dictionary)
+
+    def _batches(self, chunk):
+        """
+        Yields the chunk as Arrow record batches of at most batch_rows rows, cast to the stream schema.
+        A DataFrame is converted one slice at a time so only one batch of Arrow memory is alive.
+        """
+        if isinstance(chunk, pd.DataFrame) and self._typed:
+            slices = (coerce_frame(chunk.iloc[start:start + self.batch_rows], self._schema)
+                      for start in range(0, len(chunk), self.batch_rows))
+        elif isinstance(chunk, pd.DataFrame):
+            slices = (pa.RecordBatch.from_pandas(chunk.iloc[start:start + self.batch_rows], preserve_index=False)
+                      for start in range(0, len(chunk), self.batch_rows))
+        elif isinstance(chunk, pa.RecordBatch):
+            slices = (chunk.slice(start, self.batch_rows) for start in range(0, chunk.num_rows, self.batch_rows))
+        elif isinstance(chunk, pa.Table):
+            slices = chunk.to_batches(max_chunksize=self.batch_rows)
+        else:
+            raise TypeError(f"Unsupported chunk type {type(chunk).__name__}, expected a DataFrame or Arrow RecordBatch/Table")
+
+        for batch in slices:
+            batch = to_hyper_arrow(batch.replace_schema_metadata(None))
+            if batch.schema.names != self._schema.names:
+                raise ValueError(f"Chunk columns {batch.schema.names} do not match the stream columns {self._schema.names}")
+            if not batch.schema.equals(self._schema):
+                batch = batch.cast(self._schema, safe=False)
+
+            yield batch
+
+    def _copy_batch(self, batch) -> int:
+        with pa.OSFile(self._temp_path, "wb") as sink:
+            with pa.ipc.new_stream(sink, batch.schema) as writer:
+                writer.write_batch(batch)
+
+        return self.ingestor._copy_from(self._connection, self._table_def, self._temp_path, "ARROWSTREAM")
+
+    def _write_row_group(self, batch):
+        self._parquet_writer.write_batch(batch)
+
+
+def hyper_arrow_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    Maps an Arrow schema to types Hyper's Arrow reader accepts: no nanosecond timestamps,
+    no 64-bit offset strings, no dictionary encoding and no untyped (all-null) columns.
+    """
+    def compatible(arrow_type):
+        if pa.types.is_dictionary(arrow_type):
+            return compatible(arrow_type.value_type)
+        if pa.types.is_timestamp(arrow_type) and arrow_type.unit == "ns":
+            return pa.timestamp("us", tz=arrow_type.tz)
+        if pa.types.is_large_string(arrow_type) or pa.types.is_null(arrow_type):
+            return pa.string()
+        if pa.types.is_large_binary(arrow_type):
+            return pa.binary()
+        return arrow_type
+
+    return pa.schema([field.with_type(compatible(field.type)) for field in schema], metadata=schema.metadata)
+
+
+def to_hyper_arrow(batch):
+    """
+    Casts an Arrow table / record batch to the types in hyper_arrow_schema().
+    """
+    schema = hyper_arrow_schema(batch.schema)
+    if schema.equals(batch.schema):
+        return batch
+    # Sub-microsecond precision is dropped, Hyper timestamps are microseconds
+    return batch.cast(schema, safe=False)
 
 # --- USAGE ---
 # df = pd.DataFrame(...)
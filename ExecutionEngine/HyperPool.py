@@ -0,0 +1,179 @@
+import asyncio
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+from tableauhyperapi import HyperProcess, Connection, Telemetry
+
+load_dotenv()
+
+
+class HyperProcessPool:
+    """
+    A fixed set of warm Hyper processes shared by every extract in this application.
+
+    Starting `hyperd` costs a process spawn and engine init, so instead of one HyperProcess per
+    extract the pool starts `size` processes once (at FastAPI startup) and lends out their
+    endpoints. Processes are health-checked when borrowed and by `health_check()`, and replaced
+    if they died. The pool size (and the optional per-process memory_limit) caps total Hyper memory.
+
+    Usage:
+        pool.start()
+        with pool.acquire() as endpoint:
+            with Connection(endpoint=endpoint, database=path, create_mode=...) as connection:
+                ...
+    """
+
+    def __init__(self, size: int = 2, telemetry=Telemetry.SEND_USAGE_DATA_TO_TABLEAU, parameters: Optional[dict] = None, acquire_timeout: float = 300):
+        """
+        size: Number of Hyper processes kept running
+        telemetry: Passed to every HyperProcess
+        parameters: Hyper process settings, e.g. {"memory_limit": "4g", "log_dir": "/var/log/hyper"}
+        acquire_timeout: Seconds to wait for a free process before giving up
+        """
+        self.size = size
+        self.telemetry = telemetry
+        self.parameters = parameters or {}
+        self.acquire_timeout = acquire_timeout
+        self.restarts = 0
+
+        self._idle: "queue.Queue[HyperProcess]" = queue.Queue()
+        self._processes: list = []
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self):
+        """
+        Spawns the Hyper processes. Safe to call more than once.
+        """
+        with self._lock:
+            if self._started:
+                return
+
+            print(f"Starting Hyper process pool ({self.size} processes)...")
+            for _ in range(self.size):
+                hyper = self._spawn()
+                self._processes.append(hyper)
+                self._idle.put(hyper)
+
+            self._started = True
+
+    def _spawn(self) -> HyperProcess:
+        return HyperProcess(telemetry=self.telemetry, parameters=self.parameters)
+
+    def _is_healthy(self, hyper: HyperProcess) -> bool:
+        if not hyper.is_open:
+            return False
+        try:
+            with Connection(endpoint=hyper.endpoint) as connection:
+                connection.execute_scalar_query("SELECT 1")
+            return True
+        except Exception as e:
+            print(f"Hyper process failed health check: {e}")
+            return False
+
+    def _replace(self, hyper: HyperProcess) -> HyperProcess:
+        print("Restarting Hyper process...")
+        try:
+            hyper.close()
+        except Exception:
+            pass
+
+        replacement = self._spawn()
+        with self._lock:
+            self._processes = [replacement if p is hyper else p for p in self._processes]
+            self.restarts += 1
+
+        return replacement
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Borrows a healthy Hyper process and yields its endpoint. Blocks while all processes are busy.
+        """
+        if not self._started:
+            raise RuntimeError("Hyper process pool has not been started")
+
+        try:
+            hyper = self._idle.get(timeout=timeout or self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for a free Hyper process")
+
+        try:
+            if not self._is_healthy(hyper):
+                hyper = self._replace(hyper)
+
+            yield hyper.endpoint
+        finally:
+            # A query error leaves the process usable, only a dead process is replaced
+            if self._started and not hyper.is_open:
+                try:
+                    hyper = self._replace(hyper)
+                except Exception as e:
+                    # Keep the slot, the next health check / borrower retries the restart
+                    print(f"Unable to restart Hyper process: {e}")
+
+            if self._started:
+                self._idle.put(hyper)
+            else:
+                hyper.close()
+
+    def health_check(self):
+        """
+        Checks the idle processes and restarts any that died. Busy processes are checked when returned.
+        """
+        if not self._started:
+            return
+
+        checked = []
+        while True:
+            try:
+                checked.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+        for hyper in checked:
+            if not self._is_healthy(hyper):
+                try:
+                    hyper = self._replace(hyper)
+                except Exception as e:
+                    print(f"Unable to restart Hyper process: {e}")
+            self._idle.put(hyper)
+
+    def shutdown(self):
+        """
+        Stops every Hyper process. Processes still lent out are stopped when returned.
+        """
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+        print("Hyper process pool stopped.")
+
+
+# Started / stopped by main.py (or worker.py), extracts fall back to a private HyperProcess while it isn't running
+hyper_pool = HyperProcessPool(
+    size=int(os.getenv("HYPER_POOL_SIZE") or 2),
+    parameters={"memory_limit": os.getenv("HYPER_MEMORY_LIMIT")} if os.getenv("HYPER_MEMORY_LIMIT") else None
+)
+
+
+async def check_hyper_pool(interval: float, pool: HyperProcessPool = hyper_pool):
+    # Replaces Hyper processes that died while idle
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(pool.health_check)
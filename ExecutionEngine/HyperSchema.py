@@ -0,0 +1,257 @@
+from decimal import Decimal
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from IngestionLayer.TableStats import NULL_STRINGS
+
+# Hyper stores NUMERIC in 64 bits, wider values fall back to DOUBLE
+MAX_NUMERIC_PRECISION = 18
+MAX_NUMERIC_SCALE = 6
+
+# Text columns at or below both limits are dictionary-encoded in the Parquet stage
+DICTIONARY_MAX_UNIQUE_RATIO = 0.5
+DICTIONARY_MAX_UNIQUE = 10_000
+
+TRUE_STRINGS = {'y', 'true', '1', 't', 'yes'}
+FALSE_STRINGS = {'n', 'false', '0', 'f', 'no'}
+
+# Hyper has no TINYINT, SMALLINT is the narrowest integer
+INTEGER_TYPES = [
+    (np.iinfo(np.int16), pa.int16()),
+    (np.iinfo(np.int32), pa.int32()),
+    (np.iinfo(np.int64), pa.int64()),
+]
+
+
+class HyperSchemaPlanner:
+    """
+    Chooses precise Hyper column types from a MetadataScanner profile, checked against the actual data.
+
+    The profile's inferred_type is only a hint from a sample, so every candidate type is proven on the
+    full column before it is used and a column falls back to its plain mapping otherwise:
+        Datetime -> DATE when no value has a time part, else TIMESTAMP
+        Integer  -> SMALLINT / INT / BIGINT from the value range
+        Decimal  -> NUMERIC(p,s) from the digits actually present (p <= 18), else DOUBLE
+        Boolean  -> BOOL when every value is a recognised flag
+    A column without nulls is declared NOT NULL.
+
+    The result is an Arrow schema: HyperStreamWriter derives the table definition from it and
+    coerce_frame() converts DataFrame slices into it.
+    """
+
+    def __init__(self, profile: Optional[dict] = None):
+        """
+        profile: MetadataScanner profile keyed by the final column names
+        """
+        self.profile = profile or {}
+        self.dictionary_columns = []
+
+    def plan(self, df: pd.DataFrame) -> pa.Schema:
+        """
+        Input: Full DataFrame that will be written
+        Return: Arrow schema with the planned type and nullability of every column
+        """
+        self.dictionary_columns = []
+        fields = []
+
+        for col in df.columns:
+            series = df[col]
+            hint = self.profile.get(col, {}).get("inferred_type")
+
+            arrow_type = self._plan_type(series, hint)
+            values = self._clean_nulls(series)
+
+            if pa.types.is_string(arrow_type) and self._is_low_cardinality(values):
+                self.dictionary_columns.append(str(col))
+
+            # Every parser keeps the nulls of the cleaned column, so this holds for the converted values too
+            nullable = bool(values.isna().any()) or len(values) == 0
+            fields.append(pa.field(str(col), arrow_type, nullable=nullable))
+
+        return pa.schema(fields)
+
+    def _plan_type(self, series: pd.Series, hint: Optional[str]) -> pa.DataType:
+        if hint == "Datetime" or pd.api.types.is_datetime64_any_dtype(series):
+            return self._date_type(series) or self._fallback_type(series)
+        if hint in ("Integer", "Decimal") or (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)):
+            return self._numeric_type(series) or self._fallback_type(series)
+        if hint == "Boolean" or pd.api.types.is_bool_dtype(series):
+            return pa.bool_() if to_bool(series) is not None else self._fallback_type(series)
+        return self._fallback_type(series)
+
+    def _fallback_type(self, series: pd.Series) -> pa.DataType:
+        if pd.api.types.is_float_dtype(series):
+            return pa.float64()
+        if pd.api.types.is_integer_dtype(series):
+            return pa.int64()
+        if pd.api.types.is_bool_dtype(series):
+            return pa.bool_()
+        return pa.string()
+
+    def _date_type(self, series: pd.Series) -> Optional[pa.DataType]:
+        parsed = to_datetime(series)
+        if parsed is None:
+            return None
+
+        valid = parsed.dropna()
+        if len(valid) and (valid != valid.dt.normalize()).any():
+            return pa.timestamp("us", tz=str(valid.dt.tz) if valid.dt.tz else None)
+        return pa.date32()
+
+    def _numeric_type(self, series: pd.Series) -> Optional[pa.DataType]:
+        numbers = to_numeric(series)
+        if numbers is None:
+            return None
+
+        valid = numbers.dropna()
+        if len(valid) == 0 or not np.isfinite(valid.astype("float64")).all():
+            return self._fallback_type(series) if pd.api.types.is_numeric_dtype(series) else pa.float64()
+
+        if (valid % 1 == 0).all():
+            low, high = valid.min(), valid.max()
+            for info, arrow_type in INTEGER_TYPES:
+                if info.min <= low and high <= info.max:
+                    return arrow_type
+            return pa.float64()
+
+        return self._decimal_type(series, valid.astype("float64")) or pa.float64()
+
+    def _decimal_type(self, series: pd.Series, valid: pd.Series) -> Optional[pa.DataType]:
+        if pd.api.types.is_numeric_dtype(series):
+            # Binary floats: the smallest scale that represents every value exactly
+            scale = next((s for s in range(1, MAX_NUMERIC_SCALE + 1)
+                          if np.allclose(valid, np.round(valid, s), rtol=0, atol=10 ** -(s + 3))), None)
+        else:
+            # Text: the scale that was written down
+            exponents = [
+                Decimal(value).as_tuple().exponent
+                for value in clean_numeric_strings(self._clean_nulls(series).dropna()).unique()
+                if value
+            ]
+            scale = max(-min(exponents), 0) if exponents else None
+
+        if scale is None or scale > MAX_NUMERIC_SCALE:
+            return None
+
+        integer_digits = len(str(int(valid.abs().max())))
+        precision = integer_digits + scale
+        if precision > MAX_NUMERIC_PRECISION:
+            return None
+
+        return pa.decimal128(precision, scale)
+
+    def _is_low_cardinality(self, values: pd.Series) -> bool:
+        valid = values.dropna()
+        if len(valid) == 0:
+            return False
+        unique_count = valid.nunique()
+        return unique_count <= DICTIONARY_MAX_UNIQUE and unique_count / len(valid) <= DICTIONARY_MAX_UNIQUE_RATIO
+
+    @staticmethod
+    def _clean_nulls(series: pd.Series) -> pd.Series:
+        return series.replace(NULL_STRINGS, np.nan) if series.dtype == object or pd.api.types.is_string_dtype(series) else series
+
+
+def clean_numeric_strings(series: pd.Series) -> pd.Series:
+    return series.astype(str).str.strip().str.replace(r'[$,]', '', regex=True)
+
+
+def to_numeric(series: pd.Series) -> Optional[pd.Series]:
+    """
+    Parses a column as numbers ("$1,234.50" included). None when a non-null value isn't a number.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return None
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+
+    series = HyperSchemaPlanner._clean_nulls(series)
+    present = series.notna()
+    numbers = pd.to_numeric(clean_numeric_strings(series[present]), errors='coerce')
+    if numbers.isna().any():
+        return None
+
+    return numbers.reindex(series.index)
+
+
+def to_datetime(series: pd.Series) -> Optional[pd.Series]:
+    """
+    Parses a column as dates (the YYYY-MM-DD strings from EntityResolver.resolve_date included).
+    None when a non-null value isn't a date.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    series = HyperSchemaPlanner._clean_nulls(series)
+    present = series.notna()
+    if pd.api.types.is_numeric_dtype(series):
+        return None
+
+    try:
+        parsed = pd.to_datetime(series[present], errors='coerce', format="%Y-%m-%d")
+        if parsed.isna().any():
+            parsed = pd.to_datetime(series[present], errors='coerce', dayfirst=True, format='mixed')
+    except (ValueError, TypeError):
+        return None
+
+    if parsed.isna().any():
+        return None
+
+    return parsed.reindex(series.index)
+
+
+def to_bool(series: pd.Series) -> Optional[pd.Series]:
+    """
+    Parses a column of flags (y/n, true/false, 1/0...). None when a non-null value isn't a flag.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return series
+
+    series = HyperSchemaPlanner._clean_nulls(series)
+    present = series.notna()
+    flags = series[present].astype(str).str.strip().str.lower()
+    if not flags.isin(TRUE_STRINGS | FALSE_STRINGS).all():
+        return None
+
+    return flags.isin(TRUE_STRINGS).reindex(series.index).astype("boolean")
+
+
+def coerce_frame(df: pd.DataFrame, schema: pa.Schema) -> pa.RecordBatch:
+    """
+    Converts a DataFrame (usually one slice of it) to a record batch of the planned schema.
+
+    Raises: ValueError when a value doesn't fit its column's type, or a NOT NULL column holds nulls
+            (e.g. a delta written with the schema planned for an earlier, null-free run)
+    """
+    arrays = []
+    for field in schema:
+        series = df[field.name]
+
+        if pa.types.is_date(field.type) or pa.types.is_timestamp(field.type):
+            series = to_datetime(series)
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type) or pa.types.is_decimal(field.type):
+            series = to_numeric(series)
+        elif pa.types.is_boolean(field.type):
+            series = to_bool(series)
+        elif pa.types.is_string(field.type):
+            series = HyperSchemaPlanner._clean_nulls(series)
+            series = series.where(series.isna(), series.astype(str))
+
+        if series is None:
+            raise ValueError(f"Column '{field.name}' has values that don't fit the planned type {field.type}")
+
+        array = pa.array(series, from_pandas=True)
+        # from_arrays doesn't enforce nullability, Hyper would only refuse the row on insert
+        if not field.nullable and array.null_count:
+            raise ValueError(f"Column '{field.name}' was planned NOT NULL but has {array.null_count} null value(s)")
+        if pa.types.is_timestamp(array.type) and not pa.types.is_timestamp(field.type):
+            array = array.cast(pa.timestamp("us", tz=array.type.tz), safe=False)
+        if not array.type.equals(field.type):
+            # Decimal scale was proven by the planner, float noise below it is rounded away
+            array = array.cast(field.type, safe=not pa.types.is_decimal(field.type) and not pa.types.is_timestamp(field.type))
+        arrays.append(array)
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
@@ -0,0 +1,265 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from dotenv import load_dotenv
+
+from ExecutionEngine.HyperSchema import to_datetime, to_numeric
+
+load_dotenv()
+
+STATE_DIR = os.getenv("INCREMENTAL_STATE_DIR") or os.path.join(tempfile.gettempdir(), "tableau_mini_incremental")
+
+
+class IncrementalState:
+    """
+    What has already been published to one datasource, so the next run can send only the difference.
+
+    Stored as <state_dir>/<id>.json (mode, column, watermark, Arrow schema of the published extract) plus,
+    in key mode, <id>.keys.npy holding a 64-bit hash of every published key and of its row.
+    """
+
+    def __init__(self, *parts, state_dir: Optional[str] = None):
+        """
+        parts: Whatever identifies the target datasource, e.g. (user_id, server_url, site, project, datasource)
+        """
+        self.state_dir = state_dir or STATE_DIR
+        self.state_id = hashlib.sha256(json.dumps([str(p) for p in parts]).encode()).hexdigest()[:32]
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.state_dir, f"{self.state_id}.json")
+
+    @property
+    def keys_path(self) -> str:
+        return os.path.join(self.state_dir, f"{self.state_id}.keys.npy")
+
+    def load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def load_keys(self) -> pd.Series:
+        """
+        Return: row hash indexed by key hash of everything published so far
+        """
+        if not os.path.exists(self.keys_path):
+            return pd.Series(dtype="uint64")
+        keys, rows = np.load(self.keys_path)
+        return pd.Series(rows, index=keys)
+
+    def save(self, data: dict, keys: Optional[pd.Series] = None):
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        # Written next to the target and renamed, so a crash never leaves half a state file
+        if keys is not None:
+            tmp_keys = f"{self.keys_path}.tmp.npy"
+            np.save(tmp_keys, np.vstack([keys.index.to_numpy(dtype="uint64"), keys.to_numpy(dtype="uint64")]))
+            os.replace(tmp_keys, self.keys_path)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        for path in (self.path, self.keys_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def encode_schema(schema: pa.Schema) -> str:
+    return base64.b64encode(schema.serialize().to_pybytes()).decode()
+
+
+def decode_schema(data: str) -> pa.Schema:
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(data)))
+
+
+class DeltaPlan:
+    """
+    The rows to publish for one run and how to publish them.
+
+    mode: "overwrite" (first run or rebuild, full data), "append" (rows past the watermark),
+          "upsert" (new or changed keys) or "none" (nothing new)
+    """
+
+    def __init__(self, mode: str, frame: pd.DataFrame, state: IncrementalState, pending: dict,
+                 column: Optional[str] = None, keys: Optional[pd.Series] = None):
+        self.mode = mode
+        self.frame = frame
+        self.column = column
+        self.state = state
+        self.pending = pending
+        self.keys = keys
+
+    @property
+    def rows(self) -> int:
+        return len(self.frame)
+
+    @property
+    def schema(self) -> Optional[pa.Schema]:
+        """
+        Schema the delta extract must be written with to match the published one
+        """
+        return decode_schema(self.pending["schema"]) if self.pending.get("schema") else None
+
+    def commit(self):
+        """
+        Records the delta as published. Call only after the publish succeeded.
+        """
+        self.state.save(self.pending, self.keys)
+
+
+class DeltaPlanner:
+    """
+    Works out which rows of a frame are new since the last published run.
+
+    watermark mode: rows whose watermark_column (date or number) is at or past the highest value published.
+                    Rows at that value that were already published are recognised by a 64-bit row hash, so a
+                    late row sharing the last timestamp is still sent once. Published with Append. Rows with a
+                    null watermark are only sent by full runs.
+    key mode:       rows whose key_column value is new, or whose row content changed, compared by 64-bit
+                    hashes. Published with a Hyper upsert keyed on the column. Deleted rows are not propagated.
+    The key column defaults to the first column the MetadataScanner profile flags is_likely_id.
+    """
+
+    def __init__(self, profile: Optional[dict] = None, key_column: Optional[str] = None, watermark_column: Optional[str] = None):
+        self.profile = profile or {}
+        self.key_column = key_column
+        self.watermark_column = watermark_column
+
+    def choose(self, df: pd.DataFrame) -> tuple:
+        """
+        Return: ("watermark" | "key", column) or (None, None) when the frame has neither
+        """
+        if self.watermark_column:
+            if self.watermark_column not in df.columns:
+                raise ValueError(f"Watermark column '{self.watermark_column}' is not in the data")
+            return "watermark", self.watermark_column
+
+        if self.key_column:
+            if self.key_column not in df.columns:
+                raise ValueError(f"Key column '{self.key_column}' is not in the data")
+            return "key", self.key_column
+
+        key = next((col for col in df.columns if self.profile.get(col, {}).get("is_likely_id")), None)
+        return ("key", key) if key is not None else (None, None)
+
+    def plan(self, df: pd.DataFrame, state: IncrementalState) -> DeltaPlan:
+        kind, column = self.choose(df)
+        previous = state.load()
+
+        if kind is None:
+            print("Incremental: no key or watermark column, publishing the full data")
+            return DeltaPlan("overwrite", df, state, {})
+
+        if previous.get("kind") != kind or previous.get("column") != column or not previous.get("schema"):
+            print(f"Incremental: no previous state for {kind} column '{column}', publishing the full data")
+            return self._full(df, state, kind, column)
+
+        if kind == "watermark":
+            return self._watermark_delta(df, state, column, previous)
+        return self._key_delta(df, state, column, previous)
+
+    def _full(self, df: pd.DataFrame, state: IncrementalState, kind: str, column: str) -> DeltaPlan:
+        pending = {"kind": kind, "column": column}
+        keys = None
+
+        if kind == "watermark":
+            pending["watermark"] = self._max_watermark(df[column])
+            pending["boundary"] = self._boundary_hashes(df, column, pending["watermark"])
+        else:
+            keys = self._hashes(df, column)
+
+        return DeltaPlan("overwrite", df, state, pending, column=column, keys=keys)
+
+    def _watermark_delta(self, df: pd.DataFrame, state: IncrementalState, column: str, previous: dict) -> DeltaPlan:
+        values = self._watermark_values(df[column])
+        last = previous.get("watermark")
+
+        if last is None:
+            delta = values.notna()
+        else:
+            threshold = self._as_watermark(values, last)
+            at_last = (values == threshold).fillna(False).astype(bool)
+            # Rows at the last watermark may arrive after it was published, only the ones already sent are skipped
+            published = at_last & pd.Series(self._row_hashes(df, column)[1], index=df.index).isin(previous.get("boundary") or [])
+            delta = (values > threshold) | (at_last & ~published)
+        delta = delta.fillna(False).astype(bool)
+
+        pending = dict(previous)
+        if delta.any():
+            pending["watermark"] = self._max_watermark(df.loc[delta, column])
+            boundary = self._boundary_hashes(df.loc[delta], column, pending["watermark"])
+            if pending["watermark"] == last:
+                boundary = sorted(set(boundary) | set(previous.get("boundary") or []))
+            pending["boundary"] = boundary
+
+        print(f"Incremental: {int(delta.sum())} of {len(df)} rows past watermark {last} on '{column}'")
+        return DeltaPlan("append" if delta.any() else "none", df[delta], state, pending, column=column)
+
+    def _key_delta(self, df: pd.DataFrame, state: IncrementalState, column: str, previous: dict) -> DeltaPlan:
+        key_hashes, row_hashes = self._row_hashes(df, column)
+        published = state.load_keys()
+
+        # Hashes are compared as uint64, a float round trip through NaN would lose their low bits
+        known = published.reindex(key_hashes, fill_value=0).to_numpy(dtype="uint64")
+        delta = ~np.isin(key_hashes, published.index.to_numpy()) | (known != row_hashes)
+
+        # Current rows replace the published hashes of their keys
+        current = self._hashes(df, column)
+        merged = pd.concat([published[~published.index.isin(current.index)], current])
+
+        print(f"Incremental: {int(delta.sum())} of {len(df)} rows new or changed on key '{column}'")
+        return DeltaPlan("upsert" if delta.any() else "none", df[delta], state, dict(previous), column=column, keys=merged)
+
+    @staticmethod
+    def _row_hashes(df: pd.DataFrame, column: str) -> tuple:
+        key_hashes = pd.util.hash_pandas_object(df[column], index=False).to_numpy()
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        return key_hashes, row_hashes
+
+    @classmethod
+    def _hashes(cls, df: pd.DataFrame, column: str) -> pd.Series:
+        key_hashes, row_hashes = cls._row_hashes(df, column)
+        # Duplicate keys keep their last row, like the upsert will
+        hashes = pd.Series(row_hashes, index=key_hashes)
+        return hashes[~hashes.index.duplicated(keep="last")]
+
+    @staticmethod
+    def _as_watermark(values: pd.Series, stored):
+        return pd.Timestamp(stored) if pd.api.types.is_datetime64_any_dtype(values) else stored
+
+    def _boundary_hashes(self, df: pd.DataFrame, column: str, watermark) -> list:
+        """
+        Return: Row hashes (ints, JSON safe) of the rows at the watermark
+        """
+        if watermark is None:
+            return []
+        values = self._watermark_values(df[column])
+        at_watermark = (values == self._as_watermark(values, watermark)).fillna(False).astype(bool).to_numpy()
+        return [int(h) for h in self._row_hashes(df, column)[1][at_watermark]]
+
+    @staticmethod
+    def _watermark_values(series: pd.Series) -> pd.Series:
+        numbers = to_numeric(series)
+        if numbers is not None:
+            return numbers
+        dates = to_datetime(series)
+        if dates is not None:
+            return dates
+        raise ValueError(f"Watermark column '{series.name}' must hold dates or numbers")
+
+    def _max_watermark(self, series: pd.Series):
+        latest = self._watermark_values(series).max()
+        if pd.isna(latest):
+            return None
+        return latest.isoformat() if isinstance(latest, pd.Timestamp) else float(latest)
@@ -1,25 +1,223 @@
 import tableauserverclient as TSC
+from tableauserverclient.server import RequestFactory
+from tableauserverclient.server.endpoint.exceptions import JobCancelledException, JobFailedException
 from dotenv import load_dotenv
 from sse_manager import event_manager
+from typing import Optional
+import asyncio
+import hashlib
+import threading
+import time
 import os
 import json
 
 load_dotenv()
 
+BYTES_PER_MB = 1024 * 1024
+
+
+def is_auth_expired(error: Exception) -> bool:
+    """
+    True when the server rejected the session token (expired / signed out), not the credentials themselves
+    """
+    if isinstance(error, TSC.FailedSignInError):
+        return False
+    if isinstance(error, TSC.NotSignedInError):
+        return True
+    return isinstance(error, TSC.ServerResponseError) and str(error.code).startswith("401")
+
+
+class TableauSessionCache:
+    """
+    Keeps one signed-in TSC.Server per (server_url, site, token_name, token hash).
+
+    Signing in costs a round trip and, with a Personal Access Token, invalidates the previous session of
+    that token anyway, so publishers with the same credentials share one session. A session is signed in
+    again after session_ttl seconds or when a request reports it expired (see TableauCloudPublisher._run).
+    """
+
+    def __init__(self, session_ttl: float = 6000, server_factory=None):
+        """
+        session_ttl: Seconds before a session is proactively renewed. Tableau Cloud idles sessions out after ~2 hours
+        server_factory: Callable(server_url) -> TSC.Server, replaceable for tests
+        """
+        self.session_ttl = session_ttl
+        self.server_factory = server_factory or (lambda server_url: TSC.Server(server_url, use_server_version=True))
+        self.sign_ins = 0
+
+        self._sessions = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(server_url: str, site_name: str, token_name: str, token: str = "") -> tuple:
+        # Token names aren't unique across users, the secret tells sessions apart. Only its hash is kept.
+        return (server_url.rstrip("/"), site_name or "", token_name, hashlib.sha256(token.encode()).hexdigest())
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key: tuple, auth) -> "TSC.Server":
+        """
+        Returns the cached signed-in server for key, signing in first if there is none or it is too old
+        """
+        with self._key_lock(key):
+            cached = self._sessions.get(key)
+            if cached is not None:
+                server, signed_in_at = cached
+                if server.is_signed_in() and time.monotonic() - signed_in_at < self.session_ttl:
+                    return server
+                self._sign_out(server)
+
+            print(f"Signing in to {key[0]} (site '{key[1]}')...")
+            server = self.server_factory(key[0])
+            server.auth.sign_in(auth)
+            self.sign_ins += 1
+            print("Authentication successful.")
+
+            self._sessions[key] = (server, time.monotonic())
+            return server
+
+    def invalidate(self, key: tuple, server=None):
+        """
+        Drops the cached session, only if it is still `server` when one is given (another thread may have renewed it)
+        """
+        with self._key_lock(key):
+            cached = self._sessions.get(key)
+            if cached is not None and (server is None or cached[0] is server):
+                del self._sessions[key]
+                self._sign_out(cached[0])
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+
+        for server, _ in sessions:
+            self._sign_out(server)
+
+    @staticmethod
+    def _sign_out(server):
+        try:
+            server.auth.sign_out()
+        except Exception:
+            pass
+
+
+# Shared by every publisher in the application
+tableau_sessions = TableauSessionCache(session_ttl=float(os.getenv("TABLEAU_SESSION_TTL") or 6000))
+
+
+class ProjectResolver:
+    """
+    Resolves project names to ids with the fewest API calls.
+
+    Ids are cached per (server_url, site, project name) for `ttl` seconds, so repeat publishes to the same
+    project make no project calls at all. A miss asks the server for that one name (name:eq filter) instead
+    of listing every project, and a project missing on the server is created. When another worker creates it
+    first, the 409 conflict is answered by looking the name up again.
+    """
+
+    # Tableau's "name already exists" error
+    CONFLICT_CODE = "409006"
+
+    def __init__(self, ttl: float = 600):
+        self.ttl = ttl
+        self.lookups = 0
+
+        self._ids = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def resolve(self, server, site_key: tuple, project_name: str) -> str:
+        """
+        Input: server: signed-in TSC.Server, site_key: (server_url, site) the server is signed in to
+        Return: id of the top-level project called project_name, created if it doesn't exist
+        """
+        key = (*site_key, project_name)
+
+        # One lookup per key at a time, concurrent publishers to the same project wait for its result
+        with self._key_lock(key):
+            cached = self._ids.get(key)
+            if cached is not None and time.monotonic() < cached[1]:
+                return cached[0]
+
+            project_id = self._lookup(server, project_name) or self._create(server, project_name)
+            self._ids[key] = (project_id, time.monotonic() + self.ttl)
+            return project_id
+
+    def invalidate(self, site_key: tuple, project_name: str):
+        self._ids.pop((*site_key, project_name), None)
+
+    def _lookup(self, server, project_name: str) -> Optional[str]:
+        self.lookups += 1
+
+        if "," in project_name or ":" in project_name:
+            # The filter syntax can't express these characters, page through the projects instead
+            matches = [p for p in TSC.Pager(server.projects) if p.name == project_name]
+        else:
+            options = TSC.RequestOptions()
+            options.filter.add(TSC.Filter(TSC.RequestOptions.Field.Name, TSC.RequestOptions.Operator.Equals, project_name))
+            matches = [p for p in server.projects.get(options)[0] if p.name == project_name]
+
+        # Nested projects can share a name, prefer the top-level one we would have created
+        matches.sort(key=lambda p: p.parent_id is not None)
+        return matches[0].id if matches else None
+
+    def _create(self, server, project_name: str) -> str:
+        print(f"Project '{project_name}' not found. Creating it...")
+        try:
+            project = server.projects.create(TSC.ProjectItem(name=project_name))
+        except TSC.ServerResponseError as e:
+            if str(e.code) != self.CONFLICT_CODE:
+                raise
+            # Created by another worker between our lookup and create
+            project_id = self._lookup(server, project_name)
+            if project_id is None:
+                raise
+            return project_id
+
+        print(f"Created new project with ID: {project.id}")
+        return project.id
+
+
+project_resolver = ProjectResolver(ttl=float(os.getenv("TABLEAU_PROJECT_TTL") or 600))
+
+
 class TableauCloudPublisher:
-    def __init__(self, user_id, server_url, site_name, token, token_name):
+    def __init__(self, user_id, server_url, site_name, token, token_name, sessions: Optional[TableauSessionCache] = None,
+                 projects: Optional["ProjectResolver"] = None,
+                 chunk_mb: Optional[int] = None, chunk_retries: int = 3, publish_timeout: Optional[float] = None, poll_interval: float = 1):
         """
         Initialize connection details.
         Best Practice: Use Personal Access Tokens (PATs) for scripts, not passwords.
+
+        sessions: Signed-in session cache, defaults to the shared tableau_sessions
+        projects: Project id resolver, defaults to the shared project_resolver
+        chunk_mb: Size of each upload chunk (TABLEAU_CHUNK_MB, default 50)
+        chunk_retries: Attempts per chunk before the upload is given up, earlier chunks are never re-sent
+        publish_timeout: Seconds to wait for the server-side publish job (TABLEAU_PUBLISH_TIMEOUT, default 1800)
+        poll_interval: First delay between job status checks in apublish, doubled up to 30s
         """
         self.user_id = user_id
         self.server_url = server_url
-        print(server_url, site_name, token, token_name)
         self.auth = TSC.PersonalAccessTokenAuth(
             site_id=site_name,
             token_name=token_name,
             personal_access_token=token,
         )
+        self.sessions = sessions or tableau_sessions
+        self.projects = projects or project_resolver
+        self.session_key = TableauSessionCache.make_key(server_url, site_name, token_name, token)
+        self.chunk_size = (chunk_mb or int(os.getenv("TABLEAU_CHUNK_MB") or 50)) * BYTES_PER_MB
+        self.chunk_retries = chunk_retries
+        self.publish_timeout = publish_timeout or float(os.getenv("TABLEAU_PUBLISH_TIMEOUT") or 1800)
+        self.poll_interval = poll_interval
     
     # def get_token(self, client_id, secret_id, secret_val, user):
     #     token = jwt.encode(
@@ -48,10 +246,73 @@ class TableauCloudPublisher:
 
     #     return token
 
-    def publish(self, file_path, project_name="Default", datasource_name=None, certify=True):
+    def _run(self, fn, *args, **kwargs):
+        """
+        Runs fn(server, ...) on the cached session, signing in again once if the session expired
+        """
+        server = self.sessions.get(self.session_key, self.auth)
+        try:
+            return fn(server, *args, **kwargs)
+        except Exception as e:
+            if not is_auth_expired(e):
+                raise
+            print("Tableau session expired, signing in again...")
+            self.sessions.invalidate(self.session_key, server)
+            return fn(self.sessions.get(self.session_key, self.auth), *args, **kwargs)
+
+    def publish(self, file_path, project_name="Default", datasource_name=None, certify=True, mode="overwrite",
+                key_column=None, table_name="Extract"):
         """
         Publishes the .hyper file and optionally marks it as 'Certified'.
+
+        The file is uploaded in chunks and published as a server-side job, this call waits for the job.
+
+        mode: "overwrite" replaces the datasource, "append" adds the file's rows to it and "upsert" inserts or
+              updates the rows matching on key_column (Hyper update actions on Extract.<table_name>).
+              "append" / "upsert" need the datasource to exist with the same table schema.
         """
+        job, upload = self._submit(file_path, project_name, datasource_name, mode, key_column, table_name)
+
+        print(f"Waiting for publish job {job.id}...")
+        job = self._run(lambda server: server.jobs.wait_for_job(job, timeout=self.publish_timeout))
+
+        return self._complete(job, upload, certify)
+
+    async def apublish(self, file_path, project_name="Default", datasource_name=None, certify=True, mode="overwrite",
+                       key_column=None, table_name="Extract"):
+        """
+        asyncio version of publish. Upload and requests run in a thread, the job is polled with
+        asyncio.sleep in between so no worker thread is held while Tableau processes the extract.
+        """
+        job, upload = await asyncio.to_thread(self._submit, file_path, project_name, datasource_name, mode, key_column, table_name)
+
+        print(f"Waiting for publish job {job.id}...")
+        deadline = time.monotonic() + self.publish_timeout
+        delay = self.poll_interval
+        while job.completed_at is None:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Publish job {job.id} did not finish within {self.publish_timeout}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+            job = await asyncio.to_thread(self._run, lambda server: server.jobs.get_by_id(job.id))
+
+        if job.finish_code == TSC.JobItem.FinishCode.Failed:
+            raise JobFailedException(job)
+        if job.finish_code == TSC.JobItem.FinishCode.Cancelled:
+            raise JobCancelledException(job)
+
+        return await asyncio.to_thread(self._complete, job, upload, certify)
+
+    def _submit(self, file_path, project_name, datasource_name, mode="overwrite", key_column=None, table_name="Extract"):
+        """
+        Uploads the file and starts the publish / update job.
+
+        Return: (JobItem, upload state)
+        """
+        if mode not in ("overwrite", "append", "upsert"):
+            raise ValueError(f"Unknown publish mode '{mode}', expected 'overwrite', 'append' or 'upsert'")
+        if mode == "upsert" and not key_column:
+            raise ValueError("Upsert publishing needs a key_column")
 
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Hyper file not found at: {file_path}")
@@ -61,42 +322,125 @@ class TableauCloudPublisher:
             datasource_name = os.path.basename(file_path).replace(".hyper", "")
 
         print(f"Connecting to {self.server_url}...")
-        
-        server = TSC.Server(self.server_url, use_server_version=True)
-        
-        with server.auth.sign_in(self.auth):
-            print("Authentication successful.")
 
-            # 1. Find the Project ID (Target Folder)
-            # We must scan projects to find the one matching 'project_name'
-            all_projects, _ = server.projects.get()
-            target_project = next((p for p in all_projects if p.name == project_name), None)
-            
-            if not target_project:
-                print(f"Project '{project_name}' not found. Creating it...")
-                new_project = TSC.ProjectItem(name=project_name)
-                target_project = server.projects.create(new_project)
-                print(f"Created new project with ID: {target_project.id}")
-
-            print(f"Found Project '{project_name}' (ID: {target_project.id}). Publishing...")
-
-            # 2. Define the Datasource configuration
-            new_datasource = TSC.DatasourceItem(target_project.id, name=datasource_name)
-            new_datasource.use_remote_query_agent = True # optimises for Hyper
-
-            # 3. Upload the File (Overwrite if exists)
-            published_ds = server.datasources.publish(
-                new_datasource, 
-                file_path, 
-                mode=TSC.Server.PublishMode.Overwrite
-            )
-            
+        # Survives a re-sign-in, so an upload interrupted by an expired session continues where it stopped
+        upload = {"file_path": file_path, "session_id": None, "offset": 0, "project_id": None, "name": datasource_name,
+                  "mode": mode, "key_column": key_column, "table_name": table_name, "datasource_id": None}
+
+        def submit(server):
+            if upload["project_id"] is None:
+                upload["project_id"] = self.projects.resolve(server, self.session_key[:2], project_name)
+                print(f"Found Project '{project_name}' (ID: {upload['project_id']}). Publishing...")
+
+            if mode != "overwrite" and upload["datasource_id"] is None:
+                # Checked before uploading, a delta can't be applied to a datasource that isn't there
+                datasource = self._find_datasource(server, upload)
+                if datasource is None:
+                    raise LookupError(f"Datasource '{upload['name']}' does not exist, it must be published in full first")
+                upload["datasource_id"] = datasource.id
+
+            self._upload_chunks(server, upload)
+            if mode == "upsert":
+                return self._start_update_job(server, upload)
+            try:
+                return self._start_publish_job(server, upload)
+            except TSC.ServerResponseError as e:
+                if not str(e.code).startswith("404"):
+                    raise
+                # The cached project was deleted on the server, resolve it again. The upload is kept
+                print(f"Project '{project_name}' no longer exists, resolving it again...")
+                self.projects.invalidate(self.session_key[:2], project_name)
+                upload["project_id"] = self.projects.resolve(server, self.session_key[:2], project_name)
+                return self._start_publish_job(server, upload)
+
+        return self._run(submit), upload
+
+    def _upload_chunks(self, server, upload):
+        """
+        Sends the file to an upload session chunk by chunk. A failed chunk is retried with backoff and the
+        upload resumes from upload["offset"], chunks the server already acknowledged are never re-sent.
+        """
+        if upload["session_id"] is None:
+            upload["session_id"] = server.fileuploads.initiate()
+            upload["offset"] = 0
+
+        file_size = os.path.getsize(upload["file_path"])
+
+        with open(upload["file_path"], "rb") as file:
+            while upload["offset"] < file_size:
+                file.seek(upload["offset"])
+                chunk = file.read(self.chunk_size)
+
+                for attempt in range(1, self.chunk_retries + 1):
+                    try:
+                        request, content_type = RequestFactory.Fileupload.chunk_req(chunk)
+                        server.fileuploads.append(upload["session_id"], request, content_type)
+                        break
+                    except Exception as e:
+                        if is_auth_expired(e) or attempt == self.chunk_retries:
+                            raise
+                        print(f"Chunk at byte {upload['offset']} failed ({e}), retrying ({attempt}/{self.chunk_retries})...")
+                        time.sleep(min(2 ** attempt, 30))
+
+                upload["offset"] += len(chunk)
+                print(f"   Uploaded {upload['offset'] / BYTES_PER_MB:.1f}/{file_size / BYTES_PER_MB:.1f} MB")
+
+    def _start_publish_job(self, server, upload):
+        # 2. Define the Datasource configuration
+        new_datasource = TSC.DatasourceItem(upload["project_id"], name=upload["name"])
+        new_datasource.use_remote_query_agent = True # optimises for Hyper
+
+        # 3. Commit the uploaded file (Overwrite if exists, or Append) as an asynchronous job
+        url = f"{server.datasources.baseurl}?datasourceType=hyper&{upload['mode']}=true&asJob=true&uploadSessionId={upload['session_id']}"
+        xml_request, content_type = RequestFactory.Datasource.publish_req_chunked(new_datasource)
+        server_response = server.datasources.post_request(url, xml_request, content_type)
+
+        return TSC.JobItem.from_response(server_response.content, server.namespace)[0]
+
+    def _start_update_job(self, server, upload):
+        """
+        Upserts the uploaded rows into the published extract with a Hyper update action (same as
+        datasources.update_hyper_data, but re-using our resumable upload session)
+        """
+        table = {"schema": "Extract", "table": upload["table_name"]}
+        actions = [{
+            "action": "upsert",
+            "source-schema": table["schema"], "source-table": table["table"],
+            "target-schema": table["schema"], "target-table": table["table"],
+            "condition": {"op": "eq", "target-col": upload["key_column"], "source-col": upload["key_column"]},
+        }]
+
+        # The request id makes a retried PATCH for the same upload run only once on the server
+        url = f"{server.datasources.baseurl}/{upload['datasource_id']}/data?uploadSessionId={upload['session_id']}"
+        server_response = server.datasources.patch_request(
+            url, json.dumps({"actions": actions}), "application/json",
+            parameters={"headers": {"requestid": f"upsert-{upload['session_id']}"}}
+        )
+
+        return TSC.JobItem.from_response(server_response.content, server.namespace)[0]
+
+    def _find_datasource(self, server, upload):
+        options = TSC.RequestOptions()
+        options.filter.add(TSC.Filter(TSC.RequestOptions.Field.Name, TSC.RequestOptions.Operator.Equals, upload["name"]))
+        return next((ds for ds in server.datasources.get(options)[0] if ds.project_id == upload["project_id"]), None)
+
+    def _complete(self, job, upload, certify):
+        def complete(server):
+            if job.datasource_id:
+                published_ds = server.datasources.get_by_id(job.datasource_id)
+            else:
+                published_ds = self._find_datasource(server, upload)
+
             print(f"✅ Published: '{published_ds.name}' (ID: {published_ds.id})")
 
             # 4. The 'Impact' Step: Certify the Data
             if certify:
                 self._certify_datasource(server, published_ds)
 
+            return published_ds
+
+        return self._run(complete)
+
     def _certify_datasource(self, server, datasource):
         """
         Internal helper to apply the 'Certified' badge.
@@ -112,3 +456,88 @@ class TableauCloudPublisher:
         server.datasources.update(datasource)
         print(f"🏆 Certification applied to '{datasource.name}'.")
 
+
+
+class MultiTargetPublisher:
+    """
+    Publishes one generated .hyper file to several sites / projects at once.
+
+    Targets are published concurrently, at most max_concurrency in total and per_site_concurrency per
+    (server_url, site) so a single site isn't flooded with parallel uploads. A target can lower its own
+    site's limit with "max_concurrency". Every target reports its outcome and latency, one failing target
+    doesn't stop the others.
+
+    Target dict keys: server_url, site_name, token, token_name, project_name, datasource_name,
+                      certify (default True), max_concurrency (optional)
+    """
+
+    def __init__(self, user_id, max_concurrency: int = 4, per_site_concurrency: int = 1,
+                 sessions: Optional[TableauSessionCache] = None, projects: Optional[ProjectResolver] = None, **publisher_options):
+        """
+        publisher_options: Passed to every TableauCloudPublisher (chunk_mb, chunk_retries, publish_timeout...)
+        """
+        self.user_id = user_id
+        self.max_concurrency = max_concurrency
+        self.per_site_concurrency = per_site_concurrency
+        self.sessions = sessions
+        self.projects = projects
+        self.publisher_options = publisher_options
+
+    async def publish(self, file_path, targets: list, mode="overwrite", key_column=None, table_name="Extract") -> list:
+        """
+        Input: file_path: the .hyper file shared by every target, targets: list of target dicts
+        Return: One result per target, in the order given:
+                {"server_url", "site_name", "project_name", "datasource_name", "status": "published" | "failed",
+                 "seconds", "datasource_id", "error"}
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Hyper file not found at: {file_path}")
+
+        # Semaphores belong to the running event loop, so they are made per call
+        overall = asyncio.Semaphore(self.max_concurrency)
+        site_limits = {}
+        for target in targets:
+            site = TableauSessionCache.make_key(target["server_url"], target["site_name"], "")[:2]
+            limit = min(self.per_site_concurrency, target.get("max_concurrency") or self.per_site_concurrency)
+            site_limits[site] = min(limit, site_limits.get(site, limit))
+        site_semaphores = {site: asyncio.Semaphore(limit) for site, limit in site_limits.items()}
+
+        async def publish_target(target):
+            site = TableauSessionCache.make_key(target["server_url"], target["site_name"], "")[:2]
+            result = {
+                "server_url": target["server_url"],
+                "site_name": target["site_name"],
+                "project_name": target.get("project_name", "Default"),
+                "datasource_name": target.get("datasource_name"),
+                "status": "failed",
+                "seconds": None,
+                "datasource_id": None,
+                "error": None,
+            }
+
+            async with site_semaphores[site], overall:
+                started = time.perf_counter()
+                try:
+                    publisher = TableauCloudPublisher(
+                        self.user_id, target["server_url"], target["site_name"], target["token"], target["token_name"],
+                        sessions=self.sessions, projects=self.projects, **self.publisher_options
+                    )
+                    published_ds = await publisher.apublish(
+                        file_path, project_name=result["project_name"], datasource_name=result["datasource_name"],
+                        certify=target.get("certify", True), mode=mode, key_column=key_column, table_name=table_name
+                    )
+                    result.update(status="published", datasource_id=published_ds.id)
+                except Exception as e:
+                    print(f"Publishing to {target['server_url']} ({target['site_name']}) failed: {e}")
+                    result["error"] = str(e)
+                finally:
+                    result["seconds"] = round(time.perf_counter() - started, 3)
+
+            return result
+
+        results = await asyncio.gather(*[publish_target(target) for target in targets])
+
+        for result in results:
+            print(f"   {result['status']:<9} {result['server_url']} / {result['site_name']} / {result['project_name']} in {result['seconds']}s")
+
+        return list(results)
@@ -1,8 +1,11 @@
 import pandas as pd
 import numpy as np
 from dateutil.parser import parse
+from typing import Optional
 from sse_manager import event_manager
 
+from IngestionLayer.TableStats import NULL_STRINGS, TableStats
+
 class MetadataScanner:
     def __init__(self, user_id):
         self.user_id = user_id
@@ -10,16 +13,13 @@ class MetadataScanner:
         self.data_count = 0
 
 
-    def scan(self, df: pd.DataFrame):
+    def scan(self, df: pd.DataFrame, stats: Optional[TableStats] = None):
         """
-        Input: Raw Pandas DataFrame
+        Input: Raw Pandas DataFrame, and its TableStats from the BridgeIngestor (computed here if missing)
         Output: A dictionary 'Profile' summarizing every column.
         """
-        str_cols = df.select_dtypes(include=["object", "string"]).columns
-        df[str_cols] = df[str_cols].fillna("null")
-
-        num_cols = df.select_dtypes(include=["number"]).columns
-        df[num_cols] = df[num_cols].fillna(0)
+        if stats is None:
+            stats = TableStats(df)
 
         print(df.head(10))
 
@@ -27,14 +27,14 @@ class MetadataScanner:
         event_data = {}
 
         for col in df.columns:
-            # 1. Global Stats (Calculate on FULL data for accuracy)
-            total_rows = len(df)
-            null_count = df[col].isnull().sum()
-            unique_count = df[col].nunique()
+            # 1. Global Stats (computed once on the FULL data by TableStats)
+            total_rows = stats.total_rows
+            column_stats = stats.column(col)
+            unique_count = column_stats["unique_count"]
             
             # Calculate Ratios for the Logic Engine
-            unique_ratio = float(unique_count / total_rows) if total_rows > 0 else 0
-            null_ratio = float(null_count / total_rows) if total_rows > 0 else 0
+            unique_ratio = float(column_stats["unique_ratio"])
+            null_ratio = float(column_stats["null_ratio"])
             
             # 2. Sample the data for expensive checks (Regex/Parsing)
             # We use 'head(1000)' so we don't slow down on massive files
@@ -86,9 +86,7 @@ class MetadataScanner:
             # --- PRE-CLEANING ---
             # 1. Replace literal "null" strings with actual NaN so they are dropped
             # This fixes the "unable to parse: null" error
-            series_cleaned = series.replace(
-                ['null', 'NULL', 'Null', 'nan', 'NaN'], np.nan
-            )
+            series_cleaned = series.replace(NULL_STRINGS, np.nan)
             
             # 2. Create non-null sample
             sample_size = 1000
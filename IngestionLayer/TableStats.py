@@ -0,0 +1,173 @@
+import os
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Placeholders treated as missing, the same MetadataScanner and HyperSchema clean out
+NULL_STRINGS = ['null', 'NULL', 'Null', 'nan', 'NaN']
+
+# SSE payloads show nulls as "null" / 0 (what the frontend expects), "false" sends JSON null instead
+SSE_NULL_SENTINELS = os.getenv("SSE_NULL_SENTINELS", "true").lower() != "false"
+
+
+class TableStats:
+    """
+    Per-table statistics computed once at ingestion and carried through the pipeline with the table.
+
+    null_mask:     True where a cell was missing at ingestion (NaN / None or a null placeholder string).
+                   The frame itself carries these as real nulls in nullable dtypes (see to_nullable).
+    null_counts:   Missing cells per column
+    unique_counts: Distinct non-null values per column
+
+    Columns renamed by the SemanticMapper are renamed with rename(), columns whose values are rewritten
+    (entity / date resolution) are recomputed with update(). Everything else is never scanned again.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.total_rows = len(df)
+        self.null_mask = find_nulls(df)
+        self.null_counts = self.null_mask.sum()
+        self.unique_counts = self._unique_counts(df, self.null_mask)
+
+    def column(self, column: str) -> dict:
+        null_count = int(self.null_counts[column])
+        unique_count = int(self.unique_counts[column])
+        return {
+            "null_count": null_count,
+            "unique_count": unique_count,
+            "null_ratio": null_count / self.total_rows if self.total_rows else 0.0,
+            "unique_ratio": unique_count / self.total_rows if self.total_rows else 0.0,
+        }
+
+    def is_unique(self, column: str) -> bool:
+        """
+        Same answer as df[column].is_unique on the data with its nulls restored (a single null counts as a value)
+        """
+        return int(self.unique_counts[column]) + min(int(self.null_counts[column]), 1) == self.total_rows
+
+    def without_mask(self) -> "TableStats":
+        """
+        A copy holding only the counts (null_mask is None), cheap to send to another process.
+        column() and is_unique() work the same on it.
+        """
+        stats = TableStats.__new__(TableStats)
+        stats.total_rows = self.total_rows
+        stats.null_mask = None
+        stats.null_counts = self.null_counts.copy()
+        stats.unique_counts = self.unique_counts.copy()
+        return stats
+
+    def rename(self, mapping: dict):
+        self.null_mask = self.null_mask.rename(columns=mapping)
+        self.null_counts = self.null_counts.rename(index=mapping)
+        self.unique_counts = self.unique_counts.rename(index=mapping)
+
+    def update(self, df: pd.DataFrame, columns: list):
+        """
+        Recomputes the statistics of columns whose values changed. Rows must not have been added or dropped.
+        """
+        columns = [col for col in columns if col in df.columns]
+        if not columns:
+            return
+
+        mask = find_nulls(df[columns])
+        self.null_mask[columns] = mask
+        self.null_counts[columns] = mask.sum()
+        self.unique_counts[columns] = self._unique_counts(df[columns], mask)
+
+    @staticmethod
+    def _unique_counts(df: pd.DataFrame, mask: pd.DataFrame) -> pd.Series:
+        return pd.Series({col: df[col][~mask[col].to_numpy()].nunique() for col in df.columns}, index=df.columns, dtype="int64")
+
+
+def find_nulls(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return: Boolean frame, True for NaN / None cells and for null placeholder strings in text columns
+    """
+    mask = df.isna()
+    text_cols = df.select_dtypes(include=["object", "string"]).columns
+    for col in text_cols:
+        mask[col] = mask[col].to_numpy() | df[col].isin(NULL_STRINGS).to_numpy()
+    return mask
+
+
+def to_nullable(df: pd.DataFrame, null_mask: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Converts a loaded frame to the representation the pipeline carries: placeholders become real nulls and
+    columns get nullable dtypes (Int64, Float64, boolean, string[pyarrow]) instead of object storage.
+
+    null_mask: The frame's find_nulls() mask, if it was already computed
+    """
+    mask = find_nulls(df) if null_mask is None else null_mask
+    text_cols = [col for col in df.select_dtypes(include=["object", "string"]).columns if mask[col].any()]
+    if text_cols:
+        # Shallow copy, only the replaced columns are new arrays
+        df = df.copy(deep=False)
+        for col in text_cols:
+            df[col] = df[col].mask(mask[col].to_numpy())
+
+    df = df.convert_dtypes()
+    string_cols = [col for col in df.columns if isinstance(df[col].dtype, pd.StringDtype) and df[col].dtype.storage != "pyarrow"]
+    if string_cols:
+        df = df.astype({col: pd.StringDtype("pyarrow") for col in string_cols})
+    return df
+
+
+def replace_columns(df: pd.DataFrame, renames: dict, replacements: dict, stats: TableStats = None, profile: dict = None) -> tuple:
+    """
+    Renames the columns of df and swaps in rewritten ones, without building a second full frame.
+
+    With pandas copy-on-write (enabled by main.py / worker.py) the renamed frame shares every untouched column
+    with df, only the replacement columns are new memory. df and profile are not modified.
+
+    renames:      {old name: new name}
+    replacements: {new name: rewritten Series}, e.g. from entity / date resolution
+    stats:        The table's TableStats, renamed and updated for the replaced columns in place
+    profile:      MetadataScanner profile keyed by the old names
+
+    Return: (updated frame, profile keyed by the new names)
+    """
+    updated = df.rename(columns=renames)
+
+    if replacements:
+        converted = to_nullable(pd.DataFrame(replacements, index=updated.index))
+        for col in converted.columns:
+            updated[col] = converted[col]
+
+    if stats is not None:
+        stats.rename(renames)
+        stats.update(updated, list(replacements))
+
+    if profile is not None:
+        profile = {renames.get(col, col): column_profile for col, column_profile in profile.items()}
+
+    return updated, profile
+
+
+def json_records(df: pd.DataFrame, text_null="null", number_null=0, sentinels: bool = None) -> list:
+    """
+    Rows of df as JSON ready dicts. This is the only place nulls are turned into placeholders.
+
+    sentinels: Fill nulls with text_null (text columns) / number_null (numeric columns), defaults to
+               SSE_NULL_SENTINELS. Other nulls, and every null when False, are sent as JSON null.
+    """
+    sentinels = SSE_NULL_SENTINELS if sentinels is None else sentinels
+
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        values = series.tolist()
+        mask = series.isna().to_numpy()
+        if mask.any():
+            fill = None
+            if sentinels and pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                fill = number_null
+            elif sentinels and (series.dtype == object or pd.api.types.is_string_dtype(series)):
+                fill = text_null
+            values = [fill if missing else value for value, missing in zip(values, mask)]
+        columns.append(values)
+
+    names = list(df.columns)
+    return [dict(zip(names, row)) for row in zip(*columns)]
@@ -1,5 +1,6 @@
-from agent import call_salesforce_agent
+from agent import call_salesforce_agent, acall_salesforce_agent, AgentUnavailableError
 import pandas as pd
+import numpy as np
 import json
 from dotenv import load_dotenv
 import os
@@ -24,20 +25,73 @@ class EntityResolver:
         # 1. Input Validation
         if series.empty:
             return series
-            
+
+        unknown_values = self._unknown_values(series)
+
+        # 4. Batch Process via SalesForce models
+        if unknown_values:
+            print(f"⚙️ Entity Resolver: Sending {len(unknown_values)} unique items to AI...")
+
+            try:
+                agent_id = os.getenv("ENTITY_AGENT_ID") or ""
+                response = call_salesforce_agent(message=self._entity_prompt(unknown_values), agent_id=agent_id)
+                self._apply_entity_response(response, col_name)
+            except AgentUnavailableError as e:
+                self._log_agent_unavailable(col_name, e)
+            except Exception as e:
+                raise ValueError (f"⚠️ AI Resolution Failed: {e}")
+
+        return self._map_resolved(series)
+
+    async def aresolve(self, series: pd.Series, col_name: str) -> pd.Series:
+        """
+        asyncio version of resolve, awaits the agent instead of blocking a thread.
+        """
+        if series.empty:
+            return series
+
+        unknown_values = self._unknown_values(series)
+
+        if unknown_values:
+            print(f"⚙️ Entity Resolver: Sending {len(unknown_values)} unique items to AI...")
+
+            try:
+                agent_id = os.getenv("ENTITY_AGENT_ID") or ""
+                response = await acall_salesforce_agent(message=self._entity_prompt(unknown_values), agent_id=agent_id)
+                self._apply_entity_response(response, col_name)
+            except AgentUnavailableError as e:
+                self._log_agent_unavailable(col_name, e)
+            except Exception as e:
+                raise ValueError (f"⚠️ AI Resolution Failed: {e}")
+
+        return self._map_resolved(series)
+
+    def _log_agent_unavailable(self, col_name: str, error: Exception):
+        # Degraded agent API: keep the column as-is rather than failing the whole run
+        print(f"⚠️ Entity agent unavailable, '{col_name}' left unresolved: {error}")
+        self.report_log.append({
+            "id": str(uuid.uuid4()),
+            "column": col_name,
+            "type": "Entity Resolution Skipped",
+            "message": f"Column '{col_name}' could not be checked for inconsistent naming because the resolution service was unavailable. Please re-run later.",
+            "status": "warning"
+        })
+
+    def _unknown_values(self, series: pd.Series) -> list:
         # 2. Optimization: Extract only UNIQUE values
         # We drop NA because we don't pay AI to clean nulls.
         unique_dirty_values = series.dropna().unique().tolist()
-        
+
         # 3. Check Cache (Don't resolve what we already know)
-        unknown_values = [
-            val for val in unique_dirty_values 
+        return [
+            val for val in unique_dirty_values
             if val not in self.resolution_cache
         ]
 
+    def _entity_prompt(self, unknown_values: list) -> str:
         example = '{ "IBM": [ "IBM corp", "I.B.M.", "International Business Machines", ] }'
         empty_dict = "{}"
-        prompt = f"""
+        return f"""
         Please Identify and merge entity name variants across datasets that refer to the same real-world entity (e.g., “IBM”, “I.B.M.”, “International Business Machines”).
         An Entity is defined as a string which can be mapped to other variants (e.g. Pend, pending, pnding -> Pending). This does not include strings which are meant to be unqiue (e.g. names like Mike S & Mario S)
         If no actions can be performed, please return an empty dict e.g. {empty_dict}
@@ -48,45 +102,36 @@ class EntityResolver:
         Return a dictionary mapping canonical names to their variants {example}
         Or an Empty dict {empty_dict}
         """
-        # 4. Batch Process via SalesForce models
-        if unknown_values:
-            print(f"⚙️ Entity Resolver: Sending {len(unknown_values)} unique items to AI...")
-            
-            try:
-                agent_id = os.getenv("ENTITY_AGENT_ID") or ""
-                response = call_salesforce_agent(message=prompt, agent_id=agent_id)
-
-                print(response)
-
-                match = re.search(r'\{.*?\}', response, flags=re.DOTALL)
-
-                if match:
-                    string = match.group(0)
-                else:
-                    string = empty_dict
-
-                results = json.loads(string)
-
-                formatted_results = {}  
-                for key, dirty_values in results.items():
-                    # key: mapped value (str)
-                    # dirty_values: some original values (list)
-                    self.report_log.append({
-                        "id": str(uuid.uuid4()),
-                        "column": col_name,
-                        "type": "Inconsistent Cell Namming",
-                        "message": f"Cells {", ".join(dirty_values)} ' were semantically mapped to {key}. Please validate with your team on consitent naming conventions!! ",
-                        "status": "critical"
-                    })
-
-                    formatted_results.update(dict(map(lambda x: (x, key), dirty_values)))
-            
-                self.resolution_cache.update(formatted_results)
-                
-            except Exception as e:
-                raise ValueError (f"⚠️ AI Resolution Failed: {e}")
 
+    def _apply_entity_response(self, response: str, col_name: str):
+        print(response)
+
+        match = re.search(r'\{.*?\}', response, flags=re.DOTALL)
+
+        if match:
+            string = match.group(0)
+        else:
+            string = "{}"
+
+        results = json.loads(string)
+
+        formatted_results = {}
+        for key, dirty_values in results.items():
+            # key: mapped value (str)
+            # dirty_values: some original values (list)
+            self.report_log.append({
+                "id": str(uuid.uuid4()),
+                "column": col_name,
+                "type": "Inconsistent Cell Namming",
+                "message": f"Cells {", ".join(dirty_values)} ' were semantically mapped to {key}. Please validate with your team on consitent naming conventions!! ",
+                "status": "critical"
+            })
 
+            formatted_results.update(dict(map(lambda x: (x, key), dirty_values)))
+
+        self.resolution_cache.update(formatted_results)
+
+    def _map_resolved(self, series: pd.Series) -> pd.Series:
         # 6. Apply Mapping to the full dataset (Vectorized Map)
         # Using .get to handle any NaNs or unexpected values gracefully
         return series.map(lambda x: self.resolution_cache.get(x, x))
@@ -109,17 +154,57 @@ class EntityResolver:
 
         return series
     
-    def resolve_headers(self, df):
+    def resolve_headers(self, df, header_relevance=None, use_agent=None, similarity_threshold=0.5):
         """
         Resolves datasets for irrelevant headers
 
         Input: 
         df: pd.Dataframe -> A pandas dataframe
+        header_relevance: dict -> Scores from SemanticMapper.get_header_relevance(). When given, off-topic headers are flagged locally
+        use_agent: bool -> Ask the header agent as a second opinion. Defaults to HEADER_AGENT_SECOND_OPINION, always on without scores
+        similarity_threshold: float -> The mapper's threshold, headers mapped to a field at or above it are never flagged
+        """
+        local_flags = find_outlier_headers(header_relevance, similarity_threshold=similarity_threshold) if header_relevance else []
+        agent_flags = []
+
+        if self._wants_agent(header_relevance, use_agent):
+            agent_id = os.getenv("COLUMN_AGENT_ID") or ""
+            try:
+                response = call_salesforce_agent(message=self._header_prompt(df), agent_id=agent_id)
+                agent_flags = self._parse_header_response(response)
+            except AgentUnavailableError as e:
+                print(f"⚠️ Header agent unavailable, skipping irrelevant header check: {e}")
+
+        self._log_irrelevant_headers(local_flags, agent_flags, header_relevance)
+
+    async def aresolve_headers(self, df, header_relevance=None, use_agent=None, similarity_threshold=0.5):
+        """
+        asyncio version of resolve_headers, awaits the agent instead of blocking a thread.
         """
+        local_flags = find_outlier_headers(header_relevance, similarity_threshold=similarity_threshold) if header_relevance else []
+        agent_flags = []
+
+        if self._wants_agent(header_relevance, use_agent):
+            agent_id = os.getenv("COLUMN_AGENT_ID") or ""
+            try:
+                response = await acall_salesforce_agent(message=self._header_prompt(df), agent_id=agent_id)
+                agent_flags = self._parse_header_response(response)
+            except AgentUnavailableError as e:
+                print(f"⚠️ Header agent unavailable, skipping irrelevant header check: {e}")
 
+        self._log_irrelevant_headers(local_flags, agent_flags, header_relevance)
+
+    def _wants_agent(self, header_relevance, use_agent) -> bool:
+        if not header_relevance:
+            return True
+        if use_agent is None:
+            return (os.getenv("HEADER_AGENT_SECOND_OPINION") or "").lower() in ("1", "true", "yes")
+        return use_agent
+
+    def _header_prompt(self, df) -> str:
         example = '["Mood", "Lamp_shade", "Pencil_thickness"]'
         empty_list = "[]"
-        prompt=f"""
+        return f"""
         From the provided dataset identify the column header(s) which may be proffesionally irrelevant to every other header (e.g. Revenue, Customer_ID, Shoe_size) -> ["Shoe_size"]
         If no headers are identified, please return an empty list e.g. {empty_list}
         
@@ -131,9 +216,7 @@ class EntityResolver:
         Or an Empty list {empty_list}
         """
 
-        agent_id = os.getenv("COLUMN_AGENT_ID") or ""
-        response = call_salesforce_agent(message=prompt, agent_id=agent_id)
-
+    def _parse_header_response(self, response: str) -> list:
         print(response)
         
         match = re.search(r'\[.*?\]', response, flags=re.DOTALL)
@@ -141,23 +224,75 @@ class EntityResolver:
         if match:
             string = match.group(0)
         else:
-            string = empty_list
+            string = "[]"
         
         print("string", string)
 
         headers = string.removeprefix("[").removesuffix("]").replace('"', "").split(", ")
 
-        print("Irrelevant headers", headers)
-        print(type(headers))
+        # "[]" splits into [""]
+        return [header.strip() for header in headers if header.strip()]
 
-        for header in headers:
+    def _log_irrelevant_headers(self, local_flags: list, agent_flags: list, header_relevance=None):
+        print("Irrelevant headers", local_flags, agent_flags)
+
+        for header in local_flags:
+            scores = header_relevance[header]
+            confirmed = " The header agent agrees." if header in agent_flags else ""
             self.report_log.append({
                 "id": str(uuid.uuid4()),
                 "column": header,
                 "type": "Potentially Irrelevant Headers",
-                "message": f"Column '{header}', has been flagged as irrelevant to the dataset context. Please validate this for future use.",
+                "message": f"Column '{header}', has been flagged as irrelevant to the dataset context (similarity to the data dictionary {scores['similarity']:.2f}).{confirmed} Please validate this for future use.",
                 "status": "critical"
             })
 
+        for header in agent_flags:
+            if header in local_flags:
+                continue
+            # Without the local check the agent is the only opinion, so it keeps its original weight
+            self.report_log.append({
+                "id": str(uuid.uuid4()),
+                "column": header,
+                "type": "Potentially Irrelevant Headers",
+                "message": f"Column '{header}', has been flagged as irrelevant to the dataset context. Please validate this for future use.",
+                "status": "warning" if header_relevance else "critical"
+            })
+
     def get_logs(self):
-        return self.report_log
\ No newline at end of file
+        return self.report_log
+
+
+def find_outlier_headers(header_relevance: dict, z_threshold: float = 2.5, similarity_threshold: float = 0.5, min_score: float = 0.15) -> list:
+    """
+    Flags headers that sit far from the chosen ontology, using the scores SemanticMapper already computed.
+
+    Each header's score is the mean of its best field similarity and its similarity to the ontology
+    centroid. A header is flagged when it didn't map to a field (similarity < similarity_threshold) and
+    its score is a low outlier (modified z-score below -z_threshold) or simply very low (< min_score).
+
+    Input:
+    header_relevance: dict -> { column_name: { "similarity": float, "centroid_similarity": float } }
+
+    Return:
+    list -> Flagged column names, in input order
+    """
+    columns = list(header_relevance.keys())
+    if not columns:
+        return []
+
+    similarity = np.array([header_relevance[col]["similarity"] for col in columns], dtype=float)
+    centroid_similarity = np.array([header_relevance[col]["centroid_similarity"] for col in columns], dtype=float)
+    scores = (similarity + centroid_similarity) / 2
+
+    # Median / MAD based z-score, a single odd header can't drag the baseline towards itself
+    median = np.median(scores)
+    mad = np.median(np.abs(scores - median))
+    if mad > 0:
+        z_scores = 0.6745 * (scores - median) / mad
+    else:
+        z_scores = np.zeros_like(scores)
+
+    flagged = (similarity < similarity_threshold) & ((z_scores < -z_threshold) | (scores < min_score))
+
+    return [col for col, flag in zip(columns, flagged) if flag]
@@ -1,9 +1,10 @@
-from agent import call_salesforce_agent
+from agent import call_salesforce_agent, acall_salesforce_agent, AgentUnavailableError
 from sse_manager import event_manager
 
 import json
 from dotenv import load_dotenv
 import os
+import re
 
 load_dotenv()
 
@@ -40,6 +41,60 @@ class IntentDecoder:
         Return:\n
         ontology ( string, any ){ } - A mapped ontology descibing common terms used by the firm.\n
         """
+        prompt = self._build_prompt(metadata_profile)
+
+        agent_id = os.getenv("DECODER_AGENT_ID") or ""
+
+        # Either finance, sales or human resources
+        try:
+            response = call_salesforce_agent(message=prompt, agent_id=agent_id)
+        except AgentUnavailableError as e:
+            print(f"⚠️ Intent agent unavailable, using local keyword match: {e}")
+            response = self._local_intent(metadata_profile)
+
+        return self._parse_response(response)
+
+    async def adecode_intent(self, metadata_profile):
+        """
+        asyncio version of decode_intent, awaits the agent instead of blocking a thread.
+        """
+        prompt = self._build_prompt(metadata_profile)
+
+        agent_id = os.getenv("DECODER_AGENT_ID") or ""
+
+        # Either finance, sales or human resources
+        try:
+            response = await acall_salesforce_agent(message=prompt, agent_id=agent_id)
+        except AgentUnavailableError as e:
+            print(f"⚠️ Intent agent unavailable, using local keyword match: {e}")
+            response = self._local_intent(metadata_profile)
+
+        return self._parse_response(response)
+
+    def _local_intent(self, metadata_profile):
+        """
+        Fallback when the agent can't be reached: picks the ontology whose field names share
+        the most words with the column names. Returns the same text the agent would.
+        """
+        def words(name):
+            return set(re.findall(r"[a-z]+", str(name).lower()))
+
+        column_words = set()
+        for col in metadata_profile:
+            column_words |= words(col)
+
+        names = {"finance": "Finance", "sales": "Sales", "human resources": "Human Resources"}
+        scores = {}
+        for key, ontology_text in self.ontology_library.items():
+            field_words = set()
+            for field in json.loads(ontology_text)["required_fields"]:
+                field_words |= words(field[0])
+            scores[names[key]] = len(column_words & field_words)
+
+        # Ties keep the agent prompt's default of Finance
+        return max(["Finance", "Sales", "Human Resources"], key=lambda name: scores[name])
+
+    def _build_prompt(self, metadata_profile):
         # 1. Summarize the incoming data for the AI
         # We only need column names and inferred types from Layer 1
         data_summary = {
@@ -57,17 +112,13 @@ class IntentDecoder:
         - All Available ontology Standards:{json.dumps(self.ontology_library, indent=2)}
         """
         
-        # 3. Simulate the AI Response (In prod, this is openai.ChatCompletion.create)
-        # For the demo/prototype, we can simulate logic or mock the call.
         print("--- Sending Prompt to LLM ---")
         print(prompt)
         print("-----------------------------")
-        
-        agent_id = os.getenv("DECODER_AGENT_ID") or ""
 
-        # Either finance, sales or human resources
-        response = call_salesforce_agent(message=prompt, agent_id=agent_id)
+        return prompt
 
+    def _parse_response(self, response):
         if "Sales" in response:
             ontology_name = "sales"
         elif "Human Resources" in response:
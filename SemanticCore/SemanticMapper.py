@@ -1,6 +1,7 @@
 from sentence_transformers import SentenceTransformer
 from sse_manager import event_manager
 import pandas as pd
+import numpy as np
 import faiss
 import uuid
 
@@ -20,9 +21,22 @@ class SemanticMapper:
         self.ontology_fields = [] 
         self.threshold = threshold
         self.report_log = []
+        self.ontology_centroid = None # Mean direction of the ontology field embeddings
+        self.header_relevance = {} # Filled by map_columns, see get_header_relevance
     
     def get_logs(self):
         return self.report_log
+
+    def get_header_relevance(self):
+        """
+        Per column scores from the last map_columns call, re-used to spot off-topic headers without an extra model/agent call:
+        { column_name : {
+            "similarity": cosine similarity to the best matching ontology field,
+            "centroid_similarity": cosine similarity to the ontology centroid
+            }
+        }
+        """
+        return self.header_relevance
     
     def precompute_ontology(self, ontology_json):
         """
@@ -37,6 +51,9 @@ class SemanticMapper:
         dimension = ontology_embeddings.shape[1]
         self.index = faiss.IndexFlatIP(dimension)
         self.index.add(ontology_embeddings) # type: ignore
+
+        centroid = ontology_embeddings.mean(axis=0)
+        self.ontology_centroid = centroid / (np.linalg.norm(centroid) or 1.0)
         print("Ontology vectorized and indexed successfully.")
 
     def map_columns(self, raw_input):
@@ -72,6 +89,13 @@ class SemanticMapper:
         
         # --- VECTOR SEARCH ---
         D, I = self.index.search(raw_embeddings, k=1) # type: ignore
+
+        # Kept for the local irrelevant-header check (EntityResolver.resolve_headers)
+        centroid_scores = raw_embeddings @ self.ontology_centroid
+        self.header_relevance = {
+            raw_col: {"similarity": float(D[i][0]), "centroid_similarity": float(centroid_scores[i])}
+            for i, raw_col in enumerate(raw_columns)
+        }
         
         mapping_result = {}
         
@@ -4,145 +4,144 @@ Based on Salesforce Agent API documentation
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, Deque, List, Optional, Tuple
+from collections import OrderedDict, deque
 import os
+import json
+import time
+import hashlib
+import random
+import atexit
+import asyncio
+import threading
+import concurrent.futures
+import importlib.util
 from dotenv import load_dotenv
 
+from tracing import tracer
+
 
 load_dotenv()
 
-def get_access_token(
-    client_id: str,
-    client_secret: str,
-    my_domain_url: str
-) -> str:
+# Base URL of the Agent API. Overridable so the client can be pointed at a local stand-in.
+AGENT_API_URL = os.getenv("SF_AGENT_API_URL") or "https://api.salesforce.com/einstein/ai-agent/v1"
+
+
+class AgentAPIError(Exception):
     """
-    Get OAuth access token using client credentials flow
-    
-    Args:
-        client_id: Connected App Consumer Key
-        client_secret: Connected App Consumer Secret
-        my_domain_url: Your My Domain URL (e.g., "mycompany.my.salesforce.com")
-    
-    Returns:
-        Access token string
+    Raised when the OAuth or Agent API answers with a non-2xx status
     """
-    # Ensure my_domain_url doesn't have https://
-    if my_domain_url.startswith("https://"):
-        my_domain_url = my_domain_url.replace("https://", "")
-    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AgentUnavailableError(AgentAPIError):
+    """
+    Raised when the Agent API is degraded: retries were exhausted on a transient failure
+    (timeouts, 429/5xx) or the circuit breaker is open. Callers may fall back to local logic.
+    """
+
+
+class CircuitOpenError(AgentUnavailableError):
+    """
+    Raised without calling out while the circuit breaker is open
+    """
+
+
+def _domain_url(my_domain_url: str) -> str:
+    """
+    Normalises a My Domain value to a full URL ("mycompany.my.salesforce.com" -> "https://mycompany.my.salesforce.com")
+    """
+    if my_domain_url.startswith("http://") or my_domain_url.startswith("https://"):
+        return my_domain_url.rstrip("/")
+    return f"https://{my_domain_url}".rstrip("/")
+
+
+# --- Request builders / response checks ---
+# Shared by the blocking (requests) and asyncio (httpx) code paths, both response types
+# expose status_code, text and json().
+
+def _token_request(client_id: str, client_secret: str, my_domain_url: str) -> Tuple[str, Dict[str, str], Dict[str, str]]:
     # IMPORTANT: Must use YOUR My Domain URL, not login.salesforce.com
-    token_url = f"https://{my_domain_url}/services/oauth2/token"
-    
+    token_url = f"{_domain_url(my_domain_url)}/services/oauth2/token"
+
     data = {
         "grant_type": "client_credentials",
         "client_id": client_id,
         "client_secret": client_secret
     }
-    
-    response = requests.post(token_url, data=data, headers={"Content-Type": "application/x-www-form-urlencoded"})
-    
+
+    return token_url, data, {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+def _check_token_response(response) -> Dict[str, Any]:
     # Better error handling
-    if not response.ok:
+    if response.status_code >= 400:
         error_detail = response.json() if response.text else {}
-        raise Exception(
+        raise AgentAPIError(
             f"OAuth token request failed: {response.status_code}\n"
             f"Error: {error_detail.get('error', 'Unknown')}\n"
-            f"Description: {error_detail.get('error_description', 'No description')}"
+            f"Description: {error_detail.get('error_description', 'No description')}",
+            status_code=response.status_code
         )
-    
+
     result = response.json()
 
-    del result["access_token"]
+    print({key: value for key, value in result.items() if key != "access_token"})
+    return result
 
-    print(result)    
-    return response.json()["access_token"]
 
+def _session_request(agent_id: str, access_token: str, my_domain_url: str) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+    url = f"{AGENT_API_URL}/agents/{agent_id}/sessions"
 
-def start_agent_session(
-    agent_id: str,
-    access_token: str,
-    my_domain_url: str,
-) -> Dict[str, Any]:
-    """
-    Start a new session with a Salesforce agent
-    
-    Args:
-        agent_id: The 18-character agent ID (from URL in Setup)
-        access_token: OAuth access token
-        my_domain_url: Your Salesforce My Domain URL (e.g., "mycompany.my.salesforce.com")
-        user_id: Optional 18-character Salesforce User ID. If not provided, uses the 
-                Connected App's "Run As" user.
-    
-    Returns:
-        Dictionary with session details including sessionId
-    """
-    url = f"https://api.salesforce.com/einstein/ai-agent/v1/agents/{agent_id}/sessions"
-    
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}"
     }
-    
-    # Ensure my_domain_url is just the domain without https://
-    if my_domain_url.startswith("https://"):
-        my_domain_url = my_domain_url.replace("https://", "")
-    
+
     payload = {
         "externalSessionKey": str(uuid.uuid4()),
         "instanceConfig": {
-            "endpoint": f"https://{my_domain_url}"
+            "endpoint": _domain_url(my_domain_url)
         },
         "streamingCapabilities": {
             "chunkTypes": ["Text"]
         },
         "bypassUser": False
     }
-    
-    print("Sending Session Request...")
-    response = requests.post(url, json=payload, headers=headers)
-    
+
+    return url, payload, headers
+
+
+def _check_session_response(response, url: str) -> Dict[str, Any]:
     # Better error handling with actual error message
-    if not response.ok:
+    if response.status_code >= 400:
         error_detail = response.text if response.text else {}
-        raise Exception(
+        raise AgentAPIError(
             f"Failed to start agent session: {response.text}\n"
             f"URL: {url}\n"
             f"Error: \n"
             f"Message: \n"
-            f"Full response: {error_detail}"
+            f"Full response: {error_detail}",
+            status_code=response.status_code
         )
-    
+
     print("Agent Session Started")
     return response.json()
 
 
-def send_message_to_agent(
-    session_id: str,
-    message: str,
-    access_token: str,
-    sequence_id: int = 1
-) -> Dict[str, Any]:
-    """
-    Send a message to an agent session (synchronous)
-    
-    Args:
-        session_id: Session ID from start_agent_session
-        message: The message text to send
-        access_token: OAuth access token
-        sequence_id: Message sequence number (increment for each message in session)
-    
-    Returns:
-        Agent's response
-    """
-    url = f"https://api.salesforce.com/einstein/ai-agent/v1/sessions/{session_id}/messages"
-    
+def _message_request(session_id: str, message: str, access_token: str, sequence_id: int) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+    url = f"{AGENT_API_URL}/sessions/{session_id}/messages"
+
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}"
     }
-    
+
     payload = {
             "message": {
                 "sequenceId": sequence_id,
@@ -150,68 +149,1041 @@ def send_message_to_agent(
                 "text": message
             }
         }
-    print("Sending Message to Agent...")
 
-    response = requests.post(url, json=payload, headers=headers)
-  # Better error handling
-    if not response.ok:
+    return url, payload, headers
+
+
+def _check_message_response(response) -> Dict[str, Any]:
+    # Better error handling
+    if response.status_code >= 400:
         error_detail = {}
         try:
             error_detail = response.json() if response.text else {}
         except:
             error_detail = {"raw_response": response.text}
-        
-        raise Exception(
+
+        raise AgentAPIError(
             f"Failed to send message: {response.status_code}\n"
             f"Error: {error_detail.get('error', 'Unknown')}\n"
             f"Message: {error_detail.get('message', 'No message')}\n"
-            f"Full response: {error_detail}"
+            f"Full response: {error_detail}",
+            status_code=response.status_code
         )
-    
+
     return response.json()
 
 
+def _end_request(session_id: str, access_token: str) -> Tuple[str, Dict[str, str]]:
+    url = f"{AGENT_API_URL}/sessions/{session_id}"
+
+    headers = {
+        'x-session-end-reason': 'UserRequest',
+        "Authorization": f"Bearer {access_token}"
+    }
+
+    return url, headers
+
+
+def _check_end_response(response) -> Dict[str, Any]:
+    if response.status_code >= 400:
+        raise AgentAPIError(f"Failed to end agent session: {response.status_code}", status_code=response.status_code)
+
+    return response.json() if response.text else {"status": "ended"}
+
+
+def request_access_token(
+    client_id: str,
+    client_secret: str,
+    my_domain_url: str,
+    http_session: Optional[requests.Session] = None
+) -> Dict[str, Any]:
+    """
+    Requests an OAuth token using the client credentials flow
+
+    Args:
+        client_id: Connected App Consumer Key
+        client_secret: Connected App Consumer Secret
+        my_domain_url: Your My Domain URL (e.g., "mycompany.my.salesforce.com")
+        http_session: Optional pooled session to send the request on
+
+    Returns:
+        The full token response (access_token, instance_url, issued_at, ...)
+    """
+    token_url, data, headers = _token_request(client_id, client_secret, my_domain_url)
+
+    http = http_session or requests
+    response = http.post(token_url, data=data, headers=headers)
+
+    return _check_token_response(response)
+
+
+def get_access_token(
+    client_id: str,
+    client_secret: str,
+    my_domain_url: str
+) -> str:
+    """
+    Get OAuth access token using client credentials flow
+
+    Args:
+        client_id: Connected App Consumer Key
+        client_secret: Connected App Consumer Secret
+        my_domain_url: Your My Domain URL (e.g., "mycompany.my.salesforce.com")
+
+    Returns:
+        Access token string
+    """
+    return request_access_token(client_id, client_secret, my_domain_url)["access_token"]
+
+
+def start_agent_session(
+    agent_id: str,
+    access_token: str,
+    my_domain_url: str,
+    http_session: Optional[requests.Session] = None
+) -> Dict[str, Any]:
+    """
+    Start a new session with a Salesforce agent
+
+    Args:
+        agent_id: The 18-character agent ID (from URL in Setup)
+        access_token: OAuth access token
+        my_domain_url: Your Salesforce My Domain URL (e.g., "mycompany.my.salesforce.com")
+        user_id: Optional 18-character Salesforce User ID. If not provided, uses the
+                Connected App's "Run As" user.
+        http_session: Optional pooled session to send the request on
+
+    Returns:
+        Dictionary with session details including sessionId
+    """
+    url, payload, headers = _session_request(agent_id, access_token, my_domain_url)
+
+    print("Sending Session Request...")
+    http = http_session or requests
+    response = http.post(url, json=payload, headers=headers)
+
+    return _check_session_response(response, url)
+
+
+def send_message_to_agent(
+    session_id: str,
+    message: str,
+    access_token: str,
+    sequence_id: int = 1,
+    http_session: Optional[requests.Session] = None
+) -> Dict[str, Any]:
+    """
+    Send a message to an agent session (synchronous)
+
+    Args:
+        session_id: Session ID from start_agent_session
+        message: The message text to send
+        access_token: OAuth access token
+        sequence_id: Message sequence number (increment for each message in session)
+        http_session: Optional pooled session to send the request on
+
+    Returns:
+        Agent's response
+    """
+    url, payload, headers = _message_request(session_id, message, access_token, sequence_id)
+    print("Sending Message to Agent...")
+
+    http = http_session or requests
+    response = http.post(url, json=payload, headers=headers)
+
+    return _check_message_response(response)
+
+
 def end_agent_session(
     session_id: str,
-    access_token: str
+    access_token: str,
+    http_session: Optional[requests.Session] = None
 ) -> Dict[str, Any]:
     """
     End an agent session
-    
+
     Args:
         session_id: Session ID to end
         access_token: OAuth access token
-    
+        http_session: Optional pooled session to send the request on
+
     Returns:
         Response from ending the session
     """
-    url = f"https://api.salesforce.com/einstein/ai-agent/v1/sessions/{session_id}"
-    
-    headers = {
-        'x-session-end-reason': 'UserRequest',
-        "Authorization": f"Bearer {access_token}"
-    }
-    
-    response = requests.delete(url, headers=headers)
-    response.raise_for_status()
-    
-    return response.json() if response.text else {"status": "ended"}
+    url, headers = _end_request(session_id, access_token)
+
+    http = http_session or requests
+    response = http.delete(url, headers=headers)
+
+    return _check_end_response(response)
+
+
+class _TimeoutSession(requests.Session):
+    """
+    requests.Session that applies a default timeout to every request
+    """
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
+class _AgentClientBase:
+    """
+    Token and agent-session bookkeeping shared by the blocking and asyncio clients.
+    Holds no I/O, subclasses do the HTTP calls.
+    """
+
+    # Status codes that mean the cached token / agent session is no longer usable
+    AUTH_EXPIRED_STATUSES = (401,)
+    SESSION_EXPIRED_STATUSES = (404, 410)
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        my_domain_url: str,
+        token_ttl: float = 3600,
+        session_ttl: float = 600,
+        max_messages_per_session: int = 20
+    ):
+        """
+        Args:
+            client_id: Connected App Consumer Key
+            client_secret: Connected App Consumer Secret
+            my_domain_url: Your My Domain URL (e.g., "mycompany.my.salesforce.com")
+            token_ttl: Seconds a token is trusted when the token response has no expiry
+            session_ttl: Seconds an idle agent session is re-used before being replaced
+            max_messages_per_session: Rotates a session after this many prompts so the
+                                      agent's conversation history doesn't grow unbounded
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.my_domain_url = my_domain_url
+        self.token_ttl = token_ttl
+        self.session_ttl = session_ttl
+        self.max_messages_per_session = max_messages_per_session
+
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        # agent_id -> idle sessions [{"session_id", "sequence_id", "last_used"}]
+        self._idle_sessions: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _token_is_fresh(self) -> bool:
+        # Refresh a minute early so in-flight requests never carry a stale token
+        return self._token is not None and time.monotonic() < self._token_expires_at - 60
+
+    def _store_token(self, result: Dict[str, Any]) -> str:
+        ttl = float(result.get("expires_in", self.token_ttl))
+        self._token = result["access_token"]
+        self._token_expires_at = time.monotonic() + ttl
+        return self._token
+
+    def _invalidate_token(self, token: str):
+        if self._token == token:
+            self._token = None
+            self._token_expires_at = 0.0
+
+    def _take_idle_session(self, agent_id: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Pops a re-usable session for the agent. Also returns the expired ones found on the way, to be ended.
+        """
+        now = time.monotonic()
+        expired = []
+
+        idle = self._idle_sessions.setdefault(agent_id, [])
+        while idle:
+            candidate = idle.pop()
+            if now - candidate["last_used"] < self.session_ttl:
+                return candidate, expired
+            expired.append(candidate)
+
+        return None, expired
+
+    def _new_session(self, started: Dict[str, Any]) -> Dict[str, Any]:
+        return {"session_id": started["sessionId"], "sequence_id": 0, "last_used": time.monotonic()}
+
+    def _should_rotate(self, session: Dict[str, Any]) -> bool:
+        return session["sequence_id"] >= self.max_messages_per_session
+
+    def _park_session(self, agent_id: str, session: Dict[str, Any]):
+        session["last_used"] = time.monotonic()
+        self._idle_sessions.setdefault(agent_id, []).append(session)
+
+    def _drain_sessions(self) -> List[Dict[str, Any]]:
+        sessions = [s for idle in self._idle_sessions.values() for s in idle]
+        self._idle_sessions = {}
+        return sessions
+
+
+class SalesforceAgentClient(_AgentClientBase):
+    """
+    Long-lived Agent API client.
+
+    Keeps one pooled HTTP session (keep-alive), caches the OAuth token until shortly
+    before it expires and re-uses agent sessions per agent id, so a prompt normally
+    costs a single round trip instead of token + start + message + end.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        my_domain_url: str,
+        pool_size: int = 10,
+        timeout: float = 60.0,
+        connect_timeout: float = 10.0,
+        **kwargs
+    ):
+        """
+        Args:
+            pool_size: Max keep-alive connections held per host
+            timeout: Seconds to wait for a response (agents can be slow to answer)
+            connect_timeout: Seconds to wait for a TCP/TLS connection
+            **kwargs: Token/session settings, see _AgentClientBase
+        """
+        super().__init__(client_id, client_secret, my_domain_url, **kwargs)
+
+        self.http = _TimeoutSession(timeout=(connect_timeout, timeout))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+
+    # --- Tokens ---
+
+    def get_token(self, force_refresh: bool = False) -> str:
+        """
+        Returns a cached access token, fetching a new one when missing or about to expire
+        """
+        with self._lock:
+            if force_refresh or not self._token_is_fresh():
+                result = request_access_token(self.client_id, self.client_secret, self.my_domain_url, http_session=self.http)
+                self._store_token(result)
+            return self._token
+
+    # --- Agent sessions ---
+
+    def _acquire_session(self, agent_id: str, access_token: str) -> Dict[str, Any]:
+        with self._lock:
+            session, expired = self._take_idle_session(agent_id)
+
+        for stale in expired:
+            self._end_quietly(stale, access_token)
+
+        if session is None:
+            session = self._new_session(start_agent_session(agent_id, access_token, self.my_domain_url, http_session=self.http))
+
+        return session
+
+    def _release_session(self, agent_id: str, session: Dict[str, Any], access_token: str):
+        if self._should_rotate(session):
+            self._end_quietly(session, access_token)
+            return
+
+        with self._lock:
+            self._park_session(agent_id, session)
+
+    def _end_quietly(self, session: Dict[str, Any], access_token: str):
+        try:
+            end_agent_session(session["session_id"], access_token, http_session=self.http)
+        except Exception as e:
+            print(f"Unable to end agent session {session['session_id']}: {e}")
+
+    # --- Messaging ---
+
+    def call(self, agent_id: str, message: str) -> str:
+        """
+        Sends one prompt to the agent and returns the text of its reply.
+
+        An expired token or session is replaced and the prompt re-sent once.
+        """
+        access_token = self.get_token()
+        session = self._acquire_session(agent_id, access_token)
+        # One sequence number per message, a re-sent prompt keeps it
+        session["sequence_id"] += 1
+
+        try:
+            for attempt in range(2):
+                try:
+                    response = send_message_to_agent(
+                        session["session_id"], message, access_token,
+                        sequence_id=session["sequence_id"], http_session=self.http
+                    )
+                    break
+                except AgentAPIError as e:
+                    if attempt == 1:
+                        raise
+                    if e.status_code in self.AUTH_EXPIRED_STATUSES:
+                        with self._lock:
+                            self._invalidate_token(access_token)
+                        access_token = self.get_token()
+                    elif e.status_code in self.SESSION_EXPIRED_STATUSES:
+                        session = self._new_session(start_agent_session(agent_id, access_token, self.my_domain_url, http_session=self.http))
+                        session["sequence_id"] += 1
+                    else:
+                        raise
+        except Exception:
+            # Timeouts, dropped connections and unexpected statuses leave the session in an unknown
+            # state: end it rather than hand it back to the pool
+            self._end_quietly(session, access_token)
+            raise
+
+        self._release_session(agent_id, session, access_token)
+
+        return response["messages"][0]["message"]
+
+    def close(self):
+        """
+        Ends every pooled agent session and closes the HTTP connection pool
+        """
+        with self._lock:
+            sessions = self._drain_sessions()
+            access_token = self._token
+
+        if access_token:
+            for session in sessions:
+                self._end_quietly(session, access_token)
+
+        self.http.close()
+
+
+class AsyncSalesforceAgentClient(_AgentClientBase):
+    """
+    asyncio-native Agent API client built on httpx.
+
+    Same token/session re-use as SalesforceAgentClient, but awaits the network instead of
+    blocking a thread. Connections are pooled (HTTP/2 when the `h2` package is installed),
+    every request has a timeout and at most `max_concurrency` prompts are in flight at once.
+
+    The underlying httpx client is bound to the running event loop and is re-created if
+    the client is used from a different loop. The previous client and its idle sessions are
+    closed on their own loop while it still runs, otherwise the sessions are abandoned.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        my_domain_url: str,
+        max_concurrency: int = 8,
+        max_connections: int = 20,
+        timeout: float = 60.0,
+        connect_timeout: float = 10.0,
+        http2: bool = True,
+        **kwargs
+    ):
+        """
+        Args:
+            max_concurrency: Max prompts awaiting an agent reply at the same time
+            max_connections: Size of the httpx connection pool
+            timeout: Seconds to wait for a response (agents can be slow to answer)
+            connect_timeout: Seconds to wait for a TCP/TLS connection
+            http2: Negotiate HTTP/2 when available
+            **kwargs: Token/session settings, see _AgentClientBase
+        """
+        super().__init__(client_id, client_secret, my_domain_url, **kwargs)
+
+        self.max_concurrency = max_concurrency
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._token_lock: Optional[asyncio.Lock] = None
+        # Closes of the clients left behind on other loops, awaited by aclose()
+        self._retiring: List[concurrent.futures.Future] = []
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+
+        if self._http is None or self._loop is not loop:
+            if self._http is not None:
+                # Sessions and connections from another loop can't be awaited here, start over
+                self._retire()
+            self._http = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._token_lock = asyncio.Lock()
+
+        return self._http
+
+    def _retire(self):
+        """
+        Hands the current httpx client and its idle sessions back to their loop to be closed there
+        """
+        http, loop, sessions = self._http, self._loop, self._drain_sessions()
+        self._http = None
+        self._loop = None
+
+        close = self._close_http(http, sessions, self._token)
+        try:
+            if loop.is_closed() or not loop.is_running():
+                raise RuntimeError("Event loop is closed")
+            closing = asyncio.run_coroutine_threadsafe(close, loop)
+        except RuntimeError:
+            close.close()
+            if sessions:
+                print(f"Event loop of the agent client is gone, {len(sessions)} agent sessions abandoned")
+            return
+
+        self._retiring = [pending for pending in self._retiring if not pending.done()] + [closing]
+
+    async def _close_http(self, http: httpx.AsyncClient, sessions: List[Dict[str, Any]], access_token: Optional[str]):
+        if access_token:
+            for session in sessions:
+                await self._end_quietly(session, access_token, http=http)
+        await http.aclose()
+
+    # --- Tokens ---
+
+    async def get_token(self, force_refresh: bool = False) -> str:
+        """
+        Returns a cached access token, fetching a new one when missing or about to expire
+        """
+        http = self._client()
+
+        async with self._token_lock:
+            if force_refresh or not self._token_is_fresh():
+                token_url, data, headers = _token_request(self.client_id, self.client_secret, self.my_domain_url)
+                response = await http.post(token_url, data=data, headers=headers)
+                self._store_token(_check_token_response(response))
+            return self._token
+
+    # --- Agent sessions ---
+
+    async def _start_session(self, agent_id: str, access_token: str) -> Dict[str, Any]:
+        url, payload, headers = _session_request(agent_id, access_token, self.my_domain_url)
+        print("Sending Session Request...")
+        response = await self._client().post(url, json=payload, headers=headers)
+        return self._new_session(_check_session_response(response, url))
+
+    async def _acquire_session(self, agent_id: str, access_token: str) -> Dict[str, Any]:
+        session, expired = self._take_idle_session(agent_id)
+
+        for stale in expired:
+            await self._end_quietly(stale, access_token)
+
+        if session is None:
+            session = await self._start_session(agent_id, access_token)
+
+        return session
+
+    async def _end_quietly(self, session: Dict[str, Any], access_token: str, http: Optional[httpx.AsyncClient] = None):
+        url, headers = _end_request(session["session_id"], access_token)
+        try:
+            _check_end_response(await (http or self._client()).delete(url, headers=headers))
+        except Exception as e:
+            print(f"Unable to end agent session {session['session_id']}: {e}")
+
+    # --- Messaging ---
+
+    async def call(self, agent_id: str, message: str) -> str:
+        """
+        Sends one prompt to the agent and returns the text of its reply.
+
+        An expired token or session is replaced and the prompt re-sent once.
+        """
+        http = self._client()
+
+        async with self._semaphore:
+            access_token = await self.get_token()
+            session = await self._acquire_session(agent_id, access_token)
+
+            # One sequence number per message, a re-sent prompt keeps it
+            session["sequence_id"] += 1
+
+            try:
+                for attempt in range(2):
+                    url, payload, headers = _message_request(session["session_id"], message, access_token, session["sequence_id"])
+                    print("Sending Message to Agent...")
+                    try:
+                        response = _check_message_response(await http.post(url, json=payload, headers=headers))
+                        break
+                    except AgentAPIError as e:
+                        if attempt == 1:
+                            raise
+                        if e.status_code in self.AUTH_EXPIRED_STATUSES:
+                            self._invalidate_token(access_token)
+                            access_token = await self.get_token()
+                        elif e.status_code in self.SESSION_EXPIRED_STATUSES:
+                            session = await self._start_session(agent_id, access_token)
+                            session["sequence_id"] += 1
+                        else:
+                            raise
+            except Exception:
+                # Timeouts, dropped connections and unexpected statuses leave the session in an unknown
+                # state: end it rather than hand it back to the pool
+                await self._end_quietly(session, access_token)
+                raise
+
+            if self._should_rotate(session):
+                await self._end_quietly(session, access_token)
+            else:
+                self._park_session(agent_id, session)
+
+        return response["messages"][0]["message"]
+
+    async def aclose(self):
+        """
+        Ends every pooled agent session and closes the connection pool, including the ones
+        left behind on other event loops
+        """
+        if self._http is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self._close_http(self._http, self._drain_sessions(), self._token)
+                self._http = None
+                self._loop = None
+            else:
+                self._retire()
+
+        retiring, self._retiring = self._retiring, []
+        if retiring:
+            # A loop stopped since can't finish its close
+            await asyncio.wait([asyncio.wrap_future(closing) for closing in retiring], timeout=self.timeout.read)
+
+
+class AgentResponseCache:
+    """
+    Prompt -> reply cache keyed by a SHA-256 of (agent_id, prompt).
+
+    An in-memory LRU bounded to `max_entries`, optionally backed by a directory of JSON
+    files so replies survive restarts and are shared between worker processes. The directory
+    holds at most `max_disk_entries` files, the least recently used (by mtime) are removed first.
+    Entries older than `ttl` seconds are ignored and dropped.
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 1024, disk_dir: Optional[str] = None,
+                 max_disk_entries: int = 10000):
+        """
+        Args:
+            ttl: Seconds a cached reply stays valid
+            max_entries: Max replies held in memory, least recently used are evicted first
+            disk_dir: Optional directory for the on-disk tier (created if missing)
+            max_disk_entries: Max reply files kept in disk_dir
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Files written since the directory was last counted, other processes write there too
+        self._disk_count: Optional[int] = None
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(agent_id: str, prompt: str) -> str:
+        return hashlib.sha256(f"{agent_id}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir or "", f"{key}.json")
+
+    def get(self, agent_id: str, prompt: str) -> Optional[str]:
+        """
+        Returns the cached reply, or None on a miss / expired entry
+        """
+        key = self.make_key(agent_id, prompt)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            try:
+                with open(self._disk_path(key), mode="r") as file:
+                    stored = json.load(file)
+            except (OSError, ValueError):
+                stored = None
+
+            if stored and now - stored["created"] < self.ttl:
+                self._touch_file(key)
+                self._remember(key, stored["created"], stored["response"])
+                with self._lock:
+                    self.hits += 1
+                return stored["response"]
+
+            self._remove_file(key)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, agent_id: str, prompt: str, response: str):
+        key = self.make_key(agent_id, prompt)
+        created = time.time()
+        self._remember(key, created, response)
+
+        if self.disk_dir:
+            # Write then rename so a concurrent reader never sees a half-written file
+            tmp_path = f"{self._disk_path(key)}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, mode="w") as file:
+                json.dump({"created": created, "response": response}, file)
+            os.replace(tmp_path, self._disk_path(key))
+            self._count_disk_entry()
+
+    def _remember(self, key: str, created: float, response: str):
+        with self._lock:
+            self._entries[key] = (created, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _remove_file(self, key: str):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _touch_file(self, key: str):
+        # A hit makes the file recently used, so it is evicted last
+        try:
+            os.utime(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _count_disk_entry(self):
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = len([name for name in os.listdir(self.disk_dir) if name.endswith(".json")])
+            else:
+                self._disk_count += 1
+            if self._disk_count <= self.max_disk_entries:
+                return
+            self._disk_count = None
+        self._evict_files()
+
+    def _evict_files(self):
+        """
+        Removes the least recently used files until the directory is back to max_disk_entries
+        """
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                try:
+                    files.append((os.path.getmtime(os.path.join(self.disk_dir, name)), name))
+                except OSError:
+                    pass  # Removed by another process
+
+        files.sort()
+        for _, name in files[:max(len(files) - self.max_disk_entries, 0)]:
+            self._remove_file(name.removesuffix(".json"))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._disk_count = None
+
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".json"):
+                    self._remove_file(name.removesuffix(".json"))
+
+
+# Statuses worth retrying: the request may succeed if sent again later
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    True for transient failures (timeouts, dropped connections, 429/5xx)
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, AgentAPIError):
+        return error.status_code in RETRYABLE_STATUSES
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, httpx.TransportError))
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of overall traffic so retries can't multiply load on a
+    struggling API. Every call deposits `ratio` tokens, every retry spends one.
+    """
+
+    def __init__(self, ratio: float = 0.2, initial_tokens: float = 10, max_tokens: float = 20):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = initial_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and rejects calls for
+    `reset_timeout` seconds. Then one trial call is let through (half-open): success closes
+    the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"⚠️ Agent API circuit opened after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def record_ignored(self):
+        """
+        A call that says nothing about the API's health: state and failure count are kept,
+        a half-open trial slot is freed for the next call
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class AgentCallMetrics:
+    """
+    Counters and recent latencies for agent calls, see snapshot()
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "short_circuited": 0}
+            self._latencies: Deque[float] = deque(maxlen=self.max_samples)
+
+    def increment(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.counts["successes" if ok else "failures"] += 1
+            self._latencies.append(latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            snapshot: Dict[str, Any] = dict(self.counts)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4) if latencies else None
+
+        snapshot.update({"latency_p50": percentile(0.5), "latency_p95": percentile(0.95), "latency_max": percentile(1.0)})
+        return snapshot
+
+
+class AgentCallPolicy:
+    """
+    Wraps agent calls with jittered exponential-backoff retries on transient failures,
+    a shared retry budget, a circuit breaker and latency/failure metrics.
+
+    Transient failures that outlast the retries, and calls rejected by the open circuit,
+    raise AgentUnavailableError so callers can fall back to local heuristics.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        metrics: Optional[AgentCallMetrics] = None
+    ):
+        """
+        Args:
+            max_attempts: Attempts per call, including the first one
+            base_delay: Backoff before the first retry, doubled for each further retry
+            max_delay: Upper bound of a single backoff
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or AgentCallMetrics()
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": a random delay up to the exponential bound spreads retries out
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _before_attempt(self, attempt: int):
+        if not self.breaker.allow():
+            self.metrics.increment("short_circuited")
+            raise CircuitOpenError("Agent API circuit is open, failing fast", status_code=503)
+        if attempt == 0:
+            self.metrics.increment("calls")
+            self.budget.deposit()
+
+    def _after_failure(self, error: Exception, attempt: int, started: float) -> bool:
+        """
+        Records a failed attempt, returns True if it should be retried
+        """
+        retryable = is_retryable_error(error)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            # The API answered (e.g. a 400): neither a sign it is degraded nor that it recovered
+            self.breaker.record_ignored()
+
+        if retryable and attempt + 1 < self.max_attempts and self.budget.try_spend():
+            self.metrics.increment("retries")
+            print(f"Agent call failed ({error.__class__.__name__}), retrying...")
+            return True
+
+        self.metrics.record(time.monotonic() - started, ok=False)
+        return False
+
+    def _unavailable(self, error: Exception) -> Exception:
+        if is_retryable_error(error):
+            return AgentUnavailableError(f"Agent API unavailable: {error}", status_code=getattr(error, "status_code", None))
+        return error
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Calls fn(*args, **kwargs) under the policy, blocking between retries
+        """
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            self._before_attempt(attempt)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not self._after_failure(e, attempt, started):
+                    raise self._unavailable(e) from e
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self.breaker.record_success()
+            self.metrics.record(time.monotonic() - started, ok=True)
+            return result
+
+    async def arun(self, fn, *args, **kwargs):
+        """
+        Awaits fn(*args, **kwargs) under the policy, sleeping on the event loop between retries
+        """
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            self._before_attempt(attempt)
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if not self._after_failure(e, attempt, started):
+                    raise self._unavailable(e) from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            self.breaker.record_success()
+            self.metrics.record(time.monotonic() - started, ok=True)
+            return result
 
 
 my_domain_url = os.getenv("SF_DOMAIN_URL") or "" # Your My Domain
 client_id = os.getenv("SF_CLIENT_KEY") or ""  # Connected App Consumer Key
 client_secret = os.getenv("SF_CLIENT_SECRET") or ""  # Connected App Consumer Secret
 
+# Shared by every pipeline run in this process
+agent_client = SalesforceAgentClient(client_id, client_secret, my_domain_url)
+atexit.register(agent_client.close)
+
+async_agent_client = AsyncSalesforceAgentClient(
+    client_id, client_secret, my_domain_url,
+    max_concurrency=int(os.getenv("AGENT_MAX_CONCURRENCY") or 8)
+)
+
+# Identical prompts (same schema, same column values) are answered from here. Set
+# AGENT_CACHE_DIR to keep replies across restarts, AGENT_CACHE_DISABLED=1 to always call out.
+response_cache = AgentResponseCache(
+    ttl=float(os.getenv("AGENT_CACHE_TTL") or 86400),
+    max_entries=int(os.getenv("AGENT_CACHE_SIZE") or 1024),
+    disk_dir=os.getenv("AGENT_CACHE_DIR") or None,
+    max_disk_entries=int(os.getenv("AGENT_CACHE_DISK_SIZE") or 10000)
+)
+AGENT_CACHE_DISABLED = (os.getenv("AGENT_CACHE_DISABLED") or "").lower() in ("1", "true", "yes")
+
+# Retries, circuit breaker and metrics shared by the sync and async call paths
+call_policy = AgentCallPolicy(
+    max_attempts=int(os.getenv("AGENT_MAX_ATTEMPTS") or 3),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("AGENT_BREAKER_THRESHOLD") or 5),
+        reset_timeout=float(os.getenv("AGENT_BREAKER_RESET") or 30)
+    )
+)
+
 def call_salesforce_agent(
     agent_id: str,
     message: str,
+    use_cache: bool = True,
 ) -> str:
     """
-    High-level function to call a Salesforce agent with a single message
+    High-level function to call a Salesforce agent with a single message.
+    Goes through the shared `agent_client`, so the token, agent session and
+    HTTP connection are re-used between calls. Replies are served from
+    `response_cache` when the same prompt was already sent to the same agent.
+    Transient failures are retried under `call_policy`, AgentUnavailableError is
+    raised if the agent stays unreachable or the circuit breaker is open.
     
     Args:
         agent_id: The 18-character agent ID (from Setup > Agents > Agent URL)
         message: The message to send to the agent
+        use_cache: False to bypass the response cache and always call the agent
         my_domain_url: Your My Domain URL (e.g., "mycompany.my.salesforce.com")
         client_id: Connected App Consumer Key
         client_secret: Connected App Consumer Secret
@@ -247,18 +1219,52 @@ def call_salesforce_agent(
         print(response['response'])
     """
 
+    use_cache = use_cache and not AGENT_CACHE_DISABLED
 
-    # Get access token using YOUR My Domain URL
-    access_token = get_access_token(client_id, client_secret, my_domain_url)
-    
-    # Start session
-    session = start_agent_session(agent_id, access_token, my_domain_url)
-    session_id = session["sessionId"]
-    
-    # Send message
-    response = send_message_to_agent(session_id, message, access_token)
-    
-    # End session
-    end_agent_session(session_id, access_token)
-    
-    return response["messages"][0]["message"]
+    if use_cache:
+        cached = response_cache.get(agent_id, message)
+        if cached is not None:
+            print("Agent response served from cache")
+            return cached
+
+    with tracer.span("agent.call", agent_id=agent_id, prompt_chars=len(message)):
+        response = call_policy.run(agent_client.call, agent_id, message)
+
+    if use_cache:
+        response_cache.set(agent_id, message, response)
+
+    return response
+
+
+async def acall_salesforce_agent(
+    agent_id: str,
+    message: str,
+    use_cache: bool = True,
+) -> str:
+    """
+    asyncio version of call_salesforce_agent, awaits the shared `async_agent_client`
+    instead of blocking a thread.
+
+    Args:
+        agent_id: The 18-character agent ID (from Setup > Agents > Agent URL)
+        message: The message to send to the agent
+        use_cache: False to bypass the response cache and always call the agent
+
+    Returns:
+        The agent's text response
+    """
+    use_cache = use_cache and not AGENT_CACHE_DISABLED
+
+    if use_cache:
+        cached = response_cache.get(agent_id, message)
+        if cached is not None:
+            print("Agent response served from cache")
+            return cached
+
+    async with tracer.span("agent.call", agent_id=agent_id, prompt_chars=len(message)):
+        response = await call_policy.arun(async_agent_client.call, agent_id, message)
+
+    if use_cache:
+        response_cache.set(agent_id, message, response)
+
+    return response
@@ -0,0 +1,88 @@
+"""
+Compares the two HyperParquetIngestor write paths (Parquet COPY vs streamed Arrow batches)
+across row counts. Each case runs in a fresh process so peak RSS isn't polluted by earlier cases.
+
+Usage:
+    python -m benchmarks.bench_hyper_write --rows 10000 100000 1000000
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        "Transaction_ID": np.arange(rows),
+        "Net_Amount": rng.normal(1000, 250, rows).round(2),
+        "Cost_Center": pd.Series(rng.choice(["CC-100", "CC-200", "CC-300", "CC-400"], rows), dtype="string"),
+        "Vendor_Name": pd.Series([f"Vendor {i % 5000}" for i in range(rows)], dtype="string"),
+        "Transaction_Date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+    })
+
+
+def run_case(write_path: str, rows: int, batch_rows: int, results):
+    import pyarrow as pa
+    from ExecutionEngine.HyperAPI import HyperParquetIngestor
+    from ExecutionEngine.HyperPool import HyperProcessPool
+    from tableauhyperapi import Telemetry
+
+    df = make_frame(rows)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Hyper start-up is excluded from the timing, both paths borrow the same warm process
+        pool = HyperProcessPool(size=1, telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters={"log_dir": temp_dir})
+        pool.start()
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        ingestor = HyperParquetIngestor(user_id="bench", hyper_file_path=os.path.join(temp_dir, "bench.hyper"), pool=pool)
+
+        started = time.perf_counter()
+        ingestor.generate_file(df, "Bench", write_path=write_path, batch_rows=batch_rows)
+        elapsed = time.perf_counter() - started
+
+        pool.shutdown()
+
+    results.put({
+        "write_path": write_path,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": int(rows / elapsed) if elapsed else None,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1),
+        "arrow_pool_peak_mb": round(pa.default_memory_pool().max_memory() / 2**20, 1),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--batch-rows", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'Path':<8} | {'Rows':>10} | {'Seconds':>8} | {'Rows/s':>10} | {'RSS +MB':>8} | {'Arrow peak MB':>13}")
+    print("-" * 72)
+
+    for rows in args.rows:
+        for write_path in ("parquet", "arrow"):
+            results = context.Queue()
+            process = context.Process(target=run_case, args=(write_path, rows, args.batch_rows, results))
+            process.start()
+            result = results.get()
+            process.join()
+
+            print(f"{result['write_path']:<8} | {result['rows']:>10} | {result['seconds']:>8} | {result['rows_per_second']:>10} | {result['peak_rss_growth_mb']:>8} | {result['arrow_pool_peak_mb']:>13}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
@@ -0,0 +1,130 @@
+"""
+Peak memory of the column rename / replace step at the end of run_intelligence_pipeline, before and after
+copy-on-write. Both variants resolve the same columns of the same frame, each in a fresh process so
+ru_maxrss only sees that variant.
+
+    before: every column wrapped in a new Series, collected in a dict and rebuilt with pd.DataFrame(),
+            then the whole frame null-filled again (the stage as it was)
+    after:  replace_columns() under copy-on-write, untouched columns are shared with the input
+
+Usage:
+    python -m benchmarks.bench_intelligence_memory --mb 1024
+"""
+
+import argparse
+import gc
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Approximate in-memory size of one generated row (three Arrow strings, six numbers)
+ROW_BYTES = 92
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    frame = pd.DataFrame({
+        "txn_id": np.arange(rows),
+        "vendor": pd.Series(rng.choice(["IBM", "I.B.M.", "IBM corp", "Oracle", "SAP"], rows), dtype="string[pyarrow]"),
+        "region": pd.Series(rng.choice(["North", "South", "East", "West"], rows), dtype="string[pyarrow]"),
+        "booked": pd.Series(rng.choice(["01/02/2024", "15/03/2024", "2024-04-30"], rows), dtype="string[pyarrow]"),
+    })
+    for i in range(5):
+        frame[f"amount_{i}"] = rng.normal(1000, 250, rows).round(2)
+    return frame
+
+
+def resolve(frame: pd.DataFrame) -> dict:
+    """
+    Stand-in for entity / date resolution: rewrites two of the nine columns
+    """
+    return {
+        "Vendor": frame["vendor"].map({"I.B.M.": "IBM", "IBM corp": "IBM"}.get).fillna(frame["vendor"]),
+        "Booking Date": pd.to_datetime(frame["booked"], dayfirst=True, format="mixed").dt.strftime("%Y-%m-%d"),
+    }
+
+
+def rename_map(frame: pd.DataFrame) -> dict:
+    return {col: col.replace("_", " ").title() for col in frame.columns} | {"vendor": "Vendor", "booked": "Booking Date"}
+
+
+def before(frame: pd.DataFrame, renames: dict, replacements: dict, profile: dict) -> pd.DataFrame:
+    updated_data_dict = {}
+    for column_name, column_data in frame.items():
+        new_name = renames[column_name]
+        updated_data_dict[new_name] = replacements.get(new_name, pd.Series(column_data))
+        profile[new_name] = profile.pop(column_name)
+
+    updated_df = pd.DataFrame(updated_data_dict)
+
+    str_cols = updated_df.select_dtypes(include=["object", "string"]).columns
+    updated_df[str_cols] = updated_df[str_cols].fillna("null")
+
+    num_cols = updated_df.select_dtypes(include=["number"]).columns
+    updated_df[num_cols] = updated_df[num_cols].fillna(0)
+    return updated_df
+
+
+def after(frame: pd.DataFrame, renames: dict, replacements: dict, profile: dict) -> pd.DataFrame:
+    from IngestionLayer.TableStats import replace_columns
+
+    updated_df, _ = replace_columns(frame, renames, replacements, profile=profile)
+    return updated_df
+
+
+def run_case(variant: str, rows: int, results):
+    pd.set_option("mode.copy_on_write", variant == "after")
+
+    frame = make_frame(rows)
+    renames = rename_map(frame)
+    replacements = resolve(frame)
+    profile = {col: {} for col in frame.columns}
+    input_mb = frame.memory_usage(deep=True).sum() / 2**20
+
+    gc.collect()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    updated = (before if variant == "before" else after)(frame, renames, replacements, profile)
+    elapsed = time.perf_counter() - started
+
+    results.put({
+        "variant": variant,
+        "rows": rows,
+        "input_mb": round(input_mb, 1),
+        "seconds": round(elapsed, 3),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1),
+        "columns": len(updated.columns),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=1024, help="Approximate size of the input frame")
+    args = parser.parse_args(argv)
+
+    rows = args.mb * 2**20 // ROW_BYTES
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'Variant':<8} | {'Rows':>10} | {'Input MB':>8} | {'Seconds':>8} | {'RSS +MB':>8}")
+    print("-" * 56)
+
+    for variant in ("before", "after"):
+        results = context.Queue()
+        process = context.Process(target=run_case, args=(variant, rows, results))
+        process.start()
+        result = results.get()
+        process.join()
+
+        print(f"{result['variant']:<8} | {result['rows']:>10} | {result['input_mb']:>8} | {result['seconds']:>8} | {result['peak_rss_growth_mb']:>8}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
@@ -0,0 +1,367 @@
+"""
+End-to-end benchmark of the pipeline stages on synthetic tables (see benchmarks/synthetic.py):
+
+    ingest   BridgeIngestor.ingest of the table's CSV text
+    scan     MetadataScanner.scan
+    map      SemanticMapper.precompute_ontology + map_columns (model loading excluded). Skipped when the
+             embedding model can't be loaded, the generator's own header mapping is used instead.
+    resolve  EntityResolver on every categorical / date column with a stubbed agent, then replace_columns.
+             With --agent-url the real agent client is used against that server instead, e.g. a
+             mock_agent_server.py with realistic latency.
+    score    ConfidenceAnalysis.score_table
+    hyper    HyperParquetIngestor.generate_file with the profile (warm Hyper process, start-up excluded)
+
+Each (domain, rows) case runs in a fresh process, stages one after the other on the previous stage's
+output like the pipeline does. Peak RSS is the process high-water mark after the stage, RSS +MB how much
+the stage raised it.
+
+Every run is appended to benchmarks/results/pipeline.jsonl under the current git commit, --compare
+checks this run against the last run stored for another commit and exits 1 on a regression.
+
+Usage:
+    python -m benchmarks.bench_pipeline --rows 10000 1000000 10000000 --domains finance hr
+    python -m benchmarks.bench_pipeline --rows 1000000 --compare HEAD~1
+    python -m benchmarks.bench_pipeline --rows 1000000 --agent-url http://127.0.0.1:8787
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+STAGES = ["ingest", "scan", "map", "resolve", "score", "hyper"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FILE = os.path.join(ROOT, "benchmarks", "results", "pipeline.jsonl")
+
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.05
+MIN_RSS_DELTA_MB = 32
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def stub_agent(variants: dict, latency: float = 0.0):
+    """
+    Stand-in for the Salesforce entity agent: answers with the variants of the prompt's values it knows.
+
+    Return: (call_salesforce_agent, acall_salesforce_agent) replacements
+    """
+    def answer(message: str) -> str:
+        mapping = {}
+        for canonical, spellings in variants.items():
+            found = [spelling for spelling in spellings if json.dumps(spelling) in message]
+            if found:
+                mapping[canonical] = found
+        return json.dumps(mapping)
+
+    def call(message, agent_id=None, **kwargs):
+        time.sleep(latency)
+        return answer(message)
+
+    async def acall(message, agent_id=None, **kwargs):
+        await asyncio.sleep(latency)
+        return answer(message)
+
+    return call, acall
+
+
+def run_case(domain: str, rows: int, dirtiness: dict, agent_latency: float, agent_url, results):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    if agent_url:
+        # Read by agent.py when it is imported below
+        os.environ.update({"SF_DOMAIN_URL": agent_url, "SF_AGENT_API_URL": f"{agent_url.rstrip('/')}/einstein/ai-agent/v1"})
+
+    import pandas as pd
+    import SemanticCore.EntityResolver as entity_module
+    from benchmarks.synthetic import ONTOLOGY_FILES, column_mapping, entity_variants, generate_table, to_csv
+    from ExecutionEngine.ConfidenceAnalysis import score_table
+    from ExecutionEngine.HyperAPI import HyperParquetIngestor
+    from ExecutionEngine.HyperPool import HyperProcessPool
+    from IngestionLayer.BridgeIngestor import BridgeIngestor
+    from IngestionLayer.MetadataScanner import MetadataScanner
+    from IngestionLayer.TableStats import replace_columns
+    from tableauhyperapi import Telemetry
+
+    # Same settings as pipeline.py
+    pd.set_option("mode.copy_on_write", True)
+    if not agent_url:
+        entity_module.call_salesforce_agent, entity_module.acall_salesforce_agent = stub_agent(entity_variants(domain), agent_latency)
+
+    with open(ONTOLOGY_FILES[domain]) as f:
+        ontology = json.load(f)
+
+    csv_text = to_csv(generate_table(domain, rows, **dirtiness))
+    gc.collect()
+
+    records = []
+    state = {}
+
+    def measure(stage, fn):
+        rss_before = _peak_rss_mb()
+        started = time.perf_counter()
+        note = None
+        try:
+            # The stages print previews and logs, only the benchmark's own output is wanted
+            with contextlib.redirect_stdout(io.StringIO()):
+                note = fn()
+            status = "skipped" if note else "ok"
+        except Exception as e:
+            status, note = "failed", f"{e.__class__.__name__}: {e}"
+        elapsed = time.perf_counter() - started
+
+        records.append({
+            "domain": domain,
+            "rows": rows,
+            "stage": stage,
+            "status": status,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": int(rows / elapsed) if elapsed and status == "ok" else None,
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "rss_growth_mb": round(_peak_rss_mb() - rss_before, 1),
+            "note": note,
+        })
+        return status != "failed"
+
+    def ingest():
+        state["df"], _, state["stats"] = BridgeIngestor("bench").ingest(csv_text, dataType="csv")
+
+    def scan():
+        state["profile"], _ = MetadataScanner("bench").scan(state["df"], state["stats"])
+
+    def map_columns():
+        # Without the model every header maps to the field the generator built it for
+        state["renames"] = column_mapping(domain)
+        try:
+            from SemanticCore.SemanticMapper import SemanticMapper
+            mapper = SemanticMapper("bench")
+        except Exception as e:
+            return f"SemanticMapper unavailable ({e.__class__.__name__}: {e}), generator mapping used"
+
+        started = time.perf_counter()
+        mapper.precompute_ontology(ontology_json=ontology)
+        mappings, _ = mapper.map_columns(raw_input=state["df"])
+        state["renames"] = {col: value["mapped_to"] or col for col, value in mappings.items()}
+        # Model loading is not part of the stage
+        state["map_seconds"] = time.perf_counter() - started
+
+    def resolve():
+        df, profile, renames = state["df"], state["profile"], state["renames"]
+        resolver = entity_module.EntityResolver("bench")
+
+        entity_columns = [col for col in df.columns
+                          if profile[col]["inferred_type"] == "String" and profile[col]["semantic_tag"] == "Categorical_Dimension"]
+
+        async def resolve_entities():
+            return await asyncio.gather(*[resolver.aresolve(series=df[col], col_name=renames[col]) for col in entity_columns])
+
+        replacements = dict(zip([renames[col] for col in entity_columns], asyncio.run(resolve_entities())))
+        for col in df.columns:
+            if col not in entity_columns and profile[col]["inferred_type"] == "Datetime":
+                replacements[renames[col]] = resolver.resolve_date(series=df[col], column=renames[col])
+
+        state["df"], state["profile"] = replace_columns(df, renames, replacements, stats=state["stats"], profile=profile)
+        state["logs"] = resolver.get_logs()
+
+    def score():
+        score_table("bench", ontology, state["df"], state["profile"], list(state["logs"]), state["stats"])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pool = HyperProcessPool(size=1, telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters={"log_dir": temp_dir})
+        with contextlib.redirect_stdout(io.StringIO()):
+            pool.start()
+
+        def hyper():
+            ingestor = HyperParquetIngestor("bench", hyper_file_path=os.path.join(temp_dir, "bench.hyper"), pool=pool)
+            ingestor.generate_file(state["df"], "Extract", profile=state["profile"])
+
+        stages = {"ingest": ingest, "scan": scan, "map": map_columns, "resolve": resolve, "score": score, "hyper": hyper}
+        for stage in STAGES:
+            if not measure(stage, stages[stage]):
+                break
+            if stage == "ingest":
+                del csv_text
+                gc.collect()
+            if stage == "map" and "map_seconds" in state:
+                records[-1]["seconds"] = round(state["map_seconds"], 3)
+                records[-1]["rows_per_second"] = int(rows / state["map_seconds"]) if state["map_seconds"] else None
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            pool.shutdown()
+
+    results.put(records)
+
+
+def receive(process, results):
+    """
+    Return: The records the case process sent, None when it died first (e.g. killed for memory)
+    """
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                return None
+
+
+def git_commit() -> str:
+    """
+    Return: Short hash of HEAD, suffixed -dirty when tracked files have uncommitted changes
+    """
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        commit = git("rev-parse", "--short", "HEAD")
+        return commit + "-dirty" if git("status", "--porcelain", "--untracked-files=no") else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def resolve_commit(ref: str) -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", ref], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ref
+
+
+def save_results(records: list, path: str = RESULTS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def load_results(commit: str, path: str = RESULTS_FILE) -> list:
+    """
+    Return: The records of the last run stored for the commit (with or without uncommitted changes)
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    records = [record for record in records if record["commit"].removesuffix("-dirty") == commit]
+    if not records:
+        return []
+    last_run = records[-1]["run_id"]
+    return [record for record in records if record["run_id"] == last_run]
+
+
+def compare(current: list, baseline: list, threshold: float = 0.15) -> list:
+    """
+    Pairs every stage of this run with the baseline's run of the same (domain, rows, stage).
+
+    Return: Rows of the comparison, "regression" set where time or memory grew more than `threshold`
+            (and more than the noise floor, MIN_SECONDS_DELTA / MIN_RSS_DELTA_MB)
+    """
+    previous = {(record["domain"], record["rows"], record["stage"]): record for record in baseline}
+    rows = []
+    for record in current:
+        before = previous.get((record["domain"], record["rows"], record["stage"]))
+        if before is None or record["status"] != "ok" or before["status"] != "ok":
+            continue
+
+        slower = (record["seconds"] > before["seconds"] * (1 + threshold)
+                  and record["seconds"] - before["seconds"] > MIN_SECONDS_DELTA)
+        heavier = (record["rss_growth_mb"] > before["rss_growth_mb"] * (1 + threshold)
+                   and record["rss_growth_mb"] - before["rss_growth_mb"] > MIN_RSS_DELTA_MB)
+        rows.append({
+            "domain": record["domain"],
+            "rows": record["rows"],
+            "stage": record["stage"],
+            "seconds": (before["seconds"], record["seconds"]),
+            "rss_growth_mb": (before["rss_growth_mb"], record["rss_growth_mb"]),
+            "regression": [name for name, grew in (("time", slower), ("memory", heavier)) if grew],
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--domains", nargs="+", default=["finance", "sales", "hr"], choices=["finance", "sales", "hr"])
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--variant-rate", type=float, default=0.1)
+    parser.add_argument("--date-rate", type=float, default=0.3)
+    parser.add_argument("--agent-latency", type=float, default=0.0, help="Seconds the stubbed entity agent takes per call")
+    parser.add_argument("--agent-url", help="Call the agent API at this base URL (e.g. a mock_agent_server.py) instead of the stub")
+    parser.add_argument("--compare", metavar="COMMIT", help="Commit (or ref) whose last stored run is the baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed growth before a stage counts as a regression")
+    parser.add_argument("--no-save", action="store_true", help="Don't append this run to the results file")
+    args = parser.parse_args(argv)
+
+    dirtiness = {"null_rate": args.null_rate, "variant_rate": args.variant_rate, "date_rate": args.date_rate}
+    commit = git_commit()
+    run_id = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    context = multiprocessing.get_context("spawn")
+    print(f"Commit {commit}, dirtiness {dirtiness}")
+    print(f"{'Domain':<8} | {'Rows':>10} | {'Stage':<8} | {'Status':<7} | {'Seconds':>8} | {'Rows/s':>10} | {'Peak MB':>8} | {'RSS +MB':>8}")
+    print("-" * 88)
+
+    current = []
+    for rows in args.rows:
+        for domain in args.domains:
+            results = context.Queue()
+            process = context.Process(target=run_case, args=(domain, rows, dirtiness, args.agent_latency, args.agent_url, results))
+            process.start()
+            records = receive(process, results)
+            process.join()
+            if records is None:
+                print(f"{domain:<8} | {rows:>10} | case process exited with code {process.exitcode}")
+                continue
+
+            for record in records:
+                record.update({"commit": commit, "run_id": run_id, **dirtiness})
+                print(f"{domain:<8} | {rows:>10} | {record['stage']:<8} | {record['status']:<7} | {record['seconds']:>8} | "
+                      f"{record['rows_per_second'] or '-':>10} | {record['peak_rss_mb']:>8} | {record['rss_growth_mb']:>8}")
+                if record["note"]:
+                    print(f"    {record['note']}")
+            current.extend(records)
+
+    # The baseline is read before this run is stored, so comparing against HEAD means its previous run
+    baseline_commit = resolve_commit(args.compare) if args.compare else None
+    baseline = load_results(baseline_commit) if args.compare else []
+
+    if not args.no_save:
+        save_results(current)
+        print(f"Results appended to {RESULTS_FILE}")
+
+    if args.compare:
+        if not baseline:
+            print(f"No stored run for {baseline_commit}, nothing to compare")
+            return 0
+
+        comparison = compare(current, baseline, args.threshold)
+        print(f"\nAgainst {baseline_commit} ({baseline[0]['run_id']})")
+        print(f"{'Domain':<8} | {'Rows':>10} | {'Stage':<8} | {'Seconds':>19} | {'RSS +MB':>19} | Regression")
+        print("-" * 88)
+        for row in comparison:
+            seconds = f"{row['seconds'][0]} -> {row['seconds'][1]}"
+            memory = f"{row['rss_growth_mb'][0]} -> {row['rss_growth_mb'][1]}"
+            print(f"{row['domain']:<8} | {row['rows']:>10} | {row['stage']:<8} | {seconds:>19} | {memory:>19} | {', '.join(row['regression'])}")
+
+        if any(row["regression"] for row in comparison):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    sys.exit(main())
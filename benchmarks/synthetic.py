@@ -0,0 +1,239 @@
+"""
+Synthetic finance / sales / HR tables for the benchmarks, with controllable dirtiness:
+
+    null_rate:    Share of missing cells in every non-key column. Text nulls are written as the
+                  placeholders dirty exports carry ("", "null", "NULL", "NaN"), numbers are left blank.
+    variant_rate: Share of categorical cells spelled as a variant of their entity ("Pend", "I.B.M.", ...)
+    date_rate:    Share of dates in another format than YYYY-MM-DD ("07-Nov-25", "07/11/2025", ...)
+
+Raw headers are abbreviated the way exports name them (Trans_Ref, Curr, Emp_Type...), column_mapping()
+gives the ontology field each one stands for and entity_variants() every canonical entity with its
+variants, i.e. what a perfect SemanticMapper / entity agent would answer.
+
+Usage:
+    from benchmarks.synthetic import generate_table, to_csv
+    df = generate_table("finance", 1_000_000, null_rate=0.05, variant_rate=0.1, date_rate=0.3)
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+# Ontology file of each domain, see ontology/
+ONTOLOGY_FILES = {
+    "finance": "ontology/Finance.json",
+    "sales": "ontology/Sales.json",
+    "hr": "ontology/HumanResources.json",
+}
+
+# How dirty exports write a missing text cell
+NULL_TOKENS = ["", "null", "NULL", "NaN"]
+
+# Canonical format first, the others are the "mixed" formats (all day first, like EntityResolver.resolve_date parses them)
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%b-%y", "%d.%m.%Y"]
+
+CURRENCIES = {"USD": ["usd", "US Dollar", "US$"], "EUR": ["eur", "Euro"], "GBP": ["gbp", "Pound Sterling"], "CAD": ["cad", "Can$"]}
+
+# (raw header, ontology field, kind, options)
+#   id:       unique "<prefix><n>" key
+#   category: canonical values -> variant spellings
+#   text:     "<prefix> <n>" out of `pool` distinct values
+#   amount:   normal(mean, sd) rounded to cents
+#   integer:  uniform in [low, high]
+#   date:     day within `days` days from `start`
+DOMAINS = {
+    "finance": [
+        ("Trans_Ref", "Transaction_ID", "id", {"prefix": "TX-"}),
+        ("Vendor", "Vendor_Name", "category", {"values": {
+            "IBM": ["I.B.M.", "IBM corp", "International Business Machines"],
+            "Oracle": ["Oracle Corp", "ORCL", "oracle"],
+            "SAP": ["S.A.P.", "SAP SE"],
+            "Microsoft": ["MSFT", "Microsoft Corp", "micro soft"],
+            "B.S. Media": ["BSM", "BS Media"],
+        }}),
+        ("Client", "Customer_Name", "text", {"prefix": "Client", "pool": 50_000}),
+        ("Curr", "Currency_Code", "category", {"values": CURRENCIES}),
+        ("Ex_Rate", "Exchange_Rate", "amount", {"mean": 1.2, "sd": 0.2}),
+        ("Net", "Net_Amount", "amount", {"mean": 1500, "sd": 600}),
+        ("Tax", "Tax_Amount", "amount", {"mean": 150, "sd": 60}),
+        ("Total", "Gross_Amount", "amount", {"mean": 1650, "sd": 660}),
+        ("Status", "Approval_Status", "category", {"values": {
+            "Approved": ["approved", "Aprvd", "APPROVED"],
+            "Pending": ["Pend", "pnding", "pending"],
+            "Rejected": ["Rej", "rejected"],
+        }}),
+        ("Entry_Date", "Transaction_Date", "date", {"start": "2023-01-01", "days": 1095}),
+        ("Cost_Ctr", "Cost_Center", "category", {"values": {
+            "CC-100": ["CC100", "cc-100"], "CC-200": ["CC200"], "CC-300": ["CC300", "cc 300"], "CC-400": ["CC400"],
+        }}),
+        ("Pay_Method", "Payment_Method", "category", {"values": {
+            "Wire": ["wire transfer", "WIRE"], "Card": ["Credit Card", "card"], "ACH": ["ach", "A.C.H."],
+        }}),
+    ],
+    "sales": [
+        ("Opp_Id", "Opportunity_ID", "id", {"prefix": "OPP-"}),
+        ("Account", "Account_Name", "category", {"values": {
+            "Acme Corp": ["ACME", "Acme Corporation", "acme corp"],
+            "Globex": ["Globex Inc", "GLOBEX"],
+            "Initech": ["Initech LLC", "initech"],
+            "Umbrella": ["Umbrella Corp", "Umbrela"],
+            "Stark Industries": ["Stark Ind.", "Stark"],
+        }}),
+        ("Contact", "Primary_Contact", "text", {"prefix": "Contact", "pool": 20_000}),
+        ("Lead_Src", "Lead_Source", "category", {"values": {
+            "Web": ["website", "web"], "Referral": ["referal", "Referred"], "Event": ["Trade Show", "event"],
+        }}),
+        ("Stage", "Sales_Stage", "category", {"values": {
+            "Prospecting": ["prospect", "Prospect"],
+            "Qualification": ["Qualify", "qualified"],
+            "Proposal": ["proposal", "Quote"],
+            "Negotiation": ["Negotiating", "negotiation"],
+            "Closed Won": ["Won", "closed-won"],
+            "Closed Lost": ["Lost", "closed-lost"],
+        }}),
+        ("Prob", "Probability_Percent", "integer", {"low": 0, "high": 100}),
+        ("Close", "Close_Date", "date", {"start": "2024-01-01", "days": 730}),
+        ("SKU", "Product_SKU", "category", {"values": {
+            "SKU-1001": ["SKU1001", "sku-1001"], "SKU-2002": ["SKU2002"], "SKU-3003": ["SKU3003", "sku 3003"],
+        }}),
+        ("Qty", "Quantity", "integer", {"low": 1, "high": 500}),
+        ("Price", "Unit_Price", "amount", {"mean": 250, "sd": 80}),
+        ("TCV", "Total_Contract_Value", "amount", {"mean": 60_000, "sd": 25_000}),
+        ("Curr", "Currency_Code", "category", {"values": CURRENCIES}),
+        ("Region", "Region", "category", {"values": {
+            "North America": ["N. America", "NA", "north america"],
+            "EMEA": ["Europe", "emea"],
+            "APAC": ["Asia Pacific", "apac"],
+            "LATAM": ["Latin America", "latam"],
+        }}),
+    ],
+    "hr": [
+        ("Emp_Id", "Employee_ID", "id", {"prefix": "EMP-"}),
+        ("Name", "Full_Name", "text", {"prefix": "Employee", "pool": 1_000_000}),
+        ("Title", "Job_Title", "category", {"values": {
+            "Analyst": ["analyst", "Anlst"], "Engineer": ["Eng.", "engineer"], "Manager": ["Mgr", "manager"], "Director": ["Dir.", "director"],
+        }}),
+        ("Dept", "Department", "category", {"values": {
+            "Engineering": ["Eng", "engineering", "R&D"],
+            "Sales": ["sales", "Sales Dept"],
+            "Finance": ["Fin", "finance"],
+            "Human Resources": ["HR", "H.R.", "People"],
+        }}),
+        ("Emp_Type", "Employment_Type", "category", {"values": {
+            "Full-Time": ["FT", "full time", "Fulltime"], "Part-Time": ["PT", "part time"], "Contractor": ["Contract", "contractor"],
+        }}),
+        ("Hire", "Hire_Date", "date", {"start": "2010-01-01", "days": 5475}),
+        ("Status", "Employment_Status", "category", {"values": {
+            "Active": ["active", "Actv"], "Terminated": ["Term", "terminated"], "On Leave": ["Leave", "on-leave"],
+        }}),
+        ("Location", "Work_Location", "category", {"values": {
+            "London": ["LDN", "london"], "New York": ["NYC", "New York City"], "Singapore": ["SG", "singapore"],
+        }}),
+        ("Salary", "Base_Salary", "amount", {"mean": 85_000, "sd": 20_000}),
+        ("Bonus", "Bonus_Target", "amount", {"mean": 8_000, "sd": 3_000}),
+        ("Curr", "Currency_Code", "category", {"values": CURRENCIES}),
+        ("Rating", "Performance_Rating", "integer", {"low": 1, "high": 5}),
+    ],
+}
+
+
+def column_mapping(domain: str) -> dict:
+    """
+    Return: {raw header: ontology field} of the domain's table
+    """
+    return {raw: field for raw, field, _, _ in DOMAINS[domain]}
+
+
+def entity_variants(domain: str) -> dict:
+    """
+    Return: {canonical entity: [variant spellings]} over every categorical column of the domain
+    """
+    variants = {}
+    for _, _, kind, options in DOMAINS[domain]:
+        if kind == "category":
+            for canonical, spellings in options["values"].items():
+                variants.setdefault(canonical, [])
+                variants[canonical].extend(spelling for spelling in spellings if spelling not in variants[canonical])
+    return variants
+
+
+def generate_table(domain: str, rows: int, null_rate: float = 0.05, variant_rate: float = 0.1, date_rate: float = 0.3,
+                   seed: int = 42) -> pd.DataFrame:
+    """
+    Builds a dirty table of the domain, vectorized so 10M rows take seconds.
+
+    Return: A DataFrame with the raw headers, text as object columns (like a loaded CSV before ingestion)
+    """
+    if domain not in DOMAINS:
+        raise ValueError(f"Unknown domain '{domain}', expected one of {list(DOMAINS)}")
+
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for raw, _, kind, options in DOMAINS[domain]:
+        if kind == "id":
+            columns[raw] = _numbered(options["prefix"], np.arange(1, rows + 1), width=len(str(rows)))
+            # Primary keys stay complete and unique
+            continue
+
+        if kind == "category":
+            values = _categories(rng, options["values"], rows, variant_rate)
+        elif kind == "text":
+            values = _numbered(options["prefix"] + " ", rng.integers(1, options["pool"] + 1, rows))
+        elif kind == "amount":
+            values = rng.normal(options["mean"], options["sd"], rows).round(2)
+        elif kind == "integer":
+            values = rng.integers(options["low"], options["high"] + 1, rows).astype(float)
+        elif kind == "date":
+            values = _dates(rng, options["start"], options["days"], rows, date_rate)
+        else:
+            raise ValueError(f"Unknown column kind '{kind}'")
+
+        missing = rng.random(rows) < null_rate
+        if values.dtype == object:
+            values[missing] = np.array(NULL_TOKENS, dtype=object)[rng.integers(0, len(NULL_TOKENS), int(missing.sum()))]
+        else:
+            values[missing] = np.nan
+        columns[raw] = values
+
+    return pd.DataFrame(columns)
+
+
+def to_csv(df: pd.DataFrame) -> str:
+    """
+    The table as the CSV text the BridgeIngestor receives. Null placeholders are written as-is.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _numbered(prefix: str, numbers: np.ndarray, width: int = 0) -> np.ndarray:
+    text = pd.Series(numbers).astype(str)
+    if width:
+        text = text.str.zfill(width)
+    # A writable copy, with copy-on-write on to_numpy() gives a read-only view
+    return np.array(prefix + text, dtype=object)
+
+
+def _categories(rng, values: dict, rows: int, variant_rate: float) -> np.ndarray:
+    canonicals = list(values)
+    codes = rng.integers(0, len(canonicals), rows)
+    column = np.array(canonicals, dtype=object)[codes]
+
+    dirty = rng.random(rows) < variant_rate
+    for code, canonical in enumerate(canonicals):
+        rows_to_vary = np.flatnonzero(dirty & (codes == code))
+        if values[canonical] and len(rows_to_vary):
+            spellings = np.array(values[canonical], dtype=object)
+            column[rows_to_vary] = spellings[rng.integers(0, len(spellings), len(rows_to_vary))]
+    return column
+
+
+def _dates(rng, start: str, days: int, rows: int, date_rate: float) -> np.ndarray:
+    # Every (format, day) string is rendered once, cells only index into the pool
+    calendar = pd.date_range(start, periods=days, freq="D")
+    pool = np.array([calendar.strftime(date_format).to_numpy(dtype=object) for date_format in DATE_FORMATS], dtype=object)
+
+    formats = np.where(rng.random(rows) < date_rate, rng.integers(1, len(DATE_FORMATS), rows), 0)
+    return pool[formats, rng.integers(0, days, rows)]
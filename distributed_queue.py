@@ -0,0 +1,367 @@
+"""
+Distributed execution (PIPELINE_MODE=distributed): the API node (main.py) queues pipeline jobs in a Redis
+stream and any number of worker nodes (worker.py) run them. Pipeline events travel back over Redis pub/sub
+to the API node, which holds the users' SSE connections.
+
+    API node                                  Worker node
+    RedisJobQueue.submit()  -- XADD jobs -->  PipelineWorker (consumer group, XREADGROUP)
+    SSE queue <-- relay <-- PUBLISH -------  RedisEventPublisher (event_manager.relay)
+
+Jobs are acknowledged once they finished, so a job of a worker that died is picked up again by another
+worker after WORKER_CLAIM_IDLE_SECONDS (running jobs keep their claim fresh). A job that took down
+MAX_DELIVERIES workers is dropped with an error event.
+
+REDIS_QUEUE_URL is a redis:// (or rediss://) URL: the Upstash REST client used by /save can't block on a
+stream or subscribe to a channel.
+
+Runs for the same datasource land on any worker, so INCREMENTAL_STATE_DIR must be shared by all of them.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from redis.exceptions import RedisError, ResponseError
+
+from job_scheduler import Job, QueueFullError, job_scheduler
+from sse_manager import event_manager
+
+load_dotenv()
+
+# "local" runs pipelines in the API process (JobScheduler), "distributed" on worker nodes
+PIPELINE_MODE = (os.getenv("PIPELINE_MODE") or "local").lower()
+
+JOB_STREAM = "tableau-mini:jobs"
+WORKER_GROUP = "pipeline-workers"
+EVENT_CHANNEL = "tableau-mini:events:"
+CANCELLED_KEY = "tableau-mini:cancelled:"
+MAX_DELIVERIES = 3
+
+
+def redis_client(url: Optional[str] = None):
+    """
+    Return: asyncio Redis client for REDIS_QUEUE_URL
+    """
+    url = url or os.getenv("REDIS_QUEUE_URL")
+    if not url:
+        raise ValueError("PIPELINE_MODE=distributed needs REDIS_QUEUE_URL (redis://...)")
+    return aioredis.from_url(url, decode_responses=True)
+
+
+async def ensure_group(redis):
+    try:
+        await redis.xgroup_create(JOB_STREAM, WORKER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        # Created by another node already
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+class RedisEventPublisher:
+    """
+    Worker side: event_manager.relay, publishes every pipeline event to the user's channel
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def __call__(self, user_id: str, event_type: str, data: str):
+        await self.redis.publish(EVENT_CHANNEL + user_id, json.dumps({"event_type": event_type, "data": data}))
+
+
+class RedisJobQueue:
+    """
+    API side stand-in for JobScheduler: same start / stop / submit / cancel, but jobs are queued in Redis
+    and run by worker nodes. Events published by the workers are relayed to the local SSE queues.
+    """
+
+    def __init__(self, redis=None, max_queued: int = 20, events=None):
+        """
+        redis: asyncio Redis client, defaults to REDIS_QUEUE_URL (connected on start())
+        max_queued: Jobs waiting for a worker before submit() refuses
+        events: UserEventManager the relayed events go to, defaults to the SSE manager
+        """
+        self.redis = redis
+        self.max_queued = max_queued
+        self.events = events or event_manager
+        self._relay_task = None
+
+    async def start(self, runner=None):
+        """
+        Subscribes to the workers' events. runner is ignored, the workers run the pipeline.
+        """
+        if self.redis is None:
+            self.redis = redis_client()
+        await ensure_group(self.redis)
+        if self._relay_task is None:
+            # Subscribed before start() returns, so no event of a job submitted next is missed
+            self._relay_task = asyncio.create_task(self._relay(await self._subscribe()))
+
+    async def stop(self):
+        if self._relay_task is not None:
+            self._relay_task.cancel()
+            await asyncio.gather(self._relay_task, return_exceptions=True)
+            self._relay_task = None
+
+    async def _subscribe(self):
+        pubsub = self.redis.pubsub()
+        await pubsub.psubscribe(EVENT_CHANNEL + "*")
+        return pubsub
+
+    async def _relay(self, pubsub, max_backoff: float = 30):
+        """
+        Forwards the workers' events until stop(). A lost Redis connection is subscribed again with a
+        backoff, a message that can't be forwarded is logged and skipped.
+        """
+        backoff = 1.0
+        try:
+            while True:
+                try:
+                    if pubsub is None:
+                        pubsub = await self._subscribe()
+                        print("[QUEUE] Event relay subscribed again")
+                        backoff = 1.0
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                except (RedisError, OSError) as e:
+                    print(f"[QUEUE] ⚠️ Event relay lost Redis ({type(e).__name__}: {e}), retrying in {backoff:.0f}s")
+                    await self._close_pubsub(pubsub)
+                    pubsub = None
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, max_backoff)
+                    continue
+
+                if message is None:
+                    continue
+                try:
+                    await self._forward(message)
+                except Exception as e:
+                    print(f"[QUEUE] ❌ Unable to relay event on {message.get('channel')}: {type(e).__name__}: {e}")
+        finally:
+            await self._close_pubsub(pubsub)
+
+    async def _forward(self, message):
+        user_id = message["channel"][len(EVENT_CHANNEL):]
+        # Every API node receives every event, only the node holding the user's stream forwards it
+        if user_id not in self.events.user_connections:
+            return
+        event = json.loads(message["data"])
+        await self.events.publish(user_id, event_type=event["event_type"], data=event["data"])
+
+    @staticmethod
+    async def _close_pubsub(pubsub):
+        if pubsub is None:
+            return
+        try:
+            await pubsub.aclose()
+        except (RedisError, OSError):
+            pass  # The connection is gone already
+
+    async def counts(self) -> tuple:
+        """
+        Return: (queued, running) jobs. Entries stay in the stream until their job finished.
+        """
+        total = await self.redis.xlen(JOB_STREAM)
+        running = (await self.redis.xpending(JOB_STREAM, WORKER_GROUP))["pending"]
+        return total - running, running
+
+    async def submit(self, user_id: str, payload: dict) -> Job:
+        """
+        Queues a job for the workers.
+
+        Raises: QueueFullError when max_queued jobs are waiting
+        """
+        queued, running = await self.counts()
+        if queued >= self.max_queued:
+            raise QueueFullError(f"The pipeline queue is full ({self.max_queued} jobs waiting)")
+
+        job = Job(user_id, payload)
+        job.entry_id = await self.redis.xadd(JOB_STREAM, {
+            "job_id": job.job_id, "user_id": user_id, "payload": json.dumps(payload), "submitted_at": time.time(),
+        })
+
+        print(f"[QUEUE] Job {job.job_id} queued in Redis for user {user_id} ({queued + 1} waiting, {running} running)")
+        await self.events.publish(user_id, event_type="queue", data=json.dumps({
+            "job_id": job.job_id, "status": "queued", "position": queued + 1, "queued": queued + 1, "running": running,
+        }))
+        return job
+
+    async def cancel(self, job: Job) -> bool:
+        """
+        Drops a job no worker picked up yet. A worker that read the job but didn't start it skips it.
+
+        Return: True if the job was removed from the queue
+        """
+        # Marked first: a worker reading the entry from here on finds the mark, whether or not it is
+        # still in the stream when the pending list is checked
+        await self.redis.set(CANCELLED_KEY + job.job_id, 1, ex=3600)
+        pending = await self.redis.xpending_range(JOB_STREAM, WORKER_GROUP, min=job.entry_id, max=job.entry_id, count=1)
+        if pending:
+            return False
+        removed = await self.redis.xdel(JOB_STREAM, job.entry_id)
+        if removed:
+            job.status = "cancelled"
+        return bool(removed)
+
+    async def snapshot(self) -> dict:
+        queued, running = await self.counts()
+        return {
+            "mode": "distributed",
+            "workers": len(await self.redis.xinfo_consumers(JOB_STREAM, WORKER_GROUP)),
+            "running": running,
+            "queued": queued,
+            "max_queued": self.max_queued,
+        }
+
+
+class PipelineWorker:
+    """
+    Worker side: takes jobs from the Redis stream and runs them, `concurrency` at a time.
+
+    Usage:
+        worker = PipelineWorker(run_pipeline, redis)
+        await worker.run()
+    """
+
+    def __init__(self, runner: Callable[[dict, str], Awaitable], redis=None, concurrency: int = 1,
+                 claim_idle_seconds: float = 600, consumer: Optional[str] = None, publish=None):
+        """
+        runner: Coroutine function run for each job as runner(payload, user_id)
+        redis: asyncio Redis client, defaults to REDIS_QUEUE_URL
+        concurrency: Jobs this worker runs at the same time
+        claim_idle_seconds: A job unacknowledged for this long belongs to a dead worker and is run again
+        consumer: Name of this worker in the consumer group, defaults to host-pid
+        publish: Coroutine function publish(user_id, event_type, data) for job events, defaults to the SSE manager
+        """
+        self.runner = runner
+        self.redis = redis
+        self.concurrency = concurrency
+        self.claim_idle_seconds = claim_idle_seconds
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.publish = publish or event_manager.publish
+        self._running = {}  # entry id -> job id
+        self._tasks = []
+
+    async def run(self):
+        """
+        Runs until stop() (or cancellation)
+        """
+        if self.redis is None:
+            self.redis = redis_client()
+        await ensure_group(self.redis)
+
+        print(f"[WORKER] {self.consumer} waiting for jobs ({self.concurrency} at a time)")
+        self._tasks = [asyncio.create_task(self._consume(index)) for index in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+
+    async def stop(self):
+        """
+        Stops taking jobs. Jobs still running are not acknowledged and run again on another worker.
+        """
+        for task in self._tasks:
+            task.cancel()
+
+    async def _next_entry(self, block_ms: int = 5000):
+        # Jobs of dead workers first, then new ones
+        _, claimed, _ = await self.redis.xautoclaim(JOB_STREAM, WORKER_GROUP, self.consumer,
+                                                     min_idle_time=int(self.claim_idle_seconds * 1000), count=1)
+        if claimed:
+            return claimed[0], True
+
+        response = await self.redis.xreadgroup(WORKER_GROUP, self.consumer, {JOB_STREAM: ">"}, count=1, block=block_ms)
+        if response:
+            return response[0][1][0], False
+        return None, False
+
+    async def _consume(self, index: int):
+        while True:
+            entry, reclaimed = await self._next_entry()
+            if entry is None:
+                # Nothing came during the block. A short pause also keeps servers that don't block from spinning.
+                await asyncio.sleep(0.1)
+                continue
+            entry_id, fields = entry
+            if fields is None:
+                # Deleted (cancelled) while pending
+                await self.redis.xack(JOB_STREAM, WORKER_GROUP, entry_id)
+                continue
+
+            job_id, user_id = fields["job_id"], fields["user_id"]
+            if await self.redis.exists(CANCELLED_KEY + job_id):
+                await self._finish(entry_id)
+                continue
+
+            if reclaimed:
+                delivery = await self.redis.xpending_range(JOB_STREAM, WORKER_GROUP, min=entry_id, max=entry_id, count=1)
+                deliveries = delivery[0]["times_delivered"] if delivery else 1
+                print(f"[WORKER] Job {job_id} taken over from a dead worker (delivery {deliveries})")
+                if deliveries > MAX_DELIVERIES:
+                    await self.publish(user_id, event_type="error", data=f"Job {job_id} stopped {MAX_DELIVERIES} workers and was dropped")
+                    await self._finish(entry_id)
+                    continue
+
+            self._running[entry_id] = job_id
+            waited = time.time() - float(fields.get("submitted_at") or time.time())
+            print(f"[WORKER] {self.consumer}/{index} started job {job_id} for user {user_id} after {waited:.1f}s in the queue")
+            await self.publish(user_id, event_type="queue", data=json.dumps({
+                "job_id": job_id, "status": "running", "position": 0, "waited_seconds": round(waited, 1),
+            }))
+
+            try:
+                await self.runner(json.loads(fields["payload"]), user_id)
+            except asyncio.CancelledError:
+                # Left unacknowledged, another worker takes it over
+                raise
+            except Exception as e:
+                # Failed jobs are not run again, the user got the error
+                print(f"[WORKER] ❌ Job {job_id} failed: {type(e).__name__}: {e}")
+                await self.publish(user_id, event_type="error", data=str(e))
+            finally:
+                self._running.pop(entry_id, None)
+
+            await self._finish(entry_id)
+
+    async def _finish(self, entry_id):
+        await self.redis.xack(JOB_STREAM, WORKER_GROUP, entry_id)
+        await self.redis.xdel(JOB_STREAM, entry_id)
+
+    async def _heartbeat(self):
+        # Claiming its own running jobs again resets their idle time, so they aren't taken over
+        while True:
+            await asyncio.sleep(self.claim_idle_seconds / 3)
+            if self._running:
+                await self.redis.xclaim(JOB_STREAM, WORKER_GROUP, self.consumer, min_idle_time=0,
+                                        message_ids=list(self._running), justid=True)
+
+
+def check_shared_state_dir():
+    """
+    Workers refuse to start without INCREMENTAL_STATE_DIR: with each node's own temp directory, a worker
+    holding an older watermark would append rows another worker already published.
+
+    Raises: ValueError when INCREMENTAL_STATE_DIR is not set
+    """
+    if not os.getenv("INCREMENTAL_STATE_DIR"):
+        raise ValueError("PIPELINE_MODE=distributed needs INCREMENTAL_STATE_DIR on storage every worker shares")
+
+
+def job_queue_from_env():
+    """
+    Return: The queue main.py submits to, RedisJobQueue in distributed mode or the local JobScheduler
+    """
+    if PIPELINE_MODE == "distributed":
+        return RedisJobQueue(max_queued=int(os.getenv("PIPELINE_QUEUE_SIZE") or 20))
+    return job_scheduler
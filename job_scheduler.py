@@ -0,0 +1,247 @@
+"""
+Bounded job queue in front of the pipeline. Every run loads models, borrows a Hyper process and holds
+whole DataFrames, so only `workers` pipelines run at once and the rest wait in a bounded queue.
+
+Waiting users are served round-robin (one job of each user in turn, never more than
+`max_running_per_user` of one user at a time), so one user submitting many jobs can't starve the
+others. Waiting users get a "queue" SSE event whenever their position changes. A full queue is refused
+with QueueFullError, which the API answers with 429.
+
+Usage:
+    scheduler = JobScheduler(workers=2, max_queued=20)
+    await scheduler.start(run_pipeline)
+    job = await scheduler.submit(user_id, payload)     # raises QueueFullError
+    ...
+    await scheduler.stop()
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+from sse_manager import event_manager
+
+load_dotenv()
+
+
+class QueueFullError(Exception):
+    """
+    Raised by submit() when the queue (or the user's share of it) is full
+
+    retry_after: Suggested seconds before submitting again
+    """
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, user_id: str, payload: dict):
+        self.job_id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.payload = payload
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.status = "queued"  # queued -> running -> done / failed, or cancelled
+        self.done = asyncio.Event()
+
+
+class JobScheduler:
+    def __init__(self, runner: Optional[Callable[[dict, str], Awaitable]] = None, workers: int = 2, max_queued: int = 20,
+                 max_queued_per_user: int = 1, max_running_per_user: int = 1, publish=None):
+        """
+        runner: Coroutine function run for each job as runner(payload, user_id), or given to start()
+        workers: Jobs run at the same time
+        max_queued: Jobs waiting (not running) across all users before submit() refuses
+        max_queued_per_user: Jobs one user may have waiting
+        max_running_per_user: Jobs of one user run at the same time, the others wait their turn
+        publish: Coroutine function publish(user_id, event_type, data) for queue events, defaults to the SSE manager
+        """
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.max_running_per_user = max_running_per_user
+        self.publish = publish or event_manager.publish
+
+        # user_id -> waiting jobs (oldest first). The dict order is the round-robin order.
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+        self._running: dict = {}  # job_id -> Job
+        self._changed = asyncio.Condition()
+        self._tasks = []
+        self._job_seconds = deque(maxlen=50)  # Durations of recent jobs, for Retry-After
+
+    @property
+    def queued(self) -> int:
+        return sum(len(jobs) for jobs in self._waiting.values())
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    async def start(self, runner: Optional[Callable[[dict, str], Awaitable]] = None):
+        """
+        Starts the workers. runner replaces the one given to the constructor.
+        """
+        if runner is not None:
+            self.runner = runner
+        if self.runner is None:
+            raise ValueError("JobScheduler needs a runner to start")
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+
+    async def stop(self):
+        """
+        Stops taking jobs and cancels running ones
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: str, payload: dict) -> Job:
+        """
+        Queues a job and tells every waiting user their position.
+
+        Raises: QueueFullError when the queue or the user's share of it is full
+        """
+        async with self._changed:
+            if self.queued >= self.max_queued:
+                raise QueueFullError(f"The pipeline queue is full ({self.max_queued} jobs waiting)", self._retry_after())
+            if len(self._waiting.get(user_id, ())) >= self.max_queued_per_user:
+                raise QueueFullError(f"User {user_id} already has {self.max_queued_per_user} job(s) waiting", self._retry_after())
+
+            job = Job(user_id, payload)
+            self._waiting.setdefault(user_id, deque()).append(job)
+            self._changed.notify_all()
+
+        print(f"[SCHEDULER] Job {job.job_id} queued for user {user_id} ({self.queued} waiting, {self.running} running)")
+        await self._publish_positions()
+        return job
+
+    async def cancel(self, job: Job) -> bool:
+        """
+        Drops a job that hasn't started, e.g. when its user disconnected. Running jobs are left to finish.
+
+        Return: True if the job was removed from the queue
+        """
+        async with self._changed:
+            jobs = self._waiting.get(job.user_id)
+            if not jobs or job not in jobs:
+                return False
+            jobs.remove(job)
+            if not jobs:
+                del self._waiting[job.user_id]
+            job.status = "cancelled"
+            job.done.set()
+
+        await self._publish_positions()
+        return True
+
+    def positions(self) -> dict:
+        """
+        Return: {job_id: 1-based place in the order waiting jobs will start}, following the
+                round-robin (running limits aside)
+        """
+        queues = [list(jobs) for jobs in self._waiting.values()]
+        order = []
+        depth = 0
+        while any(depth < len(jobs) for jobs in queues):
+            order.extend(jobs[depth] for jobs in queues if depth < len(jobs))
+            depth += 1
+        return {job.job_id: position for position, job in enumerate(order, start=1)}
+
+    def _next_job(self) -> Optional[Job]:
+        running_per_user = {}
+        for job in self._running.values():
+            running_per_user[job.user_id] = running_per_user.get(job.user_id, 0) + 1
+
+        for user_id, jobs in self._waiting.items():
+            if running_per_user.get(user_id, 0) < self.max_running_per_user:
+                job = jobs.popleft()
+                # The user goes to the back of the round-robin
+                del self._waiting[user_id]
+                if jobs:
+                    self._waiting[user_id] = jobs
+                return job
+        return None
+
+    async def _worker(self, index: int):
+        while True:
+            async with self._changed:
+                job = self._next_job()
+                while job is None:
+                    await self._changed.wait()
+                    job = self._next_job()
+                job.status = "running"
+                job.started_at = time.monotonic()
+                self._running[job.job_id] = job
+
+            print(f"[SCHEDULER] Worker {index} started job {job.job_id} for user {job.user_id} "
+                  f"after {job.started_at - job.submitted_at:.1f}s in the queue")
+            await self.publish(job.user_id, event_type="queue", data=json.dumps({
+                "job_id": job.job_id, "status": "running", "position": 0,
+                "waited_seconds": round(job.started_at - job.submitted_at, 1),
+            }))
+            await self._publish_positions()
+
+            try:
+                await self.runner(job.payload, job.user_id)
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                print(f"[SCHEDULER] ❌ Job {job.job_id} failed: {type(e).__name__}: {e}")
+                await self.publish(job.user_id, event_type="error", data=str(e))
+            finally:
+                job.finished_at = time.monotonic()
+                self._job_seconds.append(job.finished_at - job.started_at)
+                job.done.set()
+                async with self._changed:
+                    self._running.pop(job.job_id, None)
+                    # A per-user limit may have been holding back another job
+                    self._changed.notify_all()
+
+    async def _publish_positions(self):
+        positions = self.positions()
+        for jobs in list(self._waiting.values()):
+            for job in list(jobs):
+                await self.publish(job.user_id, event_type="queue", data=json.dumps({
+                    "job_id": job.job_id, "status": "queued", "position": positions.get(job.job_id),
+                    "queued": len(positions), "running": self.running,
+                }))
+
+    def _retry_after(self) -> int:
+        # Roughly when a worker frees up: the average recent job length, spread over the workers
+        if not self._job_seconds:
+            return 30
+        return max(1, int(sum(self._job_seconds) / len(self._job_seconds) / max(self.workers, 1)))
+
+    async def snapshot(self) -> dict:
+        # async like RedisJobQueue.snapshot, which counts in Redis
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "users_waiting": len(self._waiting),
+        }
+
+
+# Shared by the API. PIPELINE_WORKERS caps concurrent pipelines, PIPELINE_QUEUE_SIZE the jobs waiting for one.
+# The runner (run_pipeline) is given by main.py at startup.
+job_scheduler = JobScheduler(
+    workers=int(os.getenv("PIPELINE_WORKERS") or 2),
+    max_queued=int(os.getenv("PIPELINE_QUEUE_SIZE") or 20),
+    max_queued_per_user=int(os.getenv("PIPELINE_USER_QUEUE_SIZE") or 1),
+    max_running_per_user=int(os.getenv("PIPELINE_USER_CONCURRENCY") or 1),
+)
@@ -4,9 +4,13 @@ from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 from typing import Dict
-# Comment this import when using test-sse.py
-from pipeline import run_pipeline
-from sse_manager import event_manager
+from contextlib import asynccontextmanager
+from sse_manager import event_manager, format_event
+from agent import async_agent_client, call_policy
+from ExecutionEngine.HyperPool import hyper_pool, check_hyper_pool
+from job_scheduler import QueueFullError
+from distributed_queue import PIPELINE_MODE, job_queue_from_env
+from process_offload import process_offloader
 from dotenv import load_dotenv
 
 from upstash_redis import Redis
@@ -15,9 +19,44 @@ import json
 import asyncio
 import os
 import uvicorn
+import pandas as pd
 
+# Pipeline frames share column data until one side writes, so renaming / replacing columns never copies
+# the table (see replace_columns). Set here, at the entry point, because it changes pandas for the whole process.
+pd.set_option("mode.copy_on_write", True)
 
-app = FastAPI()
+
+# Local: JobScheduler running pipelines in this process. Distributed: RedisJobQueue feeding worker.py nodes.
+job_queue = job_queue_from_env()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Imported at startup, not with this module: process pool workers import main.py again and must not
+    # log in to Salesforce / load the embedding model. Comment this import when using test-sse.py
+    from pipeline import run_pipeline
+
+    # Pipelines run here only in local mode, worker nodes hold their own Hyper / process pools
+    local = PIPELINE_MODE != "distributed"
+    if local:
+        # Warm Hyper processes shared by every extract
+        await asyncio.to_thread(hyper_pool.start)
+        health_task = asyncio.create_task(check_hyper_pool(float(os.getenv("HYPER_HEALTH_INTERVAL") or 60)))
+        # CPU-heavy stages run in worker processes when PROCESS_POOL_WORKERS > 0
+        await asyncio.to_thread(process_offloader.start)
+    # Pipelines run on a fixed number of workers, see PIPELINE_WORKERS / PIPELINE_QUEUE_SIZE
+    await job_queue.start(run_pipeline)
+
+    yield
+
+    await job_queue.stop()
+    if local:
+        health_task.cancel()
+        await asyncio.to_thread(process_offloader.shutdown)
+        await asyncio.to_thread(hyper_pool.shutdown)
+    # Ends pooled agent sessions and closes their connections
+    await async_agent_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 load_dotenv()
 
@@ -161,23 +200,23 @@ async def sse(user_id: str):
             
         payload = json.loads(payload)
 
-        # Connect queue first
+        # Connect queue first, the job's events start with the submit
         queue = await event_manager.connect(user_id)
-        
-        # Send initial connection event through queue
-        await event_manager.publish(
-            user_id,
-            event_type="connected",
-            data=json.dumps({"user_id": user_id, "status": "connected"})
-        )
-        
-        # Start pipeline
-        asyncio.create_task(run_pipeline(payload, user_id))
-        
+
+        # Queue the pipeline, refused with 429 when the queue is full
+        try:
+            job = await job_queue.submit(user_id, payload)
+        except QueueFullError as e:
+            await event_manager.disconnect(user_id)
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
         async def stream():
             try:
                 print(f"[STREAM] Starting event loop for user {user_id}")
                 chunk_count = 0
+
+                # Only an accepted job is told it is connected, ahead of the job's events already queued
+                yield format_event("connected", json.dumps({"user_id": user_id, "status": "connected"}))
                 
                 # This loop should run indefinitely until client disconnects
                 while True:
@@ -197,6 +236,8 @@ async def sse(user_id: str):
             finally:
                 print(f"[STREAM] Cleanup: Disconnecting user {user_id}")
                 await event_manager.disconnect(user_id)
+                # Nobody is listening any more, a job that hasn't started is dropped
+                await job_queue.cancel(job)
         
         return StreamingResponse(
             stream(), 
@@ -207,6 +248,8 @@ async def sse(user_id: str):
                 "X-Accel-Buffering": "no",
             }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print("Exception Occured", e)
         raise HTTPException(status_code=400, detail=str(e))
@@ -216,6 +259,16 @@ async def notify(user_id: str, msg: str):
     await event_manager.publish(user_id, event_type="normal", data=msg)
     return {"status": "sent"}
 
+@app.get("/metrics/agent")
+def agent_metrics():
+    # Latency / failure counters for agent calls and the circuit breaker state
+    return {**call_policy.metrics.snapshot(), "circuit": call_policy.breaker.state}
+
+@app.get("/metrics/queue")
+async def queue_metrics():
+    # Pipeline jobs running / waiting, counted in Redis in distributed mode
+    return await job_queue.snapshot()
+
 @app.get("/hello")
 def read_hello(name: str = "World"):
    return {"message": f"Hello, {name}!"}
@@ -0,0 +1,356 @@
+"""
+Local stand-in for the Salesforce OAuth + Agent API endpoints agent.py calls, for load testing the
+pipeline offline:
+
+    POST   /services/oauth2/token
+    POST   /einstein/ai-agent/v1/agents/<agent_id>/sessions
+    POST   /einstein/ai-agent/v1/sessions/<session_id>/messages
+    DELETE /einstein/ai-agent/v1/sessions/<session_id>
+    GET    /stats                                            (requests, injected errors, latency served)
+
+Every endpoint sleeps for a latency drawn from its own distribution, a share of requests can be failed
+with 429/5xx or held past the client's timeout. Replies to the intent, entity and header prompts are
+canned and depend only on the prompt, so runs are repeatable:
+
+    intent:  the ontology sharing the most words with the column names (like IntentDecoder._local_intent)
+    entity:  values that only differ in case / punctuation or abbreviate each other are merged
+             ("I.B.M." / "IBM", "Pend" / "Pending"), or those of an --entities vocabulary file
+    header:  headers made of words in IRRELEVANT_HEADER_WORDS ("Snack_Pref", "Weather")
+
+Usage:
+    python mock_agent_server.py --port 8787 --message-latency lognormal:0.8,0.5 --error-rate 0.02
+
+    SF_DOMAIN_URL=http://127.0.0.1:8787 SF_AGENT_API_URL=http://127.0.0.1:8787/einstein/ai-agent/v1 python main.py
+"""
+
+import argparse
+import bisect
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+API_PATH = "/einstein/ai-agent/v1"
+
+ONTOLOGY_FILES = {
+    "Finance": "ontology/Finance.json",
+    "Sales": "ontology/Sales.json",
+    "Human Resources": "ontology/HumanResources.json",
+}
+
+# Header words the header agent calls professionally irrelevant
+IRRELEVANT_HEADER_WORDS = {"mood", "snack", "weather", "shoe", "lamp", "pencil", "horoscope", "pet", "favourite", "favorite"}
+
+
+class LatencyModel:
+    """
+    A latency distribution in seconds, parsed from "<kind>:<params>":
+
+        none                  no delay
+        fixed:0.5             always 0.5s
+        uniform:0.2,1.5       between 0.2s and 1.5s
+        normal:0.8,0.2        mean 0.8s, standard deviation 0.2s (never below 0)
+        lognormal:0.8,0.5     median 0.8s, sigma 0.5 (long right tail, closest to real LLM calls)
+    """
+
+    KINDS = {"none": 0, "fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+    def __init__(self, kind: str = "none", params: tuple = ()):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}', expected one of {list(self.KINDS)}")
+        if len(params) != self.KINDS[kind]:
+            raise ValueError(f"Latency distribution '{kind}' takes {self.KINDS[kind]} parameter(s), got {len(params)}")
+        self.kind = kind
+        self.params = tuple(float(param) for param in params)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, _, params = spec.partition(":")
+        return cls(kind.strip().lower(), tuple(param for param in params.split(",") if param.strip()))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "none":
+            return 0.0
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(rng.gauss(*self.params), 0.0)
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma)
+
+    def __repr__(self):
+        return f"{self.kind}:{','.join(str(param) for param in self.params)}" if self.params else self.kind
+
+
+def canned_reply(prompt: str, entities: Optional[dict] = None) -> str:
+    """
+    Return: The deterministic reply to one of the pipeline's prompts, "{}" for anything else
+    """
+    if "Available Data Columns:" in prompt:
+        return intent_reply(prompt)
+    if "entity name variants" in prompt:
+        return entity_reply(prompt, entities)
+    if "column header(s)" in prompt:
+        return header_reply(prompt)
+    return "{}"
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"[a-z]+", str(text).lower()))
+
+
+def intent_reply(prompt: str) -> str:
+    match = re.search(r"Available Data Columns:\s*(\{.*?\})\s*\n", prompt, flags=re.DOTALL)
+    columns = json.loads(match.group(1)) if match else {}
+    column_words = set().union(*[_words(col) for col in columns]) if columns else set()
+
+    scores = {}
+    for name, path in ONTOLOGY_FILES.items():
+        with open(path) as f:
+            fields = json.load(f)["required_fields"]
+        scores[name] = len(column_words & set().union(*[_words(field[0]) for field in fields]))
+
+    # Ties keep Finance, like the decoder's default
+    return max(ONTOLOGY_FILES, key=lambda name: scores[name])
+
+
+def entity_reply(prompt: str, entities: Optional[dict] = None) -> str:
+    match = re.search(r"INPUT:\s*(\[.*?\])\s*OUTPUT", prompt, flags=re.DOTALL)
+    values = [value for value in json.loads(match.group(1)) if isinstance(value, str)] if match else []
+
+    if entities is not None:
+        present = set(values)
+        mapping = {canonical: [variant for variant in variants if variant in present and variant != canonical]
+                   for canonical, variants in entities.items()}
+        return json.dumps({canonical: variants for canonical, variants in mapping.items() if variants})
+
+    def key(value):
+        return re.sub(r"[^a-z0-9]", "", value.lower())
+
+    groups = {}
+    for value in values:
+        if key(value):
+            groups.setdefault(key(value), []).append(value)
+
+    # Abbreviations ("pend") join the shortest longer key they start ("pending"). Keys starting with
+    # `short` follow it in sorted order, so columns of thousands of values stay fast.
+    keys = sorted(groups)
+    for short in sorted(groups, key=len):
+        if len(short) < 3:
+            continue
+        longer = []
+        for other in keys[bisect.bisect_right(keys, short):]:
+            if not other.startswith(short):
+                break
+            if other in groups:
+                longer.append(other)
+        if longer:
+            target = min(longer, key=lambda other: (len(other), other))
+            groups[target].extend(groups.pop(short))
+
+    mapping = {}
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        # The longest spelling starting with a capital letter is taken as canonical
+        canonical = max(group, key=lambda value: (value[:1].isupper(), len(value), value))
+        mapping[canonical] = [value for value in group if value != canonical]
+    return json.dumps(mapping)
+
+
+def header_reply(prompt: str) -> str:
+    match = re.search(r"INPUT\s*\n(.*?)OUTPUT", prompt, flags=re.DOTALL)
+    # The prompt holds df.head() as text: rows start with their index, the other lines are headers
+    # (wide frames wrap into several blocks)
+    lines = match.group(1).splitlines() if match else []
+    headers = [word for line in lines if line.split() and not line.split()[0].isdigit() for word in line.split()
+               if word not in ("...", "\\")]
+    flagged = [header for header in dict.fromkeys(headers) if _words(header.replace("_", " ")) & IRRELEVANT_HEADER_WORDS]
+    return json.dumps(flagged)
+
+
+class MockAgentServer:
+    """
+    The stand-in as a context manager (background thread) or a blocking server (serve_forever).
+
+    token_latency / session_latency / message_latency: LatencyModel or spec string per endpoint
+    error_rate:      Share of requests to `error_endpoints` answered with one of `error_statuses`
+    timeout_rate:    Share of those requests held for `hang_seconds` first, so the client times out
+    entities:        {canonical: [variants]} answered to entity prompts instead of the merge heuristic
+    seed:            Seeds latency and error draws
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_latency="none", session_latency="none",
+                 message_latency="none", error_rate: float = 0.0, error_statuses=(429, 500, 503),
+                 error_endpoints=("message",), timeout_rate: float = 0.0, hang_seconds: float = 120.0,
+                 entities: Optional[dict] = None, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.latency = {
+            endpoint: spec if isinstance(spec, LatencyModel) else LatencyModel.parse(spec)
+            for endpoint, spec in (("token", token_latency), ("session", session_latency), ("message", message_latency))
+        }
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.error_endpoints = set(error_endpoints)
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.entities = entities
+        self.stats = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}{API_PATH}"
+
+    def _draw(self, endpoint: str):
+        """
+        Return: (seconds to wait, status to fail with or None) for one request
+        """
+        with self._lock:
+            self.stats[f"{endpoint}_requests"] += 1
+            delay = self.latency[endpoint].sample(self._rng) if endpoint in self.latency else 0.0
+            status = None
+            if endpoint in self.error_endpoints:
+                if self._rng.random() < self.timeout_rate:
+                    delay = self.hang_seconds
+                    self.stats[f"{endpoint}_timeouts"] += 1
+                elif self._rng.random() < self.error_rate:
+                    status = self._rng.choice(self.error_statuses)
+                    self.stats[f"{endpoint}_errors"] += 1
+            self.stats["latency_seconds"] += delay
+        return delay, status
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _serve(self, endpoint, respond):
+                delay, status = mock._draw(endpoint)
+                time.sleep(delay)
+                if status is not None:
+                    self._reply(status, {"error": "injected", "message": f"Mock agent injected a {status}"})
+                else:
+                    respond()
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    with mock._lock:
+                        self._reply(200, dict(mock.stats))
+                else:
+                    self._reply(404, {})
+
+            def do_POST(self):
+                raw = self._body()
+
+                if self.path == "/services/oauth2/token":
+                    self._serve("token", lambda: self._reply(200, {"access_token": f"mock-{uuid.uuid4().hex}", "instance_url": mock.base_url}))
+                elif self.path.startswith(f"{API_PATH}/agents/") and self.path.endswith("/sessions"):
+                    self._serve("session", lambda: self._reply(200, {"sessionId": str(uuid.uuid4())}))
+                elif self.path.startswith(f"{API_PATH}/sessions/") and self.path.endswith("/messages"):
+                    prompt = json.loads(raw)["message"]["text"]
+                    self._serve("message", lambda: self._reply(200, {"messages": [{"message": canned_reply(prompt, mock.entities)}]}))
+                else:
+                    self._reply(404, {})
+
+            def do_DELETE(self):
+                if self.path.startswith(f"{API_PATH}/sessions/"):
+                    self._reply(200, {"status": "ended"})
+                else:
+                    self._reply(404, {})
+
+        return Handler
+
+    def start(self) -> "MockAgentServer":
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        # Hung requests must not keep the process alive
+        self._server.daemon_threads = True
+        return self
+
+    def serve_forever(self):
+        self.start()
+        print(f"Mock agent listening on {self.base_url}")
+        print(f"    SF_DOMAIN_URL={self.base_url}")
+        print(f"    SF_AGENT_API_URL={self.api_url}")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--token-latency", default="none", help="Latency distribution, e.g. fixed:0.1")
+    parser.add_argument("--session-latency", default="none", help="Latency distribution, e.g. uniform:0.1,0.3")
+    parser.add_argument("--message-latency", default="lognormal:0.8,0.5", help="Latency distribution, e.g. lognormal:0.8,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failed with an error status")
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[429, 500, 503])
+    parser.add_argument("--error-endpoints", nargs="+", default=["message"], choices=["token", "session", "message"])
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests held for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--entities", help="JSON file of {canonical: [variants]} answered to entity prompts")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    entities = None
+    if args.entities:
+        with open(args.entities) as f:
+            entities = json.load(f)
+
+    MockAgentServer(
+        host=args.host, port=args.port,
+        token_latency=args.token_latency, session_latency=args.session_latency, message_latency=args.message_latency,
+        error_rate=args.error_rate, error_statuses=args.error_statuses, error_endpoints=args.error_endpoints,
+        timeout_rate=args.timeout_rate, hang_seconds=args.hang_seconds, entities=entities, seed=args.seed,
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,52 @@
 from IngestionLayer.BridgeIngestor import BridgeIngestor
-from IngestionLayer.MetadataScanner import MetadataScanner
+from IngestionLayer.TableStats import json_records, replace_columns, to_nullable
 from SemanticCore.IntentDecoder import IntentDecoder
 from SemanticCore.SemanticMapper import SemanticMapper
 from SemanticCore.EntityResolver import EntityResolver
-from ExecutionEngine.ConfidenceAnalysis import WeightedConfidenceCalculator
 from ExecutionEngine.HyperAPI import HyperParquetIngestor
-from ExecutionEngine.PublishTableau import TableauCloudPublisher
+from ExecutionEngine.HyperPool import hyper_pool
+from ExecutionEngine.PublishTableau import TableauCloudPublisher, MultiTargetPublisher
+from ExecutionEngine.Incremental import DeltaPlanner, IncrementalState
 
 from sse_manager import event_manager
+from tracing import tracer
+from process_offload import process_offloader
 from salesforce_auth_manager import StorageManager
-import pandas as pd
-import numpy as np
 import json
+import os
 import asyncio 
 import tempfile
 import random
 from datetime import datetime
-from collections import defaultdict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tables of one job ingested / cleaned at the same time, each holds its full frame in memory
+TABLE_CONCURRENCY = int(os.getenv("PIPELINE_TABLE_CONCURRENCY") or 2)
 
 
 async def run_pipeline(payload, user_id):
+    """
+    Runs one job, traced when TRACING_ENABLED is set: the timing summary is sent as the last SSE event.
+    """
+    trace = None
+    try:
+        with tracer.trace("pipeline", user_id=user_id) as trace:
+            return await run_job(payload, user_id)
+    finally:
+        if trace is not None:
+            await publish_trace_summary(user_id, trace)
+
+async def publish_trace_summary(user_id, trace):
+    await event_manager.publish(user_id, event_type="normal", data=json.dumps({
+        "id": 7,
+        "title": "Pipeline Timing",
+        "text": "Where the time of this run went, per stage.",
+        **trace.summary()
+    }))
+
+async def run_job(payload, user_id):
 
     print(payload)
         
@@ -34,15 +61,27 @@ async def run_pipeline(payload, user_id):
 
     if dataType.lower() == "string":
         limit = payload["limit"]
-        table_name = payload["table_name"]
+        table_name = payload["table_name"] # one table, or several separated by commas
 
-    table_data = await ingest_data(user_id, dataType, data_or_string, limit, table_name)
+    # Optional multi-table job: [{dataType, data, limit, table_name, name}], each source may hold several tables
+    # (every sheet of a workbook, every listed SQL table). Defaults to the single source above.
+    sources = payload.get("tables") or [{"dataType": dataType, "data": data_or_string, "limit": limit, "table_name": table_name}]
 
-    print(table_data)
+    ingested = await gather_bounded([
+        ingest_data(user_id, source["dataType"], source["data"], source.get("limit"), source.get("table_name"), name=source.get("name"))
+        for source in sources
+    ], TABLE_CONCURRENCY)
+    table_data = [table for tables in ingested for table in tables]
+    if not table_data:
+        raise ValueError("No tables were ingested")
+    names = hyper_table_names([name for name, _, _, _ in table_data])
+    table_data = [(name, *table[1:]) for name, table in zip(names, table_data)]
 
-    cleaned_df, ontology, table_profile, semantic_core_logs = await run_intelligence_pipeline(user_id, table_data=table_data)
+    cleaned_tables = await run_intelligence_pipeline(user_id, table_data=table_data)
 
-    print(cleaned_df)
+    for table in cleaned_tables:
+        print(table["name"])
+        print(table["df"])
 
     credentials = {
         "site_name": site_name,
@@ -51,206 +90,352 @@ async def run_pipeline(payload, user_id):
         "token_name": token_name
     }
 
-    await run_execution_engine(user_id, ontology, df=cleaned_df, table_profile=table_profile, credentials=credentials, total_logs=semantic_core_logs)
+    # Optional incremental refresh: a stable datasource name, plus a watermark or key column (defaults to the likely id)
+    publish_options = {
+        "incremental": bool(payload.get("incremental")),
+        "datasource_name": payload.get("datasource_name"),
+        "watermark_column": payload.get("watermark_column"),
+        "key_column": payload.get("key_column"),
+        # Optional fan-out: [{server_url, site_name, token, token_name, project_name, datasource_name, max_concurrency}]
+        # missing keys default to this request's credentials / project / datasource
+        "targets": payload.get("targets") or [],
+    }
+
+    await run_execution_engine(user_id, cleaned_tables, credentials=credentials, publish_options=publish_options)
 
     return ""
 
-async def run_execution_engine(user_id, ontology, df, table_profile, credentials, total_logs):
+async def run_execution_engine(user_id, tables, credentials, publish_options=None):
+    """
+    Scores, stores and publishes the cleaned tables as a small DAG:
 
-    df = df.replace('null', np.nan)
-    df = df.convert_dtypes()
+        generate .hyper (every table) ──> publish ─────────┐  (critical path, started first)
+        score table ──┬──> persist report                   │  (per table)
+                      └──> SSE results event <──────────────┘  (sent once the publish succeeded)
 
-    weights = {}
-    deducted_points = defaultdict(int)
+    Every step runs off the event loop, the branches run concurrently.
 
-    for log in total_logs:
-        if (log["status"] == "critical"):
-            deducted_points[log["column"]] += 20
-        elif log["status"] == "warning":
-            deducted_points[log["column"]] += 10
-        elif log["status"] == "info":
-            deducted_points[log["column"]] += 0
-    
-    for items in ontology["required_fields"]:
-        weights[items[0]] = items[1]
+    tables: Cleaned tables from run_intelligence_pipeline, dicts of name, df, ontology, profile, logs, stats
+    """
+    publish_options = publish_options or {}
 
-    calculator = WeightedConfidenceCalculator(user_id, df, weights, deducted_points)
+    # Frames from outside the pipeline may still carry placeholders
+    tables = [table if table.get("stats") is not None else {**table, "df": to_nullable(table["df"])} for table in tables]
 
-    for col in df.columns:
-        # Apply checks to relevant columns
-        calculator.check_uniqueness(col, is_primary_key=table_profile[col]["is_likely_id"])
-        null = calculator.check_nulls(col)
+    target_project = "Mini_Project"  # OR: os.getenv("TABLEAU_TEST_PROJECT")
+    target_datasource = publish_options.get("datasource_name") or ("Mini_Datasource/" + datetime.now().strftime("%H:%M:%S"))
 
-    report_data, logs, formated_column_scores, null_score, final_score = await asyncio.to_thread(calculator.calculate_weighted_score)
-    
-    metadata = {
-        "column_scores": formated_column_scores,
-        "null_score": null_score,
-        "report_score": final_score
-    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        hyper_file_path = temp_dir + "/test_output.hyper"
+
+        publish_task = asyncio.create_task(generate_and_publish(
+            user_id, tables, credentials, publish_options, hyper_file_path, target_project, target_datasource
+        ))
+        table_tasks = []
+        for table in tables:
+            score_task = asyncio.create_task(score(user_id, table))
+            table_tasks.append(score_task)
+            table_tasks.append(asyncio.create_task(persist_report(user_id, score_task, table["name"] if len(tables) > 1 else None)))
+            table_tasks.append(asyncio.create_task(publish_results_event(user_id, table["df"], score_task, table["name"], publish_task)))
+
+        # Wait for every branch, even after a failure, so no thread still writes into temp_dir when it is removed
+        outcomes = await asyncio.gather(publish_task, *table_tasks, return_exceptions=True)
+
+    publish_outcome = outcomes[0]
+    if isinstance(publish_outcome, Exception):
+        raise ValueError("Unable to publish to tableau", publish_outcome)
+    for outcome in outcomes[1:]:
+        if isinstance(outcome, Exception):
+            raise outcome
 
-    total_logs.extend(logs)
+    if publish_outcome is not None:
+        # Per-target outcome and latency of a fan-out publish
+        await event_manager.publish(user_id, event_type="normal", data=json.dumps({
+            "id": 6,
+            "title": "Publish Results",
+            "text": "Outcome of publishing the extract to each Tableau target.",
+            "publish_results": publish_outcome
+        }))
 
-    for log in total_logs:
-        print("---------------------") 
-        print(log)
+    print("\n✅ Live publish test completed successfully.")
+
+
+async def score(user_id, table):
+    async with tracer.span("score", table=table["name"], rows=len(table["df"]), columns=len(table["df"].columns)):
+        return await process_offloader.score(user_id, table["ontology"], table["df"], table["profile"], table["logs"], table.get("stats"))
+
+
+async def persist_report(user_id, score_task, table_name=None):
+    _, metadata, total_logs = await score_task
 
     report_name = str(random.randrange(0, 1000)).ljust(4, "0")
+    if table_name:
+        report_name += f" - {table_name}"
 
     await asyncio.to_thread(StorageManager.add_report, report_data=total_logs, user_id=user_id, report_name=f"Mini Report {report_name}", metadata=metadata)
-    
-    target_project = "Mini_Project"  # OR: os.getenv("TABLEAU_TEST_PROJECT")
-    target_datasource = "Mini_Datasource/" + datetime.now().strftime("%H:%M:%S")
 
-    with tempfile.TemporaryDirectory() as temp_dir:
 
-        hyper_file_path = temp_dir + "/test_output.hyper"
-        ingestor = HyperParquetIngestor(hyper_file_path=hyper_file_path, user_id=user_id)
-        ingestor.generate_file(df, "Integration_Table")
-
-        # 3. Initialize Real Publisher
-        print(f"[2/3] Connecting to real server: {credentials["server_url"]}")
-        publisher = TableauCloudPublisher(
-            user_id=user_id,
-            server_url=credentials["server_url"], 
-            site_name=credentials["site_name"], 
-            token=credentials["token"],
-            token_name=credentials["token_name"]
-        )
-
-        # 4. Execute Publish
-        #    If this fails, it will raise an Exception and fail the test automatically.
-        print(f"[3/3] Attempting upload to Project: '{target_project}'...")
-        
-        try:
-            str_cols = df.select_dtypes(include=["object", "string"]).columns
-            df[str_cols] = df[str_cols].fillna("Null")
+async def publish_results_event(user_id, df, score_task, table_name, publish_task):
+    report_data, _, _ = await score_task
 
-            num_cols = df.select_dtypes(include=["number"]).columns
-            df[num_cols] = df[num_cols].fillna(0)
-            
-            await asyncio.to_thread(publisher.publish, 
+    def results_json():
+        event_data ={
+            "id": 5,
+            "title": "Results",
+            "text": "Please view the main page for your results.",
+            "table_name": table_name,
+            "report" : report_data,
+            # Placeholders only exist in the payload, the frame keeps its nulls
+            "data": json_records(df, text_null="Null")
+        }
+        return json.dumps(event_data)
+
+    data = await asyncio.to_thread(results_json)
+
+    # The payload is built while the extract uploads, but results are only announced once it is published.
+    # A failed publish is reported by run_execution_engine.
+    await asyncio.wait([publish_task])
+    if publish_task.cancelled() or publish_task.exception() is not None:
+        return
+
+    await event_manager.publish(user_id, event_type="normal", data=data)
+
+
+async def generate_and_publish(user_id, tables, credentials, publish_options, hyper_file_path, target_project, target_datasource):
+    """
+    Generates the .hyper file, one Hyper table per cleaned table, in a worker thread and publishes it.
+
+    Return: Per-target results for a fan-out publish, else None
+    """
+    targets = publish_options.get("targets") or []
+    # Append / upsert apply to a single table, table_name only matters for those
+    table_name = tables[0]["name"]
+    df, table_profile = tables[0]["df"], tables[0]["profile"]
+
+    ingestor = HyperParquetIngestor(hyper_file_path=hyper_file_path, user_id=user_id, pool=hyper_pool)
+    # The profiles are keyed by the mapped column names, they type DATE / NUMERIC / NOT NULL columns precisely
+    delta = planner = state = None
+    incremental = publish_options.get("incremental")
+    if incremental and (targets or len(tables) > 1):
+        print("Incremental publishing tracks a single table in a single datasource, publishing the full data.")
+        incremental = False
+    if incremental and not publish_options.get("datasource_name"):
+        # The default name changes every run, so there would never be an earlier run to build on
+        print("⚠️ Incremental publishing needs a datasource_name, publishing the full data.")
+        incremental = False
+    if incremental:
+        # Only rows new since the last run are written, and appended / upserted on publish
+        state = IncrementalState(user_id, credentials["server_url"], credentials["site_name"], target_project, target_datasource)
+        planner = DeltaPlanner(profile=table_profile, key_column=publish_options.get("key_column"), watermark_column=publish_options.get("watermark_column"))
+        delta = await asyncio.to_thread(tracer.span("hyper", tables=1, rows=len(df)).call, ingestor.generate_delta_file, df, planner, state, table_name, profile=table_profile)
+    else:
+        async with tracer.span("hyper", tables=len(tables), rows=sum(len(table["df"]) for table in tables)):
+            await process_offloader.generate_tables(ingestor, {table["name"]: (table["df"], table["profile"]) for table in tables})
+
+    if targets:
+        # The same .hyper is uploaded to every target concurrently, nothing is regenerated
+        print(f"[2/3] Publishing to {len(targets)} targets...")
+        defaults = {**credentials, "project_name": target_project, "datasource_name": target_datasource}
+        async with tracer.span("publish", targets=len(targets)):
+            publish_results = await MultiTargetPublisher(user_id).publish(
+                hyper_file_path, [{**defaults, **target} for target in targets], table_name=table_name
+            )
+        if not any(result["status"] == "published" for result in publish_results):
+            raise ValueError("Publishing failed for every target", [result["error"] for result in publish_results])
+        return publish_results
+
+    # 3. Initialize Real Publisher
+    print(f"[2/3] Connecting to real server: {credentials["server_url"]}")
+    publisher = TableauCloudPublisher(
+        user_id=user_id,
+        server_url=credentials["server_url"], 
+        site_name=credentials["site_name"], 
+        token=credentials["token"],
+        token_name=credentials["token_name"]
+    )
+
+    # 4. Execute Publish
+    print(f"[3/3] Attempting upload to Project: '{target_project}'...")
+
+    if delta is not None and delta.mode == "none":
+        print(f"No new rows for '{target_datasource}', nothing to publish.")
+        return None
+
+    publish_rows = delta.rows if delta else sum(len(table["df"]) for table in tables)
+    async with tracer.span("publish", mode=delta.mode if delta else "overwrite", rows=publish_rows):
+        # Uploads in chunks, then polls the server-side publish job without holding a thread
+        try:
+            await publisher.apublish(
                 file_path=hyper_file_path, 
                 project_name=target_project, 
                 datasource_name=target_datasource,
-                certify=True
+                certify=True,
+                mode=delta.mode if delta else "overwrite",
+                key_column=delta.column if delta else None,
+                table_name=table_name
             )
+        except LookupError:
+            # Only a delta can miss its datasource, a full publish creates it
+            if delta is None:
+                raise
+            # The datasource the delta belongs to is gone, publish everything again
+            state.reset()
+            delta = await asyncio.to_thread(ingestor.generate_delta_file, df, planner, state, table_name, profile=table_profile)
+            await publisher.apublish(file_path=hyper_file_path, project_name=target_project, datasource_name=target_datasource, certify=True,
+                                     mode="overwrite", table_name=table_name)
+
+    # Recorded only once the (possibly rebuilt) file is published
+    if delta is not None:
+        delta.commit()
+
+    return None
 
-            event_data ={
-                "id": 5,
-                "title": "Results",
-                "text": "Please view the main page for your results.",
-                "report" : report_data,
-                "data": df.to_dict('records')
-            }
-            await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
-            
-        except Exception as e:
-            raise ValueError("Unable to publish to tableau", e)
+async def run_intelligence_pipeline(user_id, table_data):
+    """
+    Runs the decode -> map -> resolve chain of every ingested table, TABLE_CONCURRENCY tables at a time.
 
-        print("\n✅ Live publish test completed successfully.")
+    table_data: [(table name, profile, df, stats)] from ingest_data
+    Return: One cleaned table per input, dicts of name, df, ontology, profile, logs, stats
+    """
+    return await gather_bounded([
+        clean_table(user_id, name, table_profile, data, stats) for name, table_profile, data, stats in table_data
+    ], TABLE_CONCURRENCY)
 
-async def run_intelligence_pipeline(user_id, table_data):
+async def clean_table(user_id, name, table_profile, data, stats):
     logs = []
     decoder = IntentDecoder(user_id)
 
     # ----- INTENT DECODER ---- 
-    for table_profile, data in table_data:
-
-        print("------- TABLE PROFILE --------")
-        for key, value in table_profile.items():
-            print(key, value)
-        # table_profile: metadata on the columns
-        # data: Dataframe of full data
+    print(f"------- TABLE PROFILE: {name} --------")
+    for key, value in table_profile.items():
+        print(key, value)
+    # table_profile: metadata on the columns
+    # data: Dataframe of full data
+
+    async with tracer.span("decode", table=name):
+        ontology, event_data = await decoder.adecode_intent(metadata_profile=table_profile)
+    # finance, sales or human resources
+    await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
 
-        ontology, event_data = await asyncio.to_thread(decoder.decode_intent, metadata_profile=table_profile)
-        # finance, sales or human resources
-        await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
 
+    mapper = SemanticMapper(user_id)
+    data_resolver = EntityResolver(user_id)
 
-        mapper = SemanticMapper(user_id)
-        data_resolver = EntityResolver(user_id)
+    mapper.precompute_ontology(ontology_json=ontology)
 
-        mapper.precompute_ontology(ontology_json=ontology)
+    # Map ontology vector embeddings
+    updated_col_mappings, event_data = await asyncio.to_thread(tracer.span("map", table=name, columns=len(data.columns)).call, mapper.map_columns, raw_input=data)
+    logs.extend(mapper.get_logs())
 
-        # Map ontology vector embeddings
-        updated_col_mappings, event_data = await asyncio.to_thread(mapper.map_columns, raw_input=data)
-        logs.extend(mapper.get_logs())
+    await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
 
-        await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
+    updated_col_names = {}
+
+    for key, value in updated_col_mappings.items():
+        if value["mapped_to"]:
+            updated_col_names[key] = value["mapped_to"]
+        else:
+            updated_col_names[key] = key
+
+    async with tracer.span("resolve", table=name, rows=len(data)):
+        # Entity resolution only waits on the agent, so every categorical column is resolved concurrently
+        entity_columns = [
+            column_name for column_name in data.columns
+            if (table_profile[column_name]["inferred_type"] == "String") and (table_profile[column_name]["semantic_tag"] == "Categorical_Dimension")
+        ]
+        resolved_columns = await asyncio.gather(*[
+            data_resolver.aresolve(series=data[column_name], col_name=updated_col_names[column_name])
+            for column_name in entity_columns
+        ])
+
+        # Only rewritten columns are collected, every other column is carried over by the rename
+        replacements = dict(zip([updated_col_names[column_name] for column_name in entity_columns], resolved_columns))
+
+        for column_name in data.columns:
+            print("Column Name", column_name)
+            print("column profile", table_profile[column_name])
 
-        updated_col_names = {}
+            if column_name not in entity_columns and table_profile[column_name]["inferred_type"] == "Datetime" :
+                replacements[updated_col_names[column_name]] = await process_offloader.resolve_date(data_resolver, series=data[column_name], column=updated_col_names[column_name])
+    
+        # Off-topic headers are scored locally from the mapper's embeddings, the agent is only a
+        # second opinion (HEADER_AGENT_SECOND_OPINION)
+        await data_resolver.aresolve_headers(data, header_relevance=mapper.get_header_relevance(), similarity_threshold=mapper.threshold)
 
-        for key, value in updated_col_mappings.items():
-            if value["mapped_to"]:
-                updated_col_names[key] = value["mapped_to"]
-            else:
-                updated_col_names[key] = key
+        logs.extend(data_resolver.get_logs())
 
-        updated_data_dict = {}
+        # Statistics and profile follow the mapped names, only the rewritten columns are scanned and converted again
+        updated_df, table_profile = replace_columns(data, updated_col_names, replacements, stats=stats, profile=table_profile)
 
-        col_index = 0
-        for column_name, column_data in data.items():
-            print("Column Name", column_name)
-            print("column profile", table_profile[column_name])
+    event_data ={
+        "id": 4,
+        "title": "Column Entity Resolution",
+        "text": "This section resolves various inconsistencies inside columns from, null value, duplicate value sets Example: I.B.M & IBM corp -> resolve to -> I.B.M. Here are some updated table values",
+        "table_name": name,
+        "table": json_records(updated_df.head())
+    }
 
-            if (table_profile[column_name]["inferred_type"] == "String") and (table_profile[column_name]["semantic_tag"] == "Categorical_Dimension"):
-                updated_data_dict[updated_col_names[column_name]] = await asyncio.to_thread(data_resolver.resolve, series=pd.Series(column_data), col_name=updated_col_names[column_name])
-            elif table_profile[column_name]["inferred_type"] == "Datetime" :
-                updated_data_dict[updated_col_names[column_name]] = await asyncio.to_thread(data_resolver.resolve_date, series=pd.Series(column_data), column=updated_col_names[column_name])
-            else:
-                updated_data_dict[updated_col_names[column_name]] = column_data
-            
-            prev_profile = table_profile[column_name]
-            del table_profile[column_name]
-            table_profile[updated_col_names[column_name]] = prev_profile
-                
-            col_index += 1
-        
-        data_resolver.resolve_headers(data)
+    await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
 
-        logs.extend(data_resolver.get_logs())
+    return {"name": name, "df": updated_df, "ontology": ontology, "profile": table_profile, "logs": logs, "stats": stats}
 
-        updated_df = pd.DataFrame(updated_data_dict)
+async def ingest_data(user_id, dataType, data_or_string: str, limit, table_name, name=None):
+    """
+    Ingests and scans every table of one source.
 
-        str_cols = updated_df.select_dtypes(include=["object", "string"]).columns
-        updated_df[str_cols] = updated_df[str_cols].fillna("null")
+    Return: [(table name, profile, df, stats)]
+    """
+    data_ingestor = BridgeIngestor(user_id)
 
-        num_cols = updated_df.select_dtypes(include=["number"]).columns
-        updated_df[num_cols] = updated_df[num_cols].fillna(0)
+    # A source holds one table, or several (workbook sheets, comma separated SQL tables)
+    span = tracer.span("ingest", source=dataType.lower())
+    tables = await asyncio.to_thread(span.call, data_ingestor.ingest_tables, data_or_string, limit=limit, user_table_name=table_name, dataType=dataType.lower(), name=name)
 
-        event_data ={
-            "id": 4,
-            "title": "Column Entity Resolution",
-            "text": "This section resolves various inconsistencies inside columns from, null value, duplicate value sets Example: I.B.M & IBM corp -> resolve to -> I.B.M. Here are some updated table values",
-            "table": updated_df.head().to_dict(orient="records")
-        }
+    span.set(tables=len(tables), rows=sum(len(table) for _, table, _, _ in tables))
 
+    table_data = []
+    for table_name, table, event_data, stats in tables:
         await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
 
-        return updated_df, ontology, table_profile, logs
-    return "", "", "", ""
+        # --- Meta data scanner ---
 
-async def ingest_data(user_id, dataType, data_or_string: str, limit, table_name):
-    data_ingestor = BridgeIngestor(user_id)
+        async with tracer.span("scan", table=table_name, rows=len(table), columns=len(table.columns)):
+            profile, event_data = await process_offloader.scan(user_id, table, stats)
 
-    # table is a list of data frames, either 1 or multiple
+        await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
 
-    if "://" in dataType:
-        table, event_data = await asyncio.to_thread(data_ingestor.ingest, data_or_string=data_or_string, limit=limit, user_table_name=table_name, dataType=dataType)
-    else:
-        table, event_data = await asyncio.to_thread(data_ingestor.ingest, data_or_string)
+        table_data.append((table_name, profile, table, stats))
 
-    await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
+    return table_data
 
-    # --- Meta data scanner ---
 
-    scanner = MetadataScanner(user_id)
+def hyper_table_names(names):
+    """
+    Names the Hyper tables of a job. A single table keeps the name every earlier extract used.
+    """
+    if len(names) == 1:
+        return ["Integration_Table"]
 
-    profile, event_data = await asyncio.to_thread(scanner.scan, table)
+    unique_names = []
+    for index, name in enumerate(names):
+        name = str(name or f"Table_{index + 1}")
+        candidate, suffix = name, 2
+        while candidate in unique_names:
+            candidate, suffix = f"{name}_{suffix}", suffix + 1
+        unique_names.append(candidate)
+    return unique_names
 
-    await event_manager.publish(user_id, event_type="normal", data=json.dumps(event_data))
 
-    return zip([profile], [table])
+async def gather_bounded(coroutines, limit):
+    """
+    asyncio.gather that runs at most `limit` of the coroutines at a time, results keep their order
+    """
+    # Semaphores belong to the running event loop, so they are made per call
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
 
-    
\ No newline at end of file
+    return await asyncio.gather(*[run(coroutine) for coroutine in coroutines])
@@ -0,0 +1,300 @@
+"""
+Runs the CPU-bound pipeline stages in a persistent pool of worker processes, so pandas / regex /
+Arrow work of one job doesn't hold the GIL the event loop (and every other user's SSE stream) needs.
+
+    scan          MetadataScanner.scan
+    resolve_date  EntityResolver.resolve_date
+    score         ConfidenceAnalysis.score_table
+    hyper         HyperParquetIngestor.generate_tables, on a Hyper process borrowed from the parent's pool
+
+DataFrames don't go through pickle: they are written once as an Arrow IPC stream into shared memory
+(SharedFrame) and only the segment's name crosses the process boundary. Results that are frames come
+back the same way.
+
+Off by default (PROCESS_POOL_WORKERS=0): every stage then runs on a thread of this process, as before.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from multiprocessing import get_context, shared_memory
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+from dotenv import load_dotenv
+from tableauhyperapi import Endpoint
+
+from ExecutionEngine.ConfidenceAnalysis import score_table
+from ExecutionEngine.HyperAPI import HyperParquetIngestor
+from IngestionLayer.MetadataScanner import MetadataScanner
+from SemanticCore.EntityResolver import EntityResolver
+
+load_dotenv()
+
+# Worker processes for the CPU-bound stages, 0 keeps them on threads
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS") or 0)
+
+_SERIES_COLUMN = "__series__"
+
+
+class SharedFrame:
+    """
+    A DataFrame or Series stored as an Arrow IPC stream in a shared memory segment. Pickles as the
+    segment's name, so sending it to another process costs nothing whatever the frame's size.
+
+    The process that created the segment owns it and calls unlink() once the other side is done.
+    """
+
+    def __init__(self, name: str, size: int, dtypes: dict, series_name=None, is_series: bool = False):
+        self.name = name
+        self.size = size
+        self.dtypes = dtypes
+        self.series_name = series_name
+        self.is_series = is_series
+
+    @classmethod
+    def put(cls, data) -> "SharedFrame":
+        is_series = isinstance(data, pd.Series)
+        frame = data.to_frame(name=_SERIES_COLUMN) if is_series else data
+        table = pa.Table.from_pandas(frame)
+
+        # Measure first, so the stream is written straight into a segment of the right size
+        sink = pa.MockOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        size = sink.size()
+
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            target = pa.FixedSizeBufferWriter(pa.py_buffer(segment.buf))
+            with pa.ipc.new_stream(target, table.schema) as writer:
+                writer.write_table(table)
+            # The writers export the segment's buffer, it can only be closed once they are gone
+            del writer, target
+        except BaseException:
+            segment.close()
+            segment.unlink()
+            raise
+        segment.close()
+
+        return cls(segment.name, size, dict(frame.dtypes), series_name=data.name if is_series else None, is_series=is_series)
+
+    def load(self):
+        """
+        Return: The DataFrame / Series, with the dtypes it was stored with
+        """
+        segment = shared_memory.SharedMemory(name=self.name)
+        try:
+            # One copy out of the segment: the frame must not keep the mapping open, or it couldn't be closed
+            payload = pa.py_buffer(bytes(segment.buf[:self.size]))
+        finally:
+            segment.close()
+
+        frame = pa.ipc.open_stream(payload).read_all().to_pandas()
+        # Arrow keeps the values but not every dtype detail (e.g. string[pyarrow] comes back as string[python])
+        changed = {column: dtype for column, dtype in self.dtypes.items() if frame[column].dtype != dtype}
+        if changed:
+            frame = frame.astype(changed)
+        if self.is_series:
+            return frame[_SERIES_COLUMN].rename(self.series_name)
+        return frame
+
+    def unlink(self):
+        try:
+            segment = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        segment.close()
+        segment.unlink()
+
+
+# --- Worker side ---
+# Module level so the pool can pickle them by name. Frames arrive as SharedFrame handles.
+
+def _init_worker(copy_on_write):
+    # Same pandas settings as the process that started the pool (main.py / worker.py)
+    pd.set_option("mode.copy_on_write", copy_on_write)
+
+
+def _ready():
+    return os.getpid()
+
+
+def _scan(user_id, frame: SharedFrame, stats):
+    return MetadataScanner(user_id).scan(frame.load(), stats)
+
+
+def _resolve_date(user_id, series: SharedFrame, column):
+    resolver = EntityResolver(user_id)
+    resolved = resolver.resolve_date(series=series.load(), column=column)
+    return SharedFrame.put(resolved), resolver.get_logs()
+
+
+def _score(user_id, ontology, frame: SharedFrame, table_profile, total_logs, stats):
+    return score_table(user_id, ontology, frame.load(), table_profile, total_logs, stats)
+
+
+def _generate_tables(user_id, hyper_file_path, tables: dict, connection_descriptor, write_path, batch_rows):
+    endpoint = Endpoint(connection_descriptor, "tableau-mini") if connection_descriptor else None
+    ingestor = HyperParquetIngestor(user_id, hyper_file_path, endpoint=endpoint)
+    loaded = {name: (frame.load(), profile) for name, (frame, profile) in tables.items()}
+    return ingestor.generate_tables(loaded, write_path=write_path, batch_rows=batch_rows)
+
+
+class ProcessOffloader:
+    def __init__(self, workers: int = PROCESS_POOL_WORKERS):
+        """
+        workers: Processes in the pool, 0 runs every stage on a thread instead
+        """
+        self.workers = workers
+        self.restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._started = False
+        # Held while the pool starts or restarts. Callers wait for it rather than falling back to threads.
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._started
+
+    def start(self):
+        """
+        Starts the worker processes (blocking, a few seconds). Safe to call more than once.
+        """
+        with self._lock:
+            if self.workers <= 0 or self._started:
+                return
+            self._executor = self._new_executor()
+            self._started = True
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Spawned workers import the parent's main module like any spawn child, so the entry points
+        # (main.py, worker.py) keep the pipeline import and its Salesforce login out of module level
+        print(f"Starting process pool ({self.workers} workers)...")
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"), initializer=_init_worker,
+                                       initargs=(pd.get_option("mode.copy_on_write"),))
+        # Spawn pools start every worker on the first submit, so they all start here
+        executor.submit(_ready).result()
+        return executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+                print("Process pool stopped.")
+            self._started = False
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            # Every caller of the broken pool gets here, only the first one restarts it
+            if not self._started or self._executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+            self.restarts += 1
+            print(f"Process pool restarted ({self.restarts} restarts so far).")
+
+    def _current(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            return self._executor
+
+    async def _run(self, fn, *args):
+        # While a restart holds the lock, wait for the new pool
+        executor = await asyncio.to_thread(self._current) if self._lock.locked() else self._executor
+        if executor is None:
+            raise RuntimeError("Process pool is not running")
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory). The pool is unusable, it is replaced before the next call.
+            print("Process pool broke, restarting it...")
+            await asyncio.to_thread(self._restart, executor)
+            raise
+
+    async def _run_with_frames(self, fn, frames: list, *args):
+        """
+        Shares `frames` for the call, args may hold their handles. The segments are removed afterwards.
+        """
+        try:
+            return await self._run(fn, *args)
+        finally:
+            for frame in frames:
+                frame.unlink()
+
+    async def scan(self, user_id, df: pd.DataFrame, stats=None):
+        """
+        Return: MetadataScanner(user_id).scan(df, stats)
+        """
+        if not self.enabled:
+            return await asyncio.to_thread(MetadataScanner(user_id).scan, df, stats)
+
+        frame = SharedFrame.put(df)
+        return await self._run_with_frames(_scan, [frame], user_id, frame, stats.without_mask() if stats is not None else None)
+
+    async def resolve_date(self, resolver, series: pd.Series, column: str) -> pd.Series:
+        """
+        Return: resolver.resolve_date(series, column), its log is added to the resolver
+        """
+        if not self.enabled:
+            return await asyncio.to_thread(resolver.resolve_date, series=series, column=column)
+
+        shared = SharedFrame.put(series)
+        resolved, logs = await self._run_with_frames(_resolve_date, [shared], resolver.user_id, shared, column)
+        try:
+            result = resolved.load()
+        finally:
+            resolved.unlink()
+
+        resolver.report_log.extend(logs)
+        result.index = series.index
+        return result
+
+    async def score(self, user_id, ontology, df: pd.DataFrame, table_profile, total_logs, stats=None):
+        """
+        Return: score_table(...), (report_data, metadata, total_logs)
+        """
+        if not self.enabled:
+            return await asyncio.to_thread(score_table, user_id, ontology, df, table_profile, total_logs, stats)
+
+        frame = SharedFrame.put(df)
+        report_data, metadata, logs = await self._run_with_frames(
+            _score, [frame], user_id, ontology, frame, table_profile, total_logs, stats.without_mask() if stats is not None else None
+        )
+        # Same contract as score_table: the caller's list holds the scoring logs too
+        total_logs[:] = logs
+        return report_data, metadata, total_logs
+
+    async def generate_tables(self, ingestor, tables: dict, write_path: str = "parquet", batch_rows: int = 100_000) -> dict:
+        """
+        Return: ingestor.generate_tables(tables), with the worker writing through one of ingestor.pool's Hyper processes
+        """
+        if not self.enabled:
+            return await asyncio.to_thread(ingestor.generate_tables, tables, write_path=write_path, batch_rows=batch_rows)
+
+        shared = {name: (SharedFrame.put(df), profile) for name, (df, profile) in tables.items()}
+        frames = [frame for frame, _ in shared.values()]
+
+        if ingestor.pool is None or not ingestor.pool.started:
+            return await self._run_with_frames(_generate_tables, frames, ingestor.user_id, ingestor.hyper_path, shared,
+                                               None, write_path, batch_rows)
+
+        # The worker connects to a borrowed process, so the pool keeps bounding Hyper memory.
+        # acquire() blocks while every process is busy, so it waits on a thread.
+        with ExitStack() as stack:
+            try:
+                endpoint = await asyncio.to_thread(stack.enter_context, ingestor.pool.acquire())
+            except BaseException:
+                for frame in frames:
+                    frame.unlink()
+                raise
+            return await self._run_with_frames(_generate_tables, frames, ingestor.user_id, ingestor.hyper_path, shared,
+                                               endpoint.connection_descriptor, write_path, batch_rows)
+
+# Shared by every pipeline run in this process, started by main.py
+process_offloader = ProcessOffloader()
@@ -1,9 +1,18 @@
 import asyncio
 from typing import Dict
 
+
+def format_event(event_type: str, data: str) -> str:
+    # SSE message with event type + JSON payload
+    return f"event: {event_type}\ndata: {data}\n\n"
+
+
 class UserEventManager:
     def __init__(self):
         self.user_connections: Dict[str, asyncio.Queue] = {}
+        # Set on worker nodes (worker.py): coroutine function relay(user_id, event_type, data) that
+        # forwards events to the API node holding the SSE connections
+        self.relay = None
 
     async def connect(self, user_id: str):
         print(f"[SSE_MANAGER] connect() called for user_id: {user_id}")
@@ -19,12 +28,15 @@ class UserEventManager:
 
     async def publish(self, user_id: str, event_type: str, data: str):
         print(f"[SSE_MANAGER] publish() called - user_id: {user_id}, event_type: {event_type}")
+        if self.relay is not None:
+            await self.relay(user_id, event_type, data)
+            return
+
         print(f"[SSE_MANAGER] Current connections: {list(self.user_connections.keys())}")
         
         queue = self.user_connections.get(user_id)
         if queue:
-            # Format SSE message with event type + JSON payload
-            message = f"event: {event_type}\ndata: {data}\n\n"
+            message = format_event(event_type, data)
             print(f"[SSE_MANAGER] Formatted message (first 100 chars): {message[:100]}")
             try:
                 await queue.put(message)
@@ -13,3 +13,403 @@
 
 #     print()
 #     print(f"Agent Response: {response}")
+
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+import pandas as pd
+import pytest
+import requests
+
+import agent
+from agent import SalesforceAgentClient, AsyncSalesforceAgentClient, AgentAPIError
+from agent import AgentResponseCache, call_salesforce_agent
+from agent import AgentCallPolicy, AgentCallMetrics, CircuitBreaker, RetryBudget, AgentUnavailableError, CircuitOpenError
+from mock_agent_server import MockAgentServer, LatencyModel, canned_reply
+from SemanticCore.EntityResolver import EntityResolver
+from SemanticCore.IntentDecoder import IntentDecoder
+from .utils import AgentStubServer
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with AgentStubServer() as server:
+        monkeypatch.setattr(agent, "AGENT_API_URL", server.api_url)
+        yield server
+
+
+def test_client_reuses_token_session_and_connection(stub):
+    client = SalesforceAgentClient("key", "secret", stub.base_url)
+
+    for i in range(3):
+        assert client.call("agent-1", f"prompt {i}") == f"echo: prompt {i}"
+
+    # One token + one session, then one round trip per prompt
+    assert stub.count("POST", "/services/oauth2/token") == 1
+    assert stub.count("POST", "/sessions") == 1
+    assert stub.count("POST", "/messages") == 3
+    assert stub.sequence_ids == [1, 2, 3]
+    assert len(stub.connections) == 1
+
+    client.close()
+    assert stub.count("DELETE", "/sessions/session-2") == 1
+
+
+def test_client_rotates_sessions(stub):
+    client = SalesforceAgentClient("key", "secret", stub.base_url, max_messages_per_session=2)
+
+    for i in range(3):
+        client.call("agent-1", "hello")
+    client.call("agent-2", "hello")
+
+    assert stub.count("POST", "/sessions") == 3
+    assert stub.sequence_ids == [1, 2, 1, 1]
+    client.close()
+
+
+def test_client_refreshes_expired_token(stub):
+    client = SalesforceAgentClient("key", "secret", stub.base_url, token_ttl=0)
+
+    client.call("agent-1", "hello")
+    client.call("agent-1", "hello")
+
+    assert stub.count("POST", "/services/oauth2/token") == 2
+    client.close()
+
+
+def test_client_resends_with_the_same_sequence_id(stub):
+    client = SalesforceAgentClient("key", "secret", stub.base_url)
+
+    # Expired token: the prompt is re-sent under its sequence number
+    stub.message_failures = [401]
+    client.call("agent-1", "hello")
+    client.call("agent-1", "hello")
+    assert stub.sequence_ids == [1, 2]
+
+    # Expired session: the new session starts over at 1
+    stub.message_failures = [404]
+    client.call("agent-1", "hello")
+    assert stub.sequence_ids == [1, 2, 1]
+    client.close()
+
+
+def test_client_ends_session_after_a_timeout(stub):
+    client = SalesforceAgentClient("key", "secret", stub.base_url, timeout=0.2)
+    stub.message_delay = 1
+
+    with pytest.raises(requests.Timeout):
+        client.call("agent-1", "hello")
+
+    # Ended on the server, not handed back to the pool
+    assert stub.count("DELETE", "/sessions/session-2") == 1
+    assert client._idle_sessions == {"agent-1": []}
+    client.close()
+
+
+def test_client_raises_status_code(stub):
+    client = SalesforceAgentClient("key", "secret", stub.base_url)
+    stub.message_status = 400
+
+    with pytest.raises(AgentAPIError) as error:
+        client.call("agent-1", "hello")
+
+    assert error.value.status_code == 400
+    client.close()
+
+
+@pytest.mark.asyncio
+async def test_async_client_reuses_session(stub):
+    client = AsyncSalesforceAgentClient("key", "secret", stub.base_url)
+
+    for i in range(3):
+        assert await client.call("agent-1", f"prompt {i}") == f"echo: prompt {i}"
+
+    assert stub.count("POST", "/services/oauth2/token") == 1
+    assert stub.count("POST", "/sessions") == 1
+    assert stub.sequence_ids == [1, 2, 3]
+
+    await client.aclose()
+    assert stub.count("DELETE", "/sessions/session-2") == 1
+
+
+@pytest.mark.asyncio
+async def test_async_client_bounds_concurrency(stub):
+    client = AsyncSalesforceAgentClient("key", "secret", stub.base_url, max_concurrency=2)
+
+    replies = await asyncio.gather(*[client.call("agent-1", f"prompt {i}") for i in range(6)])
+
+    assert replies == [f"echo: prompt {i}" for i in range(6)]
+    # Never more than max_concurrency sessions open at once
+    assert stub.count("POST", "/sessions") <= 2
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_async_client_ends_session_after_a_timeout(stub):
+    client = AsyncSalesforceAgentClient("key", "secret", stub.base_url, timeout=0.2)
+    stub.message_delay = 1
+
+    with pytest.raises(httpx.TimeoutException):
+        await client.call("agent-1", "hello")
+
+    assert stub.count("DELETE", "/sessions/session-2") == 1
+    assert client._idle_sessions == {"agent-1": []}
+    await client.aclose()
+
+
+def test_async_client_closes_sessions_left_on_another_loop(stub):
+    client = AsyncSalesforceAgentClient("key", "secret", stub.base_url)
+
+    # First used on a loop that keeps running in another thread
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(client.call("agent-1", "hello"), loop).result(10)
+
+        async def on_main_loop():
+            await client.call("agent-1", "hello")
+            await client.aclose()
+
+        asyncio.run(on_main_loop())
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    # The first loop's session is ended there, the second one by aclose()
+    assert stub.count("POST", "/sessions") == 2
+    assert stub.count("DELETE", "/sessions/session-2") == 1
+    assert len([1 for method, _ in stub.requests if method == "DELETE"]) == 2
+
+
+def test_async_client_reports_sessions_of_a_closed_loop(stub, capsys):
+    client = AsyncSalesforceAgentClient("key", "secret", stub.base_url)
+
+    asyncio.run(client.call("agent-1", "hello"))
+
+    async def on_new_loop():
+        await client.call("agent-1", "hello")
+        await client.aclose()
+
+    asyncio.run(on_new_loop())
+
+    assert "1 agent sessions abandoned" in capsys.readouterr().out
+    assert stub.count("DELETE", "/sessions/session-2") == 0
+
+
+def test_response_cache_lru_and_ttl(monkeypatch):
+    cache = AgentResponseCache(ttl=100, max_entries=2)
+
+    cache.set("agent-1", "a", "reply a")
+    cache.set("agent-1", "b", "reply b")
+    assert cache.get("agent-1", "a") == "reply a"   # 'a' is now most recently used
+    cache.set("agent-1", "c", "reply c")            # evicts 'b'
+
+    assert cache.get("agent-1", "b") is None
+    assert cache.get("agent-2", "a") is None        # keyed by agent as well as prompt
+    assert cache.get("agent-1", "c") == "reply c"
+
+    now = agent.time.time()
+    monkeypatch.setattr(agent.time, "time", lambda: now + 101)
+    assert cache.get("agent-1", "a") is None
+
+
+def test_response_cache_disk_tier(tmp_path):
+    AgentResponseCache(disk_dir=str(tmp_path)).set("agent-1", "prompt", "reply")
+
+    # A fresh instance (e.g. after a restart) reads the reply back from disk
+    assert AgentResponseCache(disk_dir=str(tmp_path)).get("agent-1", "prompt") == "reply"
+
+
+def test_response_cache_disk_tier_is_bounded(tmp_path):
+    cache = AgentResponseCache(disk_dir=str(tmp_path), max_disk_entries=2)
+    for age, prompt in enumerate(["a", "b"]):
+        cache.set("agent-1", prompt, f"reply {prompt}")
+        # Oldest first, whatever the file system's mtime resolution
+        os.utime(cache._disk_path(cache.make_key("agent-1", prompt)), (1000 + age, 1000 + age))
+
+    # Reading "a" back from disk makes it the most recently used file
+    assert AgentResponseCache(disk_dir=str(tmp_path)).get("agent-1", "a") == "reply a"
+    cache.set("agent-1", "c", "reply c")
+
+    fresh = AgentResponseCache(disk_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    assert fresh.get("agent-1", "b") is None
+    assert fresh.get("agent-1", "a") == "reply a"
+    assert fresh.get("agent-1", "c") == "reply c"
+
+
+def test_call_salesforce_agent_uses_cache(stub, monkeypatch):
+    monkeypatch.setattr(agent, "agent_client", SalesforceAgentClient("key", "secret", stub.base_url))
+    monkeypatch.setattr(agent, "response_cache", AgentResponseCache())
+
+    assert call_salesforce_agent("agent-1", "hello") == "echo: hello"
+    assert call_salesforce_agent("agent-1", "hello") == "echo: hello"
+    assert stub.count("POST", "/messages") == 1
+
+    call_salesforce_agent("agent-1", "hello", use_cache=False)
+    assert stub.count("POST", "/messages") == 2
+    agent.agent_client.close()
+
+
+def flaky(failures, status_code=503):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise AgentAPIError("stub failure", status_code=status_code)
+        return "ok"
+
+    return fn, calls
+
+
+def test_policy_retries_transient_failures():
+    policy = AgentCallPolicy(max_attempts=3, base_delay=0)
+    fn, calls = flaky(failures=2)
+
+    assert policy.run(fn) == "ok"
+    assert len(calls) == 3
+    snapshot = policy.metrics.snapshot()
+    assert snapshot["retries"] == 2 and snapshot["successes"] == 1
+
+
+def test_policy_does_not_retry_client_errors():
+    policy = AgentCallPolicy(max_attempts=3, base_delay=0)
+    fn, calls = flaky(failures=1, status_code=400)
+
+    with pytest.raises(AgentAPIError) as error:
+        policy.run(fn)
+
+    assert not isinstance(error.value, AgentUnavailableError)
+    assert len(calls) == 1
+
+
+def test_policy_retry_budget_limits_retries():
+    policy = AgentCallPolicy(max_attempts=5, base_delay=0, budget=RetryBudget(ratio=0, initial_tokens=1))
+    fn, calls = flaky(failures=10)
+
+    with pytest.raises(AgentUnavailableError):
+        policy.run(fn)
+
+    assert len(calls) == 2
+
+
+def test_circuit_breaker_fails_fast_then_recovers(monkeypatch):
+    policy = AgentCallPolicy(max_attempts=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+    fn, calls = flaky(failures=2)
+
+    for _ in range(2):
+        with pytest.raises(AgentUnavailableError):
+            policy.run(fn)
+
+    with pytest.raises(CircuitOpenError):
+        policy.run(fn)
+    assert len(calls) == 2
+
+    # After the reset timeout a trial call is let through and closes the circuit
+    now = agent.time.monotonic()
+    monkeypatch.setattr(agent.time, "monotonic", lambda: now + 31)
+    assert policy.run(fn) == "ok"
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_errors_leave_the_circuit_alone(monkeypatch):
+    policy = AgentCallPolicy(max_attempts=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+    transient, _ = flaky(failures=10)
+    client_error, _ = flaky(failures=10, status_code=400)
+
+    # A 400 between two transient failures doesn't reset the count
+    for fn in (transient, client_error, transient):
+        with pytest.raises(AgentAPIError):
+            policy.run(fn)
+    assert policy.breaker.state == CircuitBreaker.OPEN
+
+    # Nor does it close a half-open circuit, but the next call may try again
+    now = agent.time.monotonic()
+    monkeypatch.setattr(agent.time, "monotonic", lambda: now + 31)
+    with pytest.raises(AgentAPIError):
+        policy.run(client_error)
+    assert policy.breaker.state == CircuitBreaker.HALF_OPEN
+    assert policy.breaker.allow()
+
+
+def test_metrics_keep_the_latest_samples():
+    metrics = AgentCallMetrics(max_samples=3)
+    for latency in [5.0, 1.0, 2.0, 3.0]:
+        metrics.record(latency, ok=True)
+
+    assert metrics.snapshot()["latency_max"] == 3.0
+    assert metrics.snapshot()["successes"] == 4
+
+
+@pytest.mark.asyncio
+async def test_async_policy_retries():
+    policy = AgentCallPolicy(max_attempts=2, base_delay=0)
+    sync_fn, calls = flaky(failures=1)
+
+    async def fn():
+        return sync_fn()
+
+    assert await policy.arun(fn) == "ok"
+    assert len(calls) == 2
+
+
+def test_latency_model_specs():
+    rng = random.Random(0)
+
+    assert LatencyModel.parse("none").sample(rng) == 0
+    assert LatencyModel.parse("fixed:0.5").sample(rng) == 0.5
+    assert all(0.2 <= LatencyModel.parse("uniform:0.2,0.4").sample(rng) <= 0.4 for _ in range(100))
+    samples = sorted(LatencyModel.parse("lognormal:0.8,0.5").sample(rng) for _ in range(2001))
+    assert samples[1000] == pytest.approx(0.8, rel=0.1)
+
+    with pytest.raises(ValueError):
+        LatencyModel.parse("gamma:1,2")
+    with pytest.raises(ValueError):
+        LatencyModel.parse("fixed")
+
+
+def test_mock_agent_answers_pipeline_prompts_deterministically(monkeypatch):
+    df = pd.read_csv("tests/sample_data/bad_finance.csv")
+    resolver = EntityResolver("u1")
+
+    with MockAgentServer(message_latency="fixed:0.05") as mock:
+        monkeypatch.setattr(agent, "AGENT_API_URL", mock.api_url)
+        client = SalesforceAgentClient("key", "secret", mock.base_url)
+
+        started = time.perf_counter()
+        reply = client.call("agent-1", resolver._entity_prompt(["Pending", "Pend", "pending", "IBM", "I.B.M.", "Oracle"]))
+        assert time.perf_counter() - started >= 0.05
+        assert json.loads(reply) == {"Pending": ["pending", "Pend"], "I.B.M.": ["IBM"]}
+
+        assert json.loads(client.call("agent-1", resolver._header_prompt(df))) == ["Internal_Mood_Index", "Snack_Pref", "Weather"]
+        assert client.call("agent-1", "What can you help me with?") == "{}"
+        client.close()
+
+        assert mock.stats["message_requests"] == 3
+
+    profile = {"Employee_ID": {"inferred_type": "String"}, "Job_Title": {"inferred_type": "String"}, "Base_Salary": {"inferred_type": "Numeric"}}
+    assert canned_reply(IntentDecoder("u1")._build_prompt(profile)) == "Human Resources"
+
+
+def test_mock_agent_injects_errors(monkeypatch):
+    with MockAgentServer(error_rate=1.0, error_statuses=[503], seed=1) as mock:
+        monkeypatch.setattr(agent, "AGENT_API_URL", mock.api_url)
+        client = SalesforceAgentClient("key", "secret", mock.base_url)
+
+        with pytest.raises(AgentAPIError) as error:
+            client.call("agent-1", "hello")
+
+        assert error.value.status_code == 503
+        assert mock.stats["message_errors"] == 1
+        # Only the message endpoint fails by default
+        assert mock.stats["token_requests"] == 1 and mock.stats["session_requests"] == 1
+        client.close()
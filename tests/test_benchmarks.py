@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from benchmarks.bench_pipeline import compare, stub_agent
+from benchmarks.synthetic import DOMAINS, NULL_TOKENS, column_mapping, entity_variants, generate_table
+from SemanticCore.EntityResolver import EntityResolver
+
+
+@pytest.mark.parametrize("domain", list(DOMAINS))
+def test_generated_table_has_requested_dirtiness(domain):
+    df = generate_table(domain, 20_000, null_rate=0.1, variant_rate=0.2, date_rate=0.5, seed=1)
+
+    assert list(df.columns) == list(column_mapping(domain))
+    key = next(raw for raw, _, kind, _ in DOMAINS[domain] if kind == "id")
+    assert df[key].is_unique and df[key].notna().all()
+
+    for raw, _, kind, options in DOMAINS[domain]:
+        if kind == "id":
+            continue
+        missing = df[raw].isna() | df[raw].isin(NULL_TOKENS)
+        assert missing.mean() == pytest.approx(0.1, abs=0.02)
+
+        present = df[raw][~missing]
+        if kind == "category":
+            assert (~present.isin(options["values"])).mean() == pytest.approx(0.2, abs=0.02)
+        if kind == "date":
+            assert (~present.str.match(r"^\d{4}-\d{2}-\d{2}$")).mean() == pytest.approx(0.5, abs=0.02)
+
+
+def test_clean_table_has_no_dirt():
+    df = generate_table("finance", 1_000, null_rate=0, variant_rate=0, date_rate=0)
+
+    assert not df.isna().any().any()
+    assert df["Status"].isin(["Approved", "Pending", "Rejected"]).all()
+    assert pd.to_datetime(df["Entry_Date"], format="%Y-%m-%d").notna().all()
+
+
+@pytest.mark.asyncio
+async def test_stub_agent_resolves_generated_variants(monkeypatch):
+    call, acall = stub_agent(entity_variants("sales"))
+    monkeypatch.setattr("SemanticCore.EntityResolver.acall_salesforce_agent", acall)
+
+    series = generate_table("sales", 2_000, null_rate=0, variant_rate=0.3)["Stage"]
+    resolved = await EntityResolver("bench").aresolve(series, "Sales_Stage")
+
+    assert set(resolved) == {"Prospecting", "Qualification", "Proposal", "Negotiation", "Closed Won", "Closed Lost"}
+
+
+def test_compare_flags_time_and_memory_regressions():
+    def record(stage, seconds, rss_growth_mb, status="ok"):
+        return {"domain": "hr", "rows": 1_000_000, "stage": stage, "status": status, "seconds": seconds, "rss_growth_mb": rss_growth_mb}
+
+    baseline = [record("ingest", 2.0, 400), record("scan", 0.5, 10), record("resolve", 3.0, 100), record("map", 0.0, 0, "skipped")]
+    current = [record("ingest", 2.1, 420), record("scan", 0.9, 10), record("resolve", 3.0, 300), record("map", 0.0, 0, "skipped")]
+
+    rows = {row["stage"]: row["regression"] for row in compare(current, baseline, threshold=0.15)}
+
+    assert rows == {"ingest": [], "scan": ["time"], "resolve": ["memory"]}
@@ -0,0 +1,227 @@
+import asyncio
+import json
+
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from redis.asyncio.client import PubSub
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from distributed_queue import (CANCELLED_KEY, EVENT_CHANNEL, JOB_STREAM, WORKER_GROUP, PipelineWorker, RedisEventPublisher,
+                               RedisJobQueue, check_shared_state_dir)
+from job_scheduler import QueueFullError
+from sse_manager import UserEventManager
+
+
+@pytest.fixture
+def server():
+    # One in-memory Redis shared by the API node's and the workers' clients
+    return FakeServer()
+
+
+def client(server):
+    return FakeRedis(server=server, decode_responses=True)
+
+
+async def next_event(queue: asyncio.Queue, event_type: str, timeout: float = 5):
+    while True:
+        message = await asyncio.wait_for(queue.get(), timeout)
+        if message.startswith(f"event: {event_type}\n"):
+            return message.split("data: ", 1)[1].strip()
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_job_and_events_reach_the_api_node(server):
+    # API node: SSE connections + the Redis queue
+    api_events = UserEventManager()
+    job_queue = RedisJobQueue(client(server), events=api_events)
+    await job_queue.start()
+    stream = await api_events.connect("user-1")
+
+    # Worker node: the pipeline publishes through its own event manager, relayed over Redis
+    worker_redis = client(server)
+    worker_events = UserEventManager()
+    worker_events.relay = RedisEventPublisher(worker_redis)
+
+    async def runner(payload, user_id):
+        await worker_events.publish(user_id, event_type="normal", data=json.dumps({"name": payload["name"]}))
+
+    worker = PipelineWorker(runner, worker_redis, publish=worker_events.publish)
+    worker_task = asyncio.create_task(worker.run())
+    try:
+        job = await job_queue.submit("user-1", {"name": "sales"})
+
+        assert json.loads(await next_event(stream, "queue"))["status"] == "queued"
+        running = json.loads(await next_event(stream, "queue"))
+        assert running["job_id"] == job.job_id and running["status"] == "running"
+        assert json.loads(await next_event(stream, "normal")) == {"name": "sales"}
+
+        # Finished jobs are acknowledged and removed
+        for _ in range(50):
+            if await worker_redis.xlen(JOB_STREAM) == 0:
+                break
+            await asyncio.sleep(0.05)
+        assert (await job_queue.snapshot())["queued"] == 0
+        assert (await job_queue.snapshot())["running"] == 0
+    finally:
+        await worker.stop()
+        await worker_task
+        await job_queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_sends_error_and_is_not_retried(server):
+    api_events = UserEventManager()
+    job_queue = RedisJobQueue(client(server), events=api_events)
+    await job_queue.start()
+    stream = await api_events.connect("user-1")
+
+    worker_redis = client(server)
+    worker_events = UserEventManager()
+    worker_events.relay = RedisEventPublisher(worker_redis)
+    calls = []
+
+    async def runner(payload, user_id):
+        calls.append(payload)
+        raise ValueError("bad payload")
+
+    worker = PipelineWorker(runner, worker_redis, publish=worker_events.publish)
+    worker_task = asyncio.create_task(worker.run())
+    try:
+        await job_queue.submit("user-1", {"name": "broken"})
+        assert await next_event(stream, "error") == "bad payload"
+        await asyncio.sleep(0.2)
+        assert len(calls) == 1
+    finally:
+        await worker.stop()
+        await worker_task
+        await job_queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_queue_limit_and_cancel_before_start(server):
+    job_queue = RedisJobQueue(client(server), max_queued=1, events=UserEventManager())
+    await job_queue.start()
+    try:
+        job = await job_queue.submit("user-1", {"name": "a"})
+        with pytest.raises(QueueFullError):
+            await job_queue.submit("user-2", {"name": "b"})
+
+        # No worker took it yet, so the disconnected user's job is dropped
+        assert await job_queue.cancel(job)
+        assert job.status == "cancelled"
+        assert (await job_queue.snapshot())["queued"] == 0
+    finally:
+        await job_queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_job_of_a_dead_worker_is_taken_over(server):
+    job_queue = RedisJobQueue(client(server), events=UserEventManager())
+    await job_queue.start()
+    job = await job_queue.submit("user-1", {"name": "orphan"})
+
+    # A worker read the job and died before acknowledging it
+    redis = client(server)
+    await redis.xreadgroup(WORKER_GROUP, "dead-worker", {JOB_STREAM: ">"}, count=1)
+
+    finished = asyncio.Event()
+    ran = []
+
+    async def runner(payload, user_id):
+        ran.append(payload["name"])
+        finished.set()
+
+    worker = PipelineWorker(runner, redis, claim_idle_seconds=0, consumer="live-worker", publish=UserEventManager().publish)
+    worker_task = asyncio.create_task(worker.run())
+    try:
+        await asyncio.wait_for(finished.wait(), 5)
+        assert ran == ["orphan"]
+    finally:
+        await worker.stop()
+        await worker_task
+        await job_queue.stop()
+    assert job.entry_id not in [entry_id for entry_id, _ in await redis.xrange(JOB_STREAM)]
+
+
+@pytest.mark.asyncio
+async def test_job_read_but_not_started_is_skipped_after_cancel(server):
+    job_queue = RedisJobQueue(client(server), events=UserEventManager())
+    await job_queue.start()
+    job = await job_queue.submit("user-1", {"name": "late"})
+
+    # A worker read the entry and stopped before checking for a cancellation
+    redis = client(server)
+    await redis.xreadgroup(WORKER_GROUP, "slow-worker", {JOB_STREAM: ">"}, count=1)
+
+    assert not await job_queue.cancel(job)
+    assert await redis.exists(CANCELLED_KEY + job.job_id)
+
+    ran = []
+
+    async def runner(payload, user_id):
+        ran.append(payload["name"])
+
+    worker = PipelineWorker(runner, redis, claim_idle_seconds=0, consumer="live-worker", publish=UserEventManager().publish)
+    worker_task = asyncio.create_task(worker.run())
+    try:
+        for _ in range(50):
+            if await redis.xlen(JOB_STREAM) == 0:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await worker.stop()
+        await worker_task
+        await job_queue.stop()
+    assert ran == []
+    assert await redis.xlen(JOB_STREAM) == 0
+
+
+def test_workers_need_a_shared_state_dir(monkeypatch, tmp_path):
+    monkeypatch.delenv("INCREMENTAL_STATE_DIR", raising=False)
+    with pytest.raises(ValueError):
+        check_shared_state_dir()
+
+    monkeypatch.setenv("INCREMENTAL_STATE_DIR", str(tmp_path))
+    check_shared_state_dir()
+
+
+@pytest.mark.asyncio
+async def test_relay_survives_bad_messages_and_lost_connections(server, monkeypatch):
+    api_events = UserEventManager()
+    job_queue = RedisJobQueue(client(server), events=api_events)
+    await job_queue.start()
+    stream = await api_events.connect("user-1")
+    publisher = RedisEventPublisher(client(server))
+    try:
+        # Not JSON: logged and skipped, the next event still arrives
+        await publisher.redis.publish(EVENT_CHANNEL + "user-1", "not json")
+        await publisher("user-1", "normal", "first")
+        assert await next_event(stream, "normal") == "first"
+
+        # The subscription's connection drops, the relay subscribes again
+        subscriptions = []
+        subscribe = job_queue._subscribe
+
+        async def resubscribe():
+            subscriptions.append(await subscribe())
+            return subscriptions[-1]
+
+        monkeypatch.setattr(job_queue, "_subscribe", resubscribe)
+        get_message = PubSub.get_message
+        failures = [RedisConnectionError("connection reset")]
+
+        async def dropping(self, *args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return await get_message(self, *args, **kwargs)
+
+        monkeypatch.setattr(PubSub, "get_message", dropping)
+        for _ in range(100):
+            if subscriptions:
+                break
+            await asyncio.sleep(0.05)
+        await publisher("user-1", "normal", "second")
+        assert await next_event(stream, "normal") == "second"
+    finally:
+        await job_queue.stop()
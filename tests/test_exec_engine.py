@@ -40,3 +40,142 @@
 #     print(f"FINAL DATA: {report_data}")
 #     print("="*30)
 #     print("Score", report_data["score"])
+
+
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from ExecutionEngine.ConfidenceAnalysis import WeightedConfidenceCalculator
+from ExecutionEngine.Incremental import DeltaPlanner, IncrementalState
+from IngestionLayer.TableStats import TableStats
+
+
+def test_watermark_delta(tmp_path):
+    state = IncrementalState("user", "datasource", state_dir=str(tmp_path))
+    planner = DeltaPlanner(watermark_column="Booked")
+
+    day_one = pd.DataFrame({'Booked': ['2024-01-01', '2024-01-02'], 'Amount': [1, 2]})
+    plan = planner.plan(day_one, state)
+    assert plan.mode == "overwrite"
+    plan.pending["schema"] = "published"
+    plan.commit()
+
+    day_two = pd.DataFrame({'Booked': ['2024-01-01', '2024-01-02', '2024-01-03', None], 'Amount': [1, 2, 3, 4]})
+    plan = planner.plan(day_two, state)
+    assert plan.mode == "append"
+    assert plan.frame['Amount'].tolist() == [3]
+    plan.commit()
+
+    # Nothing past the stored watermark
+    assert planner.plan(day_two, state).mode == "none"
+    assert state.load()["watermark"].startswith("2024-01-03")
+
+    # A row committed late with the same timestamp as the last published one is still sent, once
+    day_three = pd.DataFrame({'Booked': ['2024-01-02', '2024-01-03', '2024-01-03'], 'Amount': [2, 3, 5]})
+    plan = planner.plan(day_three, state)
+    assert plan.mode == "append"
+    assert plan.frame['Amount'].tolist() == [5]
+    plan.commit()
+    assert planner.plan(day_three, state).mode == "none"
+
+
+def test_key_delta_defaults_to_likely_id(tmp_path):
+    state = IncrementalState("user", "datasource", state_dir=str(tmp_path))
+    planner = DeltaPlanner(profile={'Invoice': {'is_likely_id': True}})
+
+    day_one = pd.DataFrame({'Invoice': ['A-1', 'A-2'], 'Amount': [1.0, 2.0]})
+    plan = planner.plan(day_one, state)
+    assert (plan.mode, plan.column) == ("overwrite", "Invoice")
+    plan.pending["schema"] = "published"
+    plan.commit()
+
+    # Uncommitted plans leave the state alone
+    day_two = pd.DataFrame({'Invoice': ['A-1', 'A-2', 'A-3'], 'Amount': [1.0, 5.0, 3.0]})
+    assert planner.plan(day_two, state).frame['Invoice'].tolist() == ['A-2', 'A-3']
+    plan = planner.plan(day_two, state)
+    assert plan.mode == "upsert"
+    plan.commit()
+
+    assert planner.plan(day_two, state).mode == "none"
+
+
+def test_no_key_or_watermark_publishes_everything(tmp_path):
+    plan = DeltaPlanner().plan(pd.DataFrame({'Amount': [1, 2]}), IncrementalState("u", state_dir=str(tmp_path)))
+    assert plan.mode == "overwrite" and plan.rows == 2
+
+
+def confidence_frame():
+    return pd.DataFrame({
+        'Transaction_ID': [1, 2, 3, 3, 5],
+        'Revenue': [100, 200, None, 400, 500],
+        'Comments': [None, None, None, None, 'OK'],
+        'Region': ['A', 'A', 'B', 'B', 'B'],
+    })
+
+
+def test_check_all_matches_per_column_checks():
+    weights = {'Transaction_ID': 2.0, 'Revenue': 3.0, 'Comments': 0.5}
+    primary_keys = ['Transaction_ID']
+
+    per_column = WeightedConfidenceCalculator("", confidence_frame(), weights, defaultdict(int, {'Region': 10}))
+    for col in per_column.df.columns:
+        per_column.check_uniqueness(col, is_primary_key=col in primary_keys)
+        per_column.check_nulls(col)
+
+    batched = WeightedConfidenceCalculator("", confidence_frame(), weights, defaultdict(int, {'Region': 10}))
+    batched.check_all(primary_keys=primary_keys)
+
+    assert batched.column_scores == per_column.column_scores
+    assert batched.null_score == per_column.null_score == [2, 4]
+    assert [(log["column"], log["status"]) for log in batched.report_log] == \
+        [(log["column"], log["status"]) for log in per_column.report_log]
+
+    expected = per_column.calculate_weighted_score()
+    report, logs, column_scores, null_score, final_score = batched.calculate_weighted_score()
+
+    assert column_scores == expected[2]
+    assert final_score == expected[4]
+    # Transaction_ID: 0 (duplicate key, -20), Revenue: 80, Comments: 20, Region: 100 - 10
+    assert column_scores == [
+        {"name": "Transaction_ID", "score": -20.0},
+        {"name": "Revenue", "score": 80.0},
+        {"name": "Comments", "score": 20.0},
+        {"name": "Region", "score": 90.0},
+    ]
+    assert final_score == round((-20 * 2 + 80 * 3 + 20 * 0.5 + 90) / 6.5, 2)
+    assert report["score"] == final_score
+
+
+def test_check_all_on_a_wide_table():
+    rng = np.random.default_rng(0)
+    values = rng.random((200, 500))
+    values[values < 0.1] = np.nan
+    df = pd.DataFrame(values, columns=[f"c{i}" for i in range(500)])
+    df["c0"] = np.arange(200)
+
+    calculator = WeightedConfidenceCalculator("", df, {}, defaultdict(int))
+    calculator.check_all(primary_keys=["c0"])
+    _, _, column_scores, null_score, final_score = calculator.calculate_weighted_score()
+
+    expected = 100 - df.isna().mean().to_numpy() * 100
+    np.testing.assert_allclose([col["score"] for col in column_scores], expected.round(2))
+    assert null_score == [int((df.isna().sum() > 0).sum()), 500]
+    assert final_score == round(float(expected.mean()), 2)
+
+
+def test_check_all_reuses_table_stats():
+    df = confidence_frame()
+    stats = TableStats(df)
+    # Same shape but every cell null: any count taken from the frame instead of the stats would differ
+    blank = pd.DataFrame(np.nan, index=df.index, columns=df.columns)
+    calculator = WeightedConfidenceCalculator("", blank, {}, defaultdict(int))
+    calculator.check_all(primary_keys=['Transaction_ID'], stats=stats)
+
+    expected = WeightedConfidenceCalculator("", df, {}, defaultdict(int))
+    expected.check_all(primary_keys=['Transaction_ID'])
+
+    assert calculator.null_score == expected.null_score
+    assert calculator.column_scores['Transaction_ID'] == 0
+    assert calculator.column_scores['Revenue'] == expected.column_scores['Revenue']
@@ -2,14 +2,22 @@ import pytest
 import tempfile
 import pytest_asyncio
 import pandas as pd
+import pyarrow as pa
 import os
 from datetime import datetime
+from decimal import Decimal
 
-from tableauhyperapi import HyperProcess, Connection, Telemetry, TableName
+from tableauhyperapi import HyperProcess, Connection, Telemetry, TableName, SqlType, Nullability
+import tableauserverclient as TSC
+from tableauserverclient.server.endpoint.exceptions import JobCancelledException, JobFailedException
 
 # --- IMPORT YOUR CLASS HERE ---
 from ExecutionEngine.HyperAPI import HyperParquetIngestor 
-from ExecutionEngine.PublishTableau import TableauCloudPublisher
+from ExecutionEngine.HyperPool import HyperProcessPool
+from ExecutionEngine.HyperSchema import HyperSchemaPlanner
+from ExecutionEngine.Incremental import DeltaPlanner, IncrementalState
+from ExecutionEngine.PublishTableau import TableauCloudPublisher, TableauSessionCache, ProjectResolver, MultiTargetPublisher
+from .utils import FakeTableauServer
 
 # ==========================================
 # 1. FIXTURES
@@ -173,4 +181,432 @@ async def sample_df():
 #         except Exception as e:
 #             pytest.fail(f"Live Publish Failed: {e}")
 
-#     print("\n✅ Live publish test completed successfully.")
\ No newline at end of file
+#     print("\n✅ Live publish test completed successfully.")
+
+
+@pytest.fixture
+def hyper_pool(tmp_path):
+    pool = HyperProcessPool(size=1, telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters={"log_dir": str(tmp_path)})
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def count_rows(endpoint, path, table):
+    with Connection(endpoint=endpoint, database=path) as connection:
+        return connection.execute_scalar_query(f'SELECT COUNT(*) FROM "Extract"."{table}"')
+
+
+def test_pool_generates_files_on_warm_process(hyper_pool, tmp_path, sample_df):
+    paths = [str(tmp_path / f"extract_{i}.hyper") for i in range(2)]
+
+    for path in paths:
+        HyperParquetIngestor(user_id="", hyper_file_path=path, pool=hyper_pool).generate_file(sample_df, "Test_Table")
+
+    with hyper_pool.acquire() as endpoint:
+        assert [count_rows(endpoint, path, "Test_Table") for path in paths] == [3, 3]
+    assert hyper_pool.restarts == 0
+
+
+def test_pool_restarts_dead_process(hyper_pool):
+    # Simulate a crash of the idle process
+    hyper_pool._idle.queue[0].close()
+
+    with hyper_pool.acquire() as endpoint:
+        with Connection(endpoint=endpoint) as connection:
+            assert connection.execute_scalar_query("SELECT 1") == 1
+
+    assert hyper_pool.restarts == 1
+
+
+def test_pool_must_be_started(tmp_path):
+    pool = HyperProcessPool(size=1)
+
+    with pytest.raises(RuntimeError):
+        with pool.acquire():
+            pass
+
+
+def test_arrow_write_path_matches_parquet(hyper_pool, tmp_path):
+    df = pd.DataFrame({
+        'Transaction_ID': range(10),
+        'Revenue': [float(i) * 1.5 for i in range(10)],
+        'Category': ['A', 'B', None, 'A', 'B', 'A', 'C', 'A', 'B', 'A'],
+        'Booked': pd.date_range("2024-01-01", periods=10, freq="D"),
+    })
+    df['Category'] = df['Category'].astype('string')
+
+    results = {}
+    for write_path in ("parquet", "arrow"):
+        path = str(tmp_path / f"{write_path}.hyper")
+        # Small batches so the arrow path COPYs several times
+        HyperParquetIngestor(user_id="", hyper_file_path=path, pool=hyper_pool).generate_file(df, "T", write_path=write_path, batch_rows=3)
+
+        with hyper_pool.acquire() as endpoint:
+            with Connection(endpoint=endpoint, database=path) as connection:
+                results[write_path] = connection.execute_list_query(
+                    'SELECT "Transaction_ID", "Revenue", "Category", "Booked" FROM "Extract"."T" ORDER BY "Transaction_ID"'
+                )
+
+    assert len(results["arrow"]) == 10
+    assert results["arrow"] == results["parquet"]
+
+
+def test_unknown_write_path(hyper_file_path, sample_df):
+    with pytest.raises(ValueError):
+        HyperParquetIngestor(user_id="", hyper_file_path=hyper_file_path).generate_file(sample_df, write_path="csv")
+
+
+@pytest.mark.parametrize("write_path", ["arrow", "parquet"])
+def test_stream_writer_appends_chunks(hyper_pool, tmp_path, write_path):
+    path = str(tmp_path / "stream.hyper")
+    chunks = [
+        pd.DataFrame({'Transaction_ID': range(start, start + 4), 'Category': ['A', 'B', None, 'C']})
+        for start in range(0, 12, 4)
+    ]
+    # Arrow chunks can be mixed in, they are cast to the stream schema
+    chunks.append(pa.record_batch({'Transaction_ID': pa.array([12, 13], pa.int32()), 'Category': pa.array(['D', 'E'], pa.large_string())}))
+    progress = []
+
+    ingestor = HyperParquetIngestor(user_id="", hyper_file_path=path, pool=hyper_pool)
+    count = ingestor.write_stream(iter(chunks), "Stream", write_path=write_path, batch_rows=3,
+                                  total_rows=14, on_progress=lambda done, total: progress.append((done, total)))
+
+    assert count == 14
+    assert progress == [(4, 14), (8, 14), (12, 14), (14, 14)]
+    with hyper_pool.acquire() as endpoint:
+        assert count_rows(endpoint, path, "Stream") == 14
+
+
+def test_stream_writer_rejects_mismatched_chunk(hyper_pool, tmp_path):
+    ingestor = HyperParquetIngestor(user_id="", hyper_file_path=str(tmp_path / "stream.hyper"), pool=hyper_pool)
+
+    writer = ingestor.open_stream("Stream", schema=pd.DataFrame({'A': pd.Series(dtype='int64')}))
+    temp_path = writer._temp_path
+    with pytest.raises(ValueError):
+        with writer:
+            writer.append(pd.DataFrame({'B': [1]}))
+
+    assert not os.path.exists(temp_path)
+    # The pooled process was handed back
+    with hyper_pool.acquire(timeout=1):
+        pass
+
+
+def test_stream_writer_without_schema_or_chunks(hyper_file_path):
+    with pytest.raises(ValueError):
+        HyperParquetIngestor(user_id="", hyper_file_path=hyper_file_path).write_stream([], write_path="parquet")
+
+
+def test_profile_types_columns_precisely(hyper_pool, tmp_path):
+    path = str(tmp_path / "typed.hyper")
+    df = pd.DataFrame({
+        'Booked': ['2024-01-02', '2024-03-04', None, '2024-05-06'],   # EntityResolver.resolve_date output
+        'Net_Amount': ['$1,234.50', '12.10', '7', '0.05'],
+        'Quantity': [1, 2, 3, 4],
+        'Region': ['EU', 'EU', 'US', 'EU'],
+        'Note': ['a', 'b', 'c', 'd'],
+        'Misdated': ['2024-01-01', 'soon', '2024-01-03', None],
+    }).convert_dtypes()
+    profile = {
+        'Booked': {'inferred_type': 'Datetime'},
+        'Net_Amount': {'inferred_type': 'Decimal'},
+        'Quantity': {'inferred_type': 'Integer'},
+        'Region': {'inferred_type': 'String'},
+        'Misdated': {'inferred_type': 'Datetime'},
+    }
+
+    for write_path in ("parquet", "arrow"):
+        HyperParquetIngestor(user_id="", hyper_file_path=path, pool=hyper_pool).generate_file(df, "T", write_path=write_path, profile=profile)
+
+        with hyper_pool.acquire() as endpoint:
+            with Connection(endpoint=endpoint, database=path) as connection:
+                columns = {str(c.name).strip('"'): c for c in connection.catalog.get_table_definition(TableName("Extract", "T")).columns}
+                rows = connection.execute_list_query('SELECT "Booked", "Net_Amount", "Quantity" FROM "Extract"."T"')
+
+        assert columns['Booked'].type == SqlType.date()
+        assert columns['Booked'].nullability == Nullability.NULLABLE
+        assert columns['Net_Amount'].type == SqlType.numeric(6, 2)
+        assert columns['Quantity'].type == SqlType.small_int()
+        assert columns['Quantity'].nullability == Nullability.NOT_NULLABLE
+        assert columns['Misdated'].type == SqlType.text()
+        assert [r[1] for r in rows] == [Decimal('1234.50'), Decimal('12.10'), Decimal('7'), Decimal('0.05')]
+        assert rows[0][0].year == 2024
+
+
+def test_schema_planner_dictionary_columns():
+    df = pd.DataFrame({'Region': ['EU', 'US'] * 50, 'Invoice': [f"INV-{i}" for i in range(100)]})
+    planner = HyperSchemaPlanner({})
+    planner.plan(df)
+
+    assert planner.dictionary_columns == ['Region']
+
+
+@pytest.fixture
+def tableau(tmp_path):
+    servers = []
+
+    def factory(server_url):
+        servers.append(FakeTableauServer(server_url))
+        return servers[-1]
+
+    hyper_path = tmp_path / "extract.hyper"
+    hyper_path.write_bytes(b"A" * 10 + b"B" * 10 + b"C" * 5)
+
+    def publisher(**kwargs):
+        pub = TableauCloudPublisher("", "https://tableau.test", "site", "token", "token-name",
+                                    sessions=sessions, projects=projects, poll_interval=0, **kwargs)
+        pub.chunk_size = 10
+        return pub
+
+    sessions = TableauSessionCache(server_factory=factory)
+    projects = ProjectResolver(ttl=600)
+    yield servers, sessions, publisher, str(hyper_path)
+    sessions.close()
+
+
+def test_publisher_reuses_signed_in_session(tableau):
+    servers, sessions, publisher, path = tableau
+
+    publisher().publish(path, "Mini_Project", "DS")
+    publisher().publish(path, "Mini_Project", "DS")
+
+    assert sessions.sign_ins == 1
+    assert servers[0].certified == [True, True]
+    assert "asJob=true" in servers[0].publish_url and "uploadSessionId=upload-1" in servers[0].publish_url
+
+
+def test_publisher_signs_in_again_when_session_expires(tableau):
+    servers, sessions, publisher, path = tableau
+    publisher().publish(path, "Mini_Project", "DS")
+
+    servers[0].expire_next.append(TSC.NotSignedInError("session expired"))
+    published = publisher().publish(path, "Mini_Project", "DS")
+
+    assert published.id == "ds-1"
+    assert sessions.sign_ins == 2
+    assert servers[0].sign_outs == 1
+
+
+def test_publisher_resumes_failed_chunk(tableau, monkeypatch):
+    servers, sessions, publisher, path = tableau
+    monkeypatch.setattr("ExecutionEngine.PublishTableau.time.sleep", lambda seconds: None)
+
+    pub = publisher()
+    server = sessions.get(pub.session_key, pub.auth)
+    server.fail_appends.append(ConnectionError("connection reset"))
+    pub.publish(path, "Mini_Project", "DS")
+
+    # Three chunks plus one retry, one upload session, no chunk sent twice
+    assert server.calls.count("fileuploads.initiate") == 1
+    assert server.calls.count("fileuploads.append") == 4
+    assert server.uploaded == b"A" * 10 + b"B" * 10 + b"C" * 5
+
+
+def test_publisher_gives_up_after_chunk_retries(tableau, monkeypatch):
+    servers, sessions, publisher, path = tableau
+    monkeypatch.setattr("ExecutionEngine.PublishTableau.time.sleep", lambda seconds: None)
+
+    pub = publisher(chunk_retries=2)
+    server = sessions.get(pub.session_key, pub.auth)
+    server.fail_appends.extend([ConnectionError("down"), ConnectionError("down")])
+
+    with pytest.raises(ConnectionError):
+        pub.publish(path, "Mini_Project", "DS")
+    assert "datasources.publish" not in server.calls
+
+
+@pytest.mark.asyncio
+async def test_apublish_polls_job(tableau):
+    servers, sessions, publisher, path = tableau
+
+    pub = publisher()
+    server = sessions.get(pub.session_key, pub.auth)
+    server.job_polls = 2
+
+    published = await pub.apublish(path, "Mini_Project", "DS")
+
+    assert published.id == "ds-1"
+    assert server.calls.count("jobs.get_by_id") == 3
+    assert server.certified == [True]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("finish_code, error", [(1, JobFailedException), (2, JobCancelledException)])
+async def test_publish_raises_when_the_job_does_not_succeed(tableau, finish_code, error):
+    servers, sessions, publisher, path = tableau
+
+    pub = publisher()
+    server = sessions.get(pub.session_key, pub.auth)
+    server.finish_code = finish_code
+
+    with pytest.raises(error) as raised:
+        await pub.apublish(path, "Mini_Project", "DS")
+    assert type(raised.value) is error
+    with pytest.raises(error) as raised:
+        pub.publish(path, "Mini_Project", "DS")
+    assert type(raised.value) is error
+    assert server.certified == []
+
+
+def test_project_ids_are_cached(tableau):
+    servers, sessions, publisher, path = tableau
+
+    publisher().publish(path, "Mini_Project", "DS")
+    publisher().publish(path, "Mini_Project", "DS")
+
+    # One filtered lookup for both publishes
+    assert servers[0].calls.count("projects.get") == 1
+
+
+def test_project_created_once_and_creation_race(tableau):
+    servers, sessions, publisher, path = tableau
+    pub = publisher()
+    server = sessions.get(pub.session_key, pub.auth)
+
+    pub.publish(path, "New_Project", "DS")
+    assert server.calls.count("projects.create") == 1
+
+    # Another worker creates the project between our lookup and create
+    server.race_next = True
+    pub.publish(path, "Raced_Project", "DS")
+
+    raced = [p for p in server._projects if p.name == "Raced_Project"]
+    assert len(raced) == 1
+    assert server.calls.count("projects.get") == 3
+
+
+def test_publisher_append_and_upsert_modes(tableau):
+    servers, sessions, publisher, path = tableau
+    pub = publisher()
+
+    # Deltas need the full datasource first, nothing is uploaded before that is checked
+    with pytest.raises(LookupError):
+        pub.publish(path, "Mini_Project", "DS", mode="append")
+    server = servers[0]
+    assert "fileuploads.initiate" not in server.calls
+
+    pub.publish(path, "Mini_Project", "DS")
+    pub.publish(path, "Mini_Project", "DS", mode="append")
+    assert "append=true" in server.publish_url
+
+    pub.publish(path, "Mini_Project", "DS", mode="upsert", key_column="Transaction_ID", table_name="Integration_Table")
+    url, body, parameters = server.update_request
+    assert url.endswith("/ds-1/data?uploadSessionId=upload-1")
+    assert body["actions"][0]["action"] == "upsert"
+    assert body["actions"][0]["condition"] == {"op": "eq", "target-col": "Transaction_ID", "source-col": "Transaction_ID"}
+    assert body["actions"][0]["target-table"] == "Integration_Table"
+    assert parameters["headers"]["requestid"] == "upsert-upload-1"
+
+
+def test_delta_file_matches_published_schema(hyper_pool, tmp_path):
+    state = IncrementalState("user", "extract", state_dir=str(tmp_path / "state"))
+    planner = DeltaPlanner(profile={'Transaction_ID': {'is_likely_id': True, 'inferred_type': 'Integer'}})
+    path = str(tmp_path / "delta.hyper")
+    ingestor = HyperParquetIngestor(user_id="", hyper_file_path=path, pool=hyper_pool)
+    profile = {'Transaction_ID': {'inferred_type': 'Integer'}}
+
+    day_one = pd.DataFrame({'Transaction_ID': [1, 2, 3], 'Revenue': [10.5, 20.0, 30.25]})
+    plan = ingestor.generate_delta_file(day_one, planner, state, "T", profile=profile)
+    assert plan.mode == "overwrite" and plan.rows == 3
+    plan.commit()
+    published_schema = plan.schema
+
+    # Row 2 changed, row 4 is new
+    day_two = pd.DataFrame({'Transaction_ID': [1, 2, 3, 4], 'Revenue': [10.5, 21.0, 30.25, 40.0]})
+    plan = ingestor.generate_delta_file(day_two, planner, state, "T", profile=profile)
+    assert plan.mode == "upsert" and plan.column == "Transaction_ID"
+    assert plan.frame['Transaction_ID'].tolist() == [2, 4]
+
+    with hyper_pool.acquire() as endpoint:
+        with Connection(endpoint=endpoint, database=path) as connection:
+            assert connection.execute_list_query('SELECT "Transaction_ID" FROM "Extract"."T" ORDER BY 1') == [[2], [4]]
+            columns = connection.catalog.get_table_definition(TableName("Extract", "T")).columns
+    assert [c.type for c in columns] == [SqlType.small_int(), SqlType.numeric(4, 2)]
+    assert plan.schema.equals(published_schema)
+
+    # A key that outgrows the published SMALLINT rebuilds the extract in full
+    plan.commit()
+    day_three = pd.concat([day_two, pd.DataFrame({'Transaction_ID': [70_000], 'Revenue': [1.0]})], ignore_index=True)
+    plan = ingestor.generate_delta_file(day_three, planner, state, "T", profile=profile)
+    assert plan.mode == "overwrite" and plan.rows == 5
+
+    # So does a null in a column published as NOT NULL
+    plan.commit()
+    day_four = pd.concat([day_three, pd.DataFrame({'Transaction_ID': [5], 'Revenue': [float('nan')]})], ignore_index=True)
+    plan = ingestor.generate_delta_file(day_four, planner, state, "T", profile=profile)
+    assert plan.mode == "overwrite" and plan.rows == 6
+    assert plan.schema.field("Revenue").nullable
+
+
+@pytest.mark.asyncio
+async def test_fan_out_publish_limits_each_site(tmp_path):
+    servers = {}
+
+    def factory(server_url):
+        server = FakeTableauServer(server_url)
+        server.append_delay = 0.05
+        if "down" in server_url:
+            server.fail_appends.append(ConnectionError("site unreachable"))
+        servers[server_url] = server
+        return server
+
+    hyper_path = tmp_path / "extract.hyper"
+    hyper_path.write_bytes(b"A" * 30)
+    sessions = TableauSessionCache(server_factory=factory)
+
+    site = {"server_url": "https://one.test", "site_name": "a", "token": "t", "token_name": "n", "project_name": "Mini_Project"}
+    targets = [
+        {**site, "datasource_name": "DS_1"},
+        {**site, "datasource_name": "DS_2"},
+        {**site, "server_url": "https://two.test", "datasource_name": "DS_3"},
+        {**site, "server_url": "https://down.test", "datasource_name": "DS_4"},
+    ]
+
+    fan_out = MultiTargetPublisher("", max_concurrency=4, per_site_concurrency=1, sessions=sessions,
+                                   projects=ProjectResolver(), chunk_retries=1, poll_interval=0, chunk_mb=1)
+    results = await fan_out.publish(str(hyper_path), targets)
+    sessions.close()
+
+    assert [r["status"] for r in results] == ["published", "published", "published", "failed"]
+    assert [r["datasource_name"] for r in results] == ["DS_1", "DS_2", "DS_3", "DS_4"]
+    assert "site unreachable" in results[3]["error"]
+    assert all(r["seconds"] >= 0.05 for r in results[:3])
+    # Both DS_1 and DS_2 go to site one, they were uploaded one after the other
+    assert servers["https://one.test"].max_active_appends == 1
+    assert servers["https://one.test"].uploaded == b"A" * 60
+
+
+def test_generate_tables_writes_one_file(hyper_pool, tmp_path, sample_df):
+    path = str(tmp_path / "multi.hyper")
+    ingestor = HyperParquetIngestor(user_id="", hyper_file_path=path, pool=hyper_pool)
+    orders = pd.DataFrame({"Order": [1, 2], "Region": ["North", None]})
+
+    schemas = ingestor.generate_tables({"Customers": (sample_df, None), "Orders": (orders, {})})
+    assert list(schemas) == ["Customers", "Orders"]
+
+    # Adding a table with a name already in the file replaces only that table
+    ingestor.generate_file(orders.head(1), "Orders", replace_file=False)
+
+    with hyper_pool.acquire() as endpoint:
+        assert count_rows(endpoint, path, "Customers") == 3
+        assert count_rows(endpoint, path, "Orders") == 1
+
+    # A new job starts a fresh file
+    ingestor.generate_tables({"Orders": (orders, None)})
+    with hyper_pool.acquire() as endpoint:
+        with Connection(endpoint=endpoint, database=path) as connection:
+            assert [name.name.unescaped for name in connection.catalog.get_table_names("Extract")] == ["Orders"]
+
+
+def test_sessions_are_not_shared_between_tokens_with_the_same_name(tableau):
+    servers, sessions, publisher, path = tableau
+
+    publisher().publish(path, "Mini_Project", "DS")
+    other = TableauCloudPublisher("", "https://tableau.test", "site", "other-secret", "token-name",
+                                  sessions=sessions, projects=ProjectResolver(ttl=600), poll_interval=0)
+    other.chunk_size = 10
+    other.publish(path, "Mini_Project", "DS")
+
+    assert sessions.sign_ins == 2
+    assert "other-secret" not in other.session_key
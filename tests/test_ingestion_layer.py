@@ -46,4 +46,123 @@
 #     return True
 
 # def test_run_ingestion_test():
-#     assert asyncio.run(run_ingestion_test()) == True
\ No newline at end of file
+#     assert asyncio.run(run_ingestion_test()) == True
+
+import json
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+import IngestionLayer.BridgeIngestor as bridge
+from IngestionLayer.BridgeIngestor import BridgeIngestor
+from IngestionLayer.MetadataScanner import MetadataScanner
+from IngestionLayer.TableStats import TableStats, json_records, replace_columns, to_nullable
+
+
+def test_ingest_keeps_real_nulls_in_nullable_dtypes():
+    csv = "Id,Amount,Status\n1,10.5,Open\n2,,null\n3,7,\n"
+
+    df, event_data, stats = BridgeIngestor("").ingest(csv)
+
+    assert str(df["Id"].dtype) == "Int64"
+    assert str(df["Amount"].dtype) == "Float64"
+    assert df["Status"].dtype == pd.StringDtype("pyarrow")
+    assert df["Amount"].isna().tolist() == [False, True, False]
+    assert df["Status"].isna().tolist() == [False, True, True]
+    assert stats.null_counts.to_dict() == {"Id": 0, "Amount": 1, "Status": 2}
+    assert stats.unique_counts.to_dict() == {"Id": 3, "Amount": 2, "Status": 1}
+
+    # Placeholders only appear in the SSE payload
+    assert event_data["table"][1] == {"Id": 2, "Amount": 0, "Status": "null"}
+    json.dumps(event_data)
+
+
+def test_json_records_without_sentinels():
+    df = to_nullable(pd.DataFrame({"Amount": [1.5, None], "Status": ["Open", "null"], "Flag": [True, None]}))
+
+    assert json_records(df, text_null="Null") == [
+        {"Amount": 1.5, "Status": "Open", "Flag": True},
+        {"Amount": 0, "Status": "Null", "Flag": None},
+    ]
+    assert json_records(df, sentinels=False)[1] == {"Amount": None, "Status": None, "Flag": None}
+
+
+def test_scanner_uses_table_stats():
+    df = pd.DataFrame({"Id": [1, 2, 3, 4], "City": ["Paris", None, "Rome", "Paris"]})
+    stats = TableStats(df)
+    df = to_nullable(df, stats.null_mask)
+
+    profile, _ = MetadataScanner("").scan(df, stats)
+
+    assert profile["Id"]["is_likely_id"]
+    assert profile["Id"]["inferred_type"] == "Integer"
+    assert profile["City"]["completeness"] == 75.0
+    assert profile["City"]["uniqueness"] == 50.0
+    assert not profile["City"]["is_likely_id"]
+
+
+def test_rename_and_update_follow_the_pipeline():
+    df = pd.DataFrame({"raw_date": ["01/02/2024", "null", "03/02/2024"], "name": ["a", "b", "b"]})
+    stats = TableStats(df)
+
+    stats.rename({"raw_date": "Order Date", "name": "Customer"})
+    updated = pd.DataFrame({"Order Date": ["2024-02-01", np.nan, np.nan], "Customer": df["name"]})
+    stats.update(updated, ["Order Date"])
+
+    assert stats.null_counts.to_dict() == {"Order Date": 2, "Customer": 0}
+    assert stats.column("Customer")["unique_count"] == 2
+    assert not stats.is_unique("Customer")
+
+
+def test_replace_columns_shares_untouched_columns():
+    df = to_nullable(pd.DataFrame({"amt": [1.5, 2.5, None], "city": ["ibm", "I.B.M.", "sap"], "id": [1, 2, 3]}))
+    stats = TableStats(df)
+    profile = {"amt": {"inferred_type": "Decimal"}, "city": {"inferred_type": "String"}, "id": {"inferred_type": "Integer"}}
+
+    with pd.option_context("mode.copy_on_write", True):
+        updated, new_profile = replace_columns(
+            df, {"amt": "Amount", "city": "Vendor", "id": "id"},
+            {"Vendor": pd.Series(["IBM", "IBM", None], dtype=object)}, stats=stats, profile=profile,
+        )
+
+        assert np.shares_memory(updated["Amount"].array._data, df["amt"].array._data)
+
+    assert list(updated.columns) == ["Amount", "Vendor", "id"]
+    assert updated["Vendor"].dtype == pd.StringDtype("pyarrow")
+    assert updated["Vendor"].isna().tolist() == [False, False, True]
+    assert list(new_profile) == ["Amount", "Vendor", "id"]
+    assert list(profile) == ["amt", "city", "id"]
+    assert list(df.columns) == ["amt", "city", "id"]
+    assert stats.null_counts.to_dict() == {"Amount": 1, "Vendor": 1, "id": 0}
+    assert stats.column("Vendor")["unique_count"] == 1
+
+
+def test_ingest_tables_single_source_keeps_its_name():
+    tables = BridgeIngestor("").ingest_tables("Id,City\n1,Paris\n", dataType="csv", name="customers.csv")
+
+    assert len(tables) == 1
+    name, df, event_data, stats = tables[0]
+    assert name == "customers.csv"
+    assert df["City"].tolist() == ["Paris"]
+    assert stats.total_rows == 1
+
+
+def test_ingest_tables_reads_every_sql_table_through_one_engine(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'source.db'}"
+    engine = create_engine(url)
+    pd.DataFrame({"id": [1, 2]}).to_sql("orders", engine, index=False)
+    pd.DataFrame({"id": [3]}).to_sql("customers", engine, index=False)
+    engine.dispose()
+
+    engines = []
+    monkeypatch.setattr(bridge, "create_engine", lambda url: engines.append(create_engine(url)) or engines[-1])
+    # SQLite has no information_schema, answer the table listing directly
+    read_sql = pd.read_sql
+    monkeypatch.setattr(pd, "read_sql", lambda query, engine: pd.DataFrame({"table_schema": ["main"] * 2, "table_name": ["orders", "customers"]})
+                        if "information_schema" in query else read_sql(query, engine))
+
+    tables = BridgeIngestor("").ingest_tables(url, limit=10, user_table_name="orders, customers, missing", dataType="string")
+
+    assert [(name, len(df)) for name, df, _, _ in tables] == [("orders", 2), ("customers", 1)]
+    assert len(engines) == 1
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+from job_scheduler import JobScheduler, QueueFullError
+
+
+class Recorder:
+    """
+    Runner + publish stand-ins: jobs block until released, events are collected per user
+    """
+
+    def __init__(self):
+        self.started = []
+        self.active = 0
+        self.max_active = 0
+        self.events = []
+        self.gates = {}
+
+    async def run(self, payload, user_id):
+        self.started.append(payload["name"])
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await self.gates.setdefault(payload["name"], asyncio.Event()).wait()
+            if payload.get("fail"):
+                raise ValueError("bad payload")
+        finally:
+            self.active -= 1
+
+    def release(self, name):
+        self.gates.setdefault(name, asyncio.Event()).set()
+
+    async def publish(self, user_id, event_type, data):
+        self.events.append((user_id, event_type, json.loads(data) if event_type == "queue" else data))
+
+    def last_queue_event(self, user_id):
+        return next(data for user, event_type, data in reversed(self.events) if user == user_id and event_type == "queue")
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_workers_bound_concurrency_and_users_take_turns():
+    recorder = Recorder()
+    scheduler = JobScheduler(workers=2, max_queued=10, max_queued_per_user=5, publish=recorder.publish)
+    await scheduler.start(recorder.run)
+
+    # "a" floods the queue before "b" and "c" submit one job each
+    jobs = [await scheduler.submit("a", {"name": f"a{i}"}) for i in range(4)]
+    jobs += [await scheduler.submit("b", {"name": "b0"}), await scheduler.submit("c", {"name": "c0"})]
+    await settle()
+
+    # One job per user at a time: only a0 runs, b0 took the second worker
+    assert recorder.started == ["a0", "b0"]
+    assert scheduler.positions() == {jobs[5].job_id: 1, jobs[1].job_id: 2, jobs[2].job_id: 3, jobs[3].job_id: 4}
+    assert recorder.last_queue_event("c") == {"job_id": jobs[5].job_id, "status": "queued", "position": 1, "queued": 4, "running": 2}
+
+    for name in ["a0", "b0", "c0", "a1", "a2", "a3"]:
+        recorder.release(name)
+        await settle()
+
+    await asyncio.gather(*[job.done.wait() for job in jobs])
+    assert recorder.started == ["a0", "b0", "c0", "a1", "a2", "a3"]
+    assert recorder.max_active == 2
+    assert all(job.status == "done" for job in jobs)
+    assert recorder.last_queue_event("a")["status"] == "running"
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_refused():
+    recorder = Recorder()
+    scheduler = JobScheduler(workers=1, max_queued=2, max_queued_per_user=1, publish=recorder.publish)
+    await scheduler.start(recorder.run)
+
+    await scheduler.submit("a", {"name": "a0"})
+    await settle()
+    await scheduler.submit("a", {"name": "a1"})
+
+    # The user's share is used up, then the whole queue
+    with pytest.raises(QueueFullError):
+        await scheduler.submit("a", {"name": "a2"})
+    await scheduler.submit("b", {"name": "b0"})
+    with pytest.raises(QueueFullError) as error:
+        await scheduler.submit("c", {"name": "c0"})
+
+    assert error.value.retry_after > 0
+    assert await scheduler.snapshot() == {"workers": 1, "running": 1, "queued": 2, "max_queued": 2, "users_waiting": 2}
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_and_failed_jobs():
+    recorder = Recorder()
+    scheduler = JobScheduler(workers=1, max_queued=5, publish=recorder.publish)
+    await scheduler.start(recorder.run)
+
+    running = await scheduler.submit("a", {"name": "a0", "fail": True})
+    waiting = await scheduler.submit("b", {"name": "b0"})
+    await settle()
+
+    # A disconnected user's job never starts, a running job can't be cancelled
+    assert await scheduler.cancel(waiting)
+    assert not await scheduler.cancel(running)
+    assert waiting.status == "cancelled"
+
+    recorder.release("a0")
+    await running.done.wait()
+
+    assert running.status == "failed"
+    assert ("a", "error", "bad payload") in recorder.events
+    assert recorder.started == ["a0"]
+    await scheduler.stop()
@@ -0,0 +1,127 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+from tableauhyperapi import Connection, HyperProcess, Telemetry, TableName
+
+from ExecutionEngine.HyperAPI import HyperParquetIngestor
+from ExecutionEngine.HyperPool import HyperProcessPool
+from IngestionLayer.TableStats import TableStats, to_nullable
+from SemanticCore.EntityResolver import EntityResolver
+from process_offload import ProcessOffloader, SharedFrame
+
+
+@pytest.fixture(scope="module")
+def offloader():
+    offloader = ProcessOffloader(workers=1)
+    offloader.start()
+    yield offloader
+    offloader.shutdown()
+
+
+@pytest.fixture
+def sample_df():
+    return to_nullable(pd.DataFrame({
+        "Transaction_ID": [1, 2, 3, 4],
+        "Revenue": [100.5, None, 300.25, 12.0],
+        "Category": ["A", "B", None, "A"],
+        "Date": ["2024-01-05", "05/02/2024", "March 3 2024", None],
+    }))
+
+
+def without_ids(logs):
+    return [{key: value for key, value in log.items() if key != "id"} for log in logs]
+
+
+def test_shared_frame_roundtrip(sample_df):
+    frame = SharedFrame.put(sample_df)
+    try:
+        loaded = frame.load()
+    finally:
+        frame.unlink()
+    pd.testing.assert_frame_equal(loaded, sample_df)
+
+    series = SharedFrame.put(sample_df["Category"])
+    try:
+        pd.testing.assert_series_equal(series.load(), sample_df["Category"])
+    finally:
+        series.unlink()
+
+
+@pytest.mark.asyncio
+async def test_offloaded_stages_match_threads(offloader, sample_df):
+    threads = ProcessOffloader(workers=0)
+    stats = TableStats(sample_df)
+
+    profile, _ = await offloader.scan("user", sample_df, stats)
+    expected_profile, _ = await threads.scan("user", sample_df, stats)
+    assert profile == expected_profile
+
+    resolver, expected_resolver = EntityResolver("user"), EntityResolver("user")
+    dates = await offloader.resolve_date(resolver, sample_df["Date"], column="Date")
+    expected_dates = await threads.resolve_date(expected_resolver, sample_df["Date"], column="Date")
+    # Nulls of the resolved object column come back as None rather than NaN
+    pd.testing.assert_series_equal(dates.astype("string"), expected_dates.astype("string"))
+    assert without_ids(resolver.get_logs()) == without_ids(expected_resolver.get_logs())
+
+    ontology = {"required_fields": [["Revenue", 2], ["Category", 1]]}
+    logs, expected_logs = list(resolver.get_logs()), list(expected_resolver.get_logs())
+    report, metadata, logs = await offloader.score("user", ontology, sample_df, profile, logs, stats)
+    expected_report, expected_metadata, expected_logs = await threads.score("user", ontology, sample_df, profile, expected_logs, stats)
+    assert metadata == expected_metadata
+    assert report == expected_report
+    assert without_ids(logs) == without_ids(expected_logs)
+
+
+@pytest.mark.asyncio
+async def test_worker_writes_through_pooled_hyper(offloader, sample_df, tmp_path):
+    pool = HyperProcessPool(size=1, telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters={"log_dir": str(tmp_path)})
+    pool.start()
+    try:
+        path = str(tmp_path / "offloaded.hyper")
+        ingestor = HyperParquetIngestor("user", path, pool=pool)
+        await offloader.generate_tables(ingestor, {"Sales": (sample_df, None), "Costs": (sample_df.head(2), None)})
+    finally:
+        pool.shutdown()
+
+    with HyperProcess(telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters={"log_dir": str(tmp_path)}) as hyper:
+        with Connection(hyper.endpoint, path) as connection:
+            counts = {
+                name: connection.execute_scalar_query(f"SELECT COUNT(*) FROM {TableName('Extract', name)}")
+                for name in ["Sales", "Costs"]
+            }
+    assert counts == {"Sales": 4, "Costs": 2}
+
+
+@pytest.mark.asyncio
+async def test_segments_are_removed_when_the_worker_fails(offloader, monkeypatch):
+    created = []
+    put = SharedFrame.put.__func__
+    monkeypatch.setattr(SharedFrame, "put", classmethod(lambda cls, data: created.append(put(cls, data)) or created[-1]))
+
+    # Scoring without a profile entry for the column fails inside the worker
+    with pytest.raises(KeyError):
+        await offloader.score("user", {"required_fields": []}, pd.DataFrame({"x": [1]}), {}, [])
+
+    with pytest.raises(FileNotFoundError):
+        created[0].load()
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_restarted_once_and_callers_wait(sample_df):
+    offloader = ProcessOffloader(workers=1)
+    offloader.start()
+    try:
+        # A worker dying takes down the pool, every call running on it fails
+        calls = [offloader._run(os._exit, 1), offloader._run(os._exit, 1)]
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        assert all(isinstance(result, BrokenProcessPool) for result in results)
+        assert offloader.restarts == 1
+
+        # The next call runs on the new pool, not on a thread
+        profile, _ = await offloader.scan("user", sample_df, TableStats(sample_df))
+        assert offloader.enabled and set(profile) == set(sample_df.columns)
+    finally:
+        offloader.shutdown()
@@ -81,4 +81,127 @@
 #     # Shows we only paid for 6 resolutions, not 10
 #     print(resolver.resolution_cache)
 
-#     assert True
\ No newline at end of file
+#     assert True
+
+import json
+import pytest
+import pandas as pd
+
+import agent
+from agent import AsyncSalesforceAgentClient, AgentResponseCache, AgentUnavailableError
+from SemanticCore.EntityResolver import EntityResolver, find_outlier_headers
+from SemanticCore.IntentDecoder import IntentDecoder
+from .utils import AgentStubServer
+
+
+@pytest.mark.asyncio
+async def test_entity_resolver_aresolve(monkeypatch):
+    with AgentStubServer() as stub:
+        stub.reply = lambda prompt: json.dumps({"IBM": ["ibm intl", "I.B.M."]})
+        monkeypatch.setattr(agent, "AGENT_API_URL", stub.api_url)
+        monkeypatch.setattr(agent, "async_agent_client", AsyncSalesforceAgentClient("key", "secret", stub.base_url))
+        monkeypatch.setattr(agent, "response_cache", AgentResponseCache())
+
+        resolver = EntityResolver(user_id="")
+        series = pd.Series(["ibm intl", "IBM", "I.B.M.", "aws", None])
+
+        resolved = await resolver.aresolve(series, "Vendor")
+
+        assert resolved.tolist()[:4] == ["IBM", "IBM", "IBM", "aws"]
+        assert resolver.get_logs()[0]["column"] == "Vendor"
+
+        # Known values are served from the resolution cache
+        await resolver.aresolve(pd.Series(["ibm intl", "I.B.M."]), "Vendor")
+        assert stub.count("POST", "/messages") == 1
+
+        await agent.async_agent_client.aclose()
+
+
+def test_intent_decoder_falls_back_when_agent_unavailable(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise AgentUnavailableError("down", status_code=503)
+
+    monkeypatch.setattr("SemanticCore.IntentDecoder.call_salesforce_agent", unavailable)
+
+    profile = {col: {"inferred_type": "String"} for col in ["Employee_ID", "Job_Title", "Department", "Hire_Date"]}
+    ontology, event_data = IntentDecoder(user_id="").decode_intent(metadata_profile=profile)
+
+    assert ontology["required_fields"][0][0] == "Employee_ID"
+
+
+def test_entity_resolver_keeps_values_when_agent_unavailable(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise AgentUnavailableError("down", status_code=503)
+
+    monkeypatch.setattr("SemanticCore.EntityResolver.call_salesforce_agent", unavailable)
+
+    resolver = EntityResolver(user_id="")
+    series = pd.Series(["ibm intl", "IBM"])
+
+    assert resolver.resolve(series, "Vendor").tolist() == ["ibm intl", "IBM"]
+    assert resolver.get_logs()[0]["type"] == "Entity Resolution Skipped"
+
+
+def relevance(scores):
+    return {col: {"similarity": sim, "centroid_similarity": centroid} for col, (sim, centroid) in scores.items()}
+
+
+def test_find_outlier_headers_flags_off_topic_column():
+    scores = relevance({
+        "Net_Amount": (0.92, 0.55),
+        "Invoice_Date": (0.71, 0.48),
+        "Vendor": (0.64, 0.45),
+        "Cost_Centre": (0.88, 0.50),
+        "Region": (0.42, 0.40),
+        "Shoe_size": (0.18, 0.05),
+    })
+
+    assert find_outlier_headers(scores) == ["Shoe_size"]
+
+
+def test_find_outlier_headers_never_flags_mapped_columns():
+    scores = relevance({"Net_Amount": (0.92, 0.55), "Gross_Amount": (0.90, 0.10), "Tax": (0.60, 0.50)})
+
+    assert find_outlier_headers(scores) == []
+
+
+def test_resolve_headers_is_local_by_default(monkeypatch):
+    def agent_called(*args, **kwargs):
+        raise AssertionError("agent should not be called")
+
+    monkeypatch.setattr("SemanticCore.EntityResolver.call_salesforce_agent", agent_called)
+    monkeypatch.delenv("HEADER_AGENT_SECOND_OPINION", raising=False)
+
+    resolver = EntityResolver(user_id="")
+    df = pd.DataFrame({"Net_Amount": [1], "Vendor": ["a"], "Mood": ["happy"]})
+    resolver.resolve_headers(df, header_relevance=relevance({
+        "Net_Amount": (0.92, 0.55), "Vendor": (0.64, 0.45), "Mood": (0.10, 0.02)
+    }))
+
+    assert [log["column"] for log in resolver.get_logs()] == ["Mood"]
+
+
+def test_resolve_headers_follows_the_mapper_threshold(monkeypatch):
+    monkeypatch.delenv("HEADER_AGENT_SECOND_OPINION", raising=False)
+
+    resolver = EntityResolver(user_id="")
+    df = pd.DataFrame({"Net_Amount": [1], "Vendor": ["a"], "Mood": ["happy"]})
+    # A mapper this lenient maps "Mood" to a field, so it isn't off-topic
+    resolver.resolve_headers(df, header_relevance=relevance({
+        "Net_Amount": (0.92, 0.55), "Vendor": (0.64, 0.45), "Mood": (0.10, 0.02)
+    }), similarity_threshold=0.1)
+
+    assert resolver.get_logs() == []
+
+
+def test_resolve_headers_agent_second_opinion(monkeypatch):
+    monkeypatch.setattr("SemanticCore.EntityResolver.call_salesforce_agent", lambda **kwargs: '["Mood", "Vendor"]')
+
+    resolver = EntityResolver(user_id="")
+    df = pd.DataFrame({"Net_Amount": [1], "Vendor": ["a"], "Mood": ["happy"]})
+    resolver.resolve_headers(df, header_relevance=relevance({
+        "Net_Amount": (0.92, 0.55), "Vendor": (0.64, 0.45), "Mood": (0.10, 0.02)
+    }), use_agent=True)
+
+    statuses = {log["column"]: log["status"] for log in resolver.get_logs()}
+    assert statuses == {"Mood": "critical", "Vendor": "warning"}
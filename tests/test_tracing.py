@@ -0,0 +1,74 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from tracing import NOOP_SPAN, Tracer
+
+
+def work(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks_and_threads(tmp_path):
+    tracer = Tracer(enabled=True, export_dir=str(tmp_path))
+
+    with tracer.trace("pipeline", user_id="u1") as trace:
+        async def table(name):
+            async with tracer.span("decode", table=name):
+                await asyncio.sleep(0.01)
+            await asyncio.to_thread(tracer.span("score", table=name, rows=10).call, work, 0.01)
+
+        await asyncio.gather(table("a"), table("b"))
+
+    spans = {(span.name, span.attributes.get("table")): span for span in trace.spans}
+    root = spans[("pipeline", None)]
+    assert root.parent_id is None
+    for name in ("a", "b"):
+        assert spans[("decode", name)].parent_id == root.span_id
+        assert spans[("score", name)].parent_id == root.span_id
+        assert spans[("score", name)].wall_seconds >= 0.01
+
+    summary = trace.summary()
+    assert [stage["name"] for stage in summary["stages"]] == ["pipeline", "decode", "score"]
+    score = summary["stages"][2]
+    assert score["count"] == 2 and score["rows"] == 20
+    assert summary["total_seconds"] == round(root.wall_seconds, 3)
+
+    exported = json.loads((tmp_path / f"{trace.trace_id}.json").read_text())
+    otel_spans = exported["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(otel_spans) == 5
+    assert {span["traceId"] for span in otel_spans} == {trace.trace_id}
+    score_span = next(span for span in otel_spans if span["name"] == "score")
+    assert score_span["parentSpanId"] == root.span_id
+    assert {"key": "rows", "value": {"intValue": "10"}} in score_span["attributes"]
+    assert int(score_span["endTimeUnixNano"]) > int(score_span["startTimeUnixNano"])
+
+
+def test_failed_span_is_recorded_with_error():
+    tracer = Tracer(enabled=True, export_dir=None)
+
+    with tracer.trace("pipeline") as trace:
+        with pytest.raises(ValueError):
+            with tracer.span("publish"):
+                raise ValueError("no project")
+
+    publish = next(span for span in trace.spans if span.name == "publish")
+    assert publish.to_otel()["status"] == {"code": 2, "message": "ValueError: no project"}
+    assert trace.summary()["stages"][1]["errors"] == 1
+
+
+def test_disabled_tracer_is_a_no_op():
+    tracer = Tracer(enabled=False)
+
+    with tracer.trace("pipeline") as trace:
+        span = tracer.span("score", rows=1)
+        assert span is NOOP_SPAN
+        assert span.call(work, 0) == 0
+
+    assert trace is None
+    # Spans outside a trace are no-ops too
+    assert Tracer(enabled=True).span("score") is NOOP_SPAN
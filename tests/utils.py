@@ -1,5 +1,9 @@
-
 import os
+import re
+import json
+import time
+import datetime
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -35,4 +39,236 @@ def build_test_payload(type, file_name="", connection_string="", table_name="",
     payload["site_name"] = os.getenv("TB_SITE_NAME") or ""
 
     return payload
-    
\ No newline at end of file
+    
+
+class AgentStubServer:
+    """
+    Minimal local stand-in for the Salesforce OAuth + Agent API endpoints.
+    Replies echo the prompt so tests can check what was sent.
+
+    Usage:
+        with AgentStubServer() as stub:
+            monkeypatch.setattr(agent, "AGENT_API_URL", stub.api_url)
+    """
+
+    def __init__(self):
+        self.requests = []          # [(method, path)]
+        self.connections = set()    # client (host, port) pairs, one per TCP connection
+        self.sequence_ids = []
+        self.message_status = 200   # status returned by the next message requests
+        self.message_failures = []  # statuses returned once each by the next message requests, before message_status
+        self.message_delay = 0      # seconds every message request takes before it is answered
+        self.reply = None           # optional callable(prompt) -> reply text, defaults to an echo
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}/einstein/ai-agent/v1"
+
+    def count(self, method, suffix):
+        return len([1 for m, path in self.requests if m == method and path.endswith(suffix)])
+
+    def __enter__(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def do_POST(self):
+                stub.requests.append(("POST", self.path))
+                stub.connections.add(self.client_address)
+                raw = self._body()
+
+                if self.path.endswith("/services/oauth2/token"):
+                    self._reply(200, {"access_token": "stub-token", "instance_url": stub.base_url})
+                elif self.path.endswith("/sessions"):
+                    self._reply(200, {"sessionId": f"session-{len(stub.requests)}"})
+                elif self.path.endswith("/messages"):
+                    time.sleep(stub.message_delay)
+                    if stub.message_failures:
+                        self._reply(stub.message_failures.pop(0), {"error": "stub", "message": "stub failure"})
+                        return
+                    if stub.message_status != 200:
+                        self._reply(stub.message_status, {"error": "stub", "message": "stub failure"})
+                        return
+                    message = json.loads(raw)["message"]
+                    stub.sequence_ids.append(message["sequenceId"])
+                    text = stub.reply(message["text"]) if stub.reply else f"echo: {message['text']}"
+                    self._reply(200, {"messages": [{"message": text}]})
+                else:
+                    self._reply(404, {})
+
+            def do_DELETE(self):
+                stub.requests.append(("DELETE", self.path))
+                stub.connections.add(self.client_address)
+                self._reply(200, {"status": "ended"})
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeTableauServer:
+    """
+    In-memory stand-in for a signed-in tableauserverclient.Server, enough for TableauCloudPublisher.
+
+    fail_appends: Exceptions raised by the next fileuploads.append calls, in order
+    expire_next: Exceptions raised by the next fileuploads.initiate calls, e.g. an expired session
+    race_next: The next projects.create loses a creation race (another worker created the project first)
+    job_polls: Number of jobs.get_by_id calls that still report the publish job as running
+    finish_code: How the publish job ends, 0 success, 1 failed, 2 cancelled (TSC.JobItem.FinishCode)
+    append_delay: Seconds every chunk upload takes, max_active_appends records how many overlapped
+    """
+
+    def __init__(self, server_url=""):
+        import tableauserverclient as TSC
+        from tableauserverclient.server.endpoint.exceptions import JobCancelledException, JobFailedException
+        from types import SimpleNamespace
+
+        self.server_url = server_url
+        self.namespace = {"t": "http://tableau.com/api"}
+        self.signed_in = False
+        self.sign_outs = 0
+        self.calls = []
+        self.uploaded = b""
+        self.fail_appends = []
+        self.expire_next = []
+        self.race_next = False
+        self.append_delay = 0
+        self.active_appends = 0
+        self.max_active_appends = 0
+        self._active_lock = threading.Lock()
+        self.job_polls = 0
+        self.finish_code = 0
+        self.certified = []
+
+        project = TSC.ProjectItem(name="Mini_Project")
+        project._id = "project-1"
+        self._projects = [project]
+        self._datasource = None
+
+        fake = self
+
+        def sign_in(auth):
+            fake.signed_in = True
+
+        def sign_out():
+            fake.signed_in = False
+            fake.sign_outs += 1
+
+        def get_projects(options=None):
+            fake.calls.append("projects.get")
+            names = {f.value for f in options.filter} if options is not None else None
+            return [p for p in fake._projects if names is None or p.name in names], None
+
+        def create_project(project_item):
+            fake.calls.append("projects.create")
+            project_item._id = f"project-{len(fake._projects) + 1}"
+            fake._projects.append(project_item)
+            if fake.race_next:
+                fake.race_next = False
+                raise TSC.ServerResponseError("409006", "Conflict", "Project name already exists")
+            return project_item
+
+        def initiate():
+            fake.calls.append("fileuploads.initiate")
+            if fake.expire_next:
+                raise fake.expire_next.pop(0)
+            return "upload-1"
+
+        def append(upload_id, request, content_type):
+            fake.calls.append("fileuploads.append")
+            if fake.fail_appends:
+                raise fake.fail_appends.pop(0)
+
+            with fake._active_lock:
+                fake.active_appends += 1
+                fake.max_active_appends = max(fake.max_active_appends, fake.active_appends)
+            time.sleep(fake.append_delay)
+            with fake._active_lock:
+                fake.active_appends -= 1
+            # The chunk is the body of the multipart "tableau_file" part
+            body = request.split(b"Content-Type: application/octet-stream\r\n\r\n", 1)[1]
+            fake.uploaded += body.rsplit(b"\r\n--", 1)[0]
+
+        job_response = b'<tsResponse xmlns="http://tableau.com/api"><job id="job-1" mode="Asynchronous" type="PublishDatasource" createdAt="2024-01-01T00:00:00Z"/></tsResponse>'
+
+        def post_request(url, xml_request, content_type):
+            fake.calls.append("datasources.publish")
+            fake.publish_url = url
+            name = re.search(rb'<datasource[^>]* name="([^"]+)"', xml_request).group(1).decode()
+            fake._datasource = TSC.DatasourceItem("project-1", name=name)
+            fake._datasource._id = "ds-1"
+            return SimpleNamespace(content=job_response)
+
+        def patch_request(url, json_request, content_type, parameters=None):
+            fake.calls.append("datasources.update_data")
+            fake.update_request = (url, json.loads(json_request), parameters)
+            return SimpleNamespace(content=job_response)
+
+        def get_datasources(options=None):
+            names = {f.value for f in options.filter} if options is not None else None
+            found = [fake._datasource] if fake._datasource is not None and (names is None or fake._datasource.name in names) else []
+            return found, None
+
+        def job_status(job_id):
+            fake.calls.append("jobs.get_by_id")
+            created = datetime.datetime(2024, 1, 1)
+            if fake.job_polls > 0:
+                fake.job_polls -= 1
+                return TSC.JobItem(job_id, "PublishDatasource", "50", created)
+            return TSC.JobItem(job_id, "PublishDatasource", "100", created, completed_at=created, finish_code=fake.finish_code, datasource_id="ds-1")
+
+        def wait_for_job(job, timeout=None):
+            job = job_status(job.id)
+            while job.completed_at is None:
+                job = job_status(job.id)
+            # Like tableauserverclient's wait_for_job
+            if job.finish_code == TSC.JobItem.FinishCode.Failed:
+                raise JobFailedException(job)
+            if job.finish_code == TSC.JobItem.FinishCode.Cancelled:
+                raise JobCancelledException(job)
+            return job
+
+        def update(datasource):
+            fake.certified.append(datasource.certified)
+            return datasource
+
+        self.auth = SimpleNamespace(sign_in=sign_in, sign_out=sign_out)
+        self.projects = SimpleNamespace(get=get_projects, create=create_project)
+        self.fileuploads = SimpleNamespace(initiate=initiate, append=append)
+        self.datasources = SimpleNamespace(baseurl="https://tableau.test/api/3.22/sites/site-1/datasources", post_request=post_request,
+                                           patch_request=patch_request, get=get_datasources,
+                                           get_by_id=lambda ds_id: fake._datasource, update=update)
+        self.jobs = SimpleNamespace(get_by_id=job_status, wait_for_job=wait_for_job)
+
+    def is_signed_in(self):
+        return self.signed_in
@@ -0,0 +1,290 @@
+"""
+Lightweight tracing of pipeline runs: spans with wall time, CPU time, rows processed and peak memory,
+exported as OpenTelemetry (OTLP/JSON) compatible traces.
+
+    with tracer.trace("pipeline", user_id=user_id) as trace:
+        async with tracer.span("decode", table=name):
+            ...
+        # Spans follow contextvars, so work sent to asyncio.to_thread is nested under the caller
+        tables = await asyncio.to_thread(tracer.span("ingest").call, ingestor.ingest_tables, data)
+
+Disabled (the default, TRACING_ENABLED=1 turns it on) every span is one shared no-op object.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACING_ENABLED = (os.getenv("TRACING_ENABLED") or "").lower() in ("1", "true", "yes")
+# Finished traces are written here as <trace_id>.json when set
+TRACE_EXPORT_DIR = os.getenv("TRACE_EXPORT_DIR") or None
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Span:
+    """
+    One timed operation. Entered with `with` it measures the CPU time of its thread, entered with
+    `async with` the CPU time of the whole process (other tasks run while it awaits).
+    """
+
+    def __init__(self, trace: "Trace", name: str, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.attributes = dict(attributes)
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = None
+        self.start_ns = None
+        self.end_ns = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_mb = None
+        self.error = None
+        self._token = None
+        self._started = None
+        self._cpu_clock = None
+        self._cpu_started = None
+        self._rss_started = None
+
+    def set(self, **attributes) -> "Span":
+        """
+        Adds attributes, e.g. span.set(rows=len(df)). Allowed until the trace is exported.
+        """
+        self.attributes.update(attributes)
+        return self
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Runs fn inside the span, meant for asyncio.to_thread(span.call, fn, ...)
+        """
+        with self:
+            return fn(*args, **kwargs)
+
+    def _start(self, cpu_clock):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current_span.set(self)
+        self._cpu_clock = cpu_clock
+        self._rss_started = _peak_rss_mb()
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self._cpu_started = cpu_clock()
+        return self
+
+    def _finish(self, exc):
+        self.wall_seconds = time.perf_counter() - self._started
+        self.cpu_seconds = self._cpu_clock() - self._cpu_started
+        self.end_ns = self.start_ns + int(self.wall_seconds * 1e9)
+        self.peak_rss_mb = _peak_rss_mb()
+        self.attributes["memory.peak_rss_growth_mb"] = round(self.peak_rss_mb - self._rss_started, 1)
+        if exc is not None:
+            self.error = f"{exc.__class__.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.trace.add(self)
+
+    def __enter__(self):
+        return self._start(time.thread_time)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish(exc)
+
+    async def __aenter__(self):
+        return self._start(time.process_time)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._finish(exc)
+
+    def to_otel(self) -> dict:
+        attributes = {
+            **self.attributes,
+            "duration.wall_seconds": round(self.wall_seconds, 6),
+            "duration.cpu_seconds": round(self.cpu_seconds, 6),
+            "memory.peak_rss_mb": round(self.peak_rss_mb, 1),
+        }
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otel_value(value)} for key, value in attributes.items()],
+            # STATUS_CODE_OK / STATUS_CODE_ERROR
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """
+    Returned when tracing is off or no trace is active, so instrumented code costs one attribute lookup
+    """
+
+    def set(self, **attributes):
+        return self
+
+    def call(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """
+    Every finished span of one pipeline run
+    """
+
+    def __init__(self, name: str, service_name: str):
+        self.name = name
+        self.service_name = service_name
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """
+        Return: Totals per span name, in order of first start, and the wall time of the root span
+        """
+        stages = {}
+        for span in sorted(self.spans, key=lambda span: span.start_ns):
+            stage = stages.setdefault(span.name, {
+                "name": span.name, "count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "rows": 0, "peak_rss_mb": 0.0, "errors": 0
+            })
+            stage["count"] += 1
+            stage["wall_seconds"] += span.wall_seconds
+            stage["cpu_seconds"] += span.cpu_seconds
+            stage["rows"] += int(span.attributes.get("rows") or 0)
+            stage["peak_rss_mb"] = max(stage["peak_rss_mb"], span.peak_rss_mb)
+            stage["errors"] += span.error is not None
+
+        for stage in stages.values():
+            for key in ("wall_seconds", "cpu_seconds", "peak_rss_mb"):
+                stage[key] = round(stage[key], 3)
+
+        roots = [span for span in self.spans if span.parent_id is None]
+        return {
+            "trace_id": self.trace_id,
+            "total_seconds": round(sum(span.wall_seconds for span in roots), 3),
+            "stages": list(stages.values()),
+        }
+
+    def to_otel(self) -> dict:
+        """
+        Return: The trace in the OTLP/JSON format (ExportTraceServiceRequest)
+        """
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "tracing"},
+                    "spans": [span.to_otel() for span in sorted(self.spans, key=lambda span: span.start_ns)],
+                }],
+            }]
+        }
+
+    def export(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.trace_id}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_otel(), f)
+        return path
+
+
+class _TraceScope:
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict):
+        self.tracer = tracer
+        self.trace = Trace(name, tracer.service_name)
+        self.root = Span(self.trace, name, attributes)
+        self._token = None
+
+    def __enter__(self) -> Trace:
+        self._token = _current_trace.set(self.trace)
+        # The root span measures process CPU, the run is spread over tasks and threads
+        self.root._start(time.process_time)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        self.root._finish(exc)
+        _current_trace.reset(self._token)
+        if self.tracer.export_dir:
+            print(f"Trace written to {self.trace.export(self.tracer.export_dir)}")
+
+
+class _NoopScope:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACING_ENABLED, export_dir: Optional[str] = TRACE_EXPORT_DIR,
+                 service_name: str = "tableau-mini-pipeline"):
+        self.enabled = enabled
+        self.export_dir = export_dir
+        self.service_name = service_name
+
+    def trace(self, name: str, **attributes):
+        """
+        Starts a trace for the current task (and the threads / tasks it starts). The context manager
+        gives the Trace, or None when tracing is off.
+        """
+        if not self.enabled:
+            return _NoopScope()
+        return _TraceScope(self, name, attributes)
+
+    def span(self, name: str, **attributes):
+        trace = _current_trace.get() if self.enabled else None
+        if trace is None:
+            return NOOP_SPAN
+        return Span(trace, name, attributes)
+
+
+def _otel_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON carries 64-bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# Shared by every pipeline run in this process
+tracer = Tracer()
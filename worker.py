@@ -0,0 +1,66 @@
+"""
+Pipeline worker node for PIPELINE_MODE=distributed. Runs the jobs the API node (main.py) queues in Redis
+and sends the pipeline's events back to it over Redis pub/sub. Start as many as needed:
+
+    python worker.py
+
+WORKER_CONCURRENCY: Jobs one worker runs at the same time
+WORKER_CLAIM_IDLE_SECONDS: How long a dead worker's job waits before another worker runs it
+INCREMENTAL_STATE_DIR: Required. Incremental publishing state, on storage every worker shares (e.g. an NFS
+                       mount): any worker may run the next refresh of a datasource, and must see what the
+                       previous one published
+"""
+
+import asyncio
+import os
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from sse_manager import event_manager
+from agent import async_agent_client
+from ExecutionEngine.HyperPool import hyper_pool, check_hyper_pool
+from process_offload import process_offloader
+from distributed_queue import PipelineWorker, RedisEventPublisher, check_shared_state_dir, redis_client
+
+load_dotenv()
+
+# Same pandas settings as the API node (main.py)
+pd.set_option("mode.copy_on_write", True)
+
+
+async def main():
+    check_shared_state_dir()
+
+    # Imported here, not with this module: process pool workers import worker.py again and must not
+    # log in to Salesforce / load the embedding model
+    from pipeline import run_pipeline
+
+    redis = redis_client()
+    # Every event the pipeline publishes goes to the API node holding the user's SSE stream
+    event_manager.relay = RedisEventPublisher(redis)
+
+    worker = PipelineWorker(
+        run_pipeline,
+        redis,
+        concurrency=int(os.getenv("WORKER_CONCURRENCY") or 1),
+        claim_idle_seconds=float(os.getenv("WORKER_CLAIM_IDLE_SECONDS") or 600),
+    )
+
+    # Same resources as the API node has in local mode
+    await asyncio.to_thread(hyper_pool.start)
+    health_task = asyncio.create_task(check_hyper_pool(float(os.getenv("HYPER_HEALTH_INTERVAL") or 60)))
+    await asyncio.to_thread(process_offloader.start)
+
+    try:
+        await worker.run()
+    finally:
+        health_task.cancel()
+        await asyncio.to_thread(process_offloader.shutdown)
+        await asyncio.to_thread(hyper_pool.shutdown)
+        await async_agent_client.aclose()
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())